@@ -67,70 +67,73 @@ class ConfidenceScorer(object):
 
         """
 
+        return cls._feature_matrix(example_predictions).tolist()
+
+    @classmethod
+    def _minimum_risk_f1(cls, start_positions: np.ndarray, end_positions: np.ndarray) -> np.ndarray:
+        """
+        Average span-overlap F1 of each answer with every other answer of the same example, all pairs at once.
+        """
+        s1, e1 = start_positions[:, None], end_positions[:, None]
+        s2, e2 = start_positions[None, :], end_positions[None, :]
+
+        overlap = np.minimum(e1, e2) - np.maximum(s1, s2) + 1.0
+        with np.errstate(divide='ignore', invalid='ignore'):
+            precision = overlap / (e1 - s1 + 1.0)
+            recall = overlap / (e2 - s2 + 1.0)
+            f1 = (2.0 * precision * recall) / (precision + recall)
+
+        f1 = np.where((s1 > e2) | (e1 < s2), 0.0, f1)
+        f1 = np.where((s1 == s2) & (e1 == e2), 1.0, f1)
+        np.fill_diagonal(f1, 0.0)
+
+        return f1.sum(axis=1) / len(start_positions)
+
+    @classmethod
+    def _feature_matrix(cls, example_predictions) -> np.ndarray:
+        """
+        Same as `make_features`, as a (k, number of features) array.
+        """
+        if len(example_predictions) == 0:
+            return np.zeros((0, 14), dtype=np.double)
+
+        def column(key):
+            return np.array([pred[key] for pred in example_predictions], dtype=np.double)
+
         # compute minimum risk f1
-        minimum_risk_f1 = []
-        for i in range(len(example_predictions)):
-            sum = 0.0
-            for j in range(len(example_predictions)):
-                if j == i:
-                    continue
-                s1 = example_predictions[i]["span_answer"]["start_position"]
-                e1 = example_predictions[i]["span_answer"]["end_position"]
-                s2 = example_predictions[j]["span_answer"]["start_position"]
-                e2 = example_predictions[j]["span_answer"]["end_position"]
-                if s1 == s2 and e1 == e2:
-                    sum += 1.0
-                elif s1 > e2 or e1 < s2:
-                    continue
-                else:
-                    overlap_start_position = max(s1, s2)
-                    overlap_end_position = min(e1, e2)
-                    precision = (overlap_end_position - overlap_start_position + 1.0) / (e1 - s1 + 1.0)
-                    recall = (overlap_end_position - overlap_start_position + 1.0) / (e2 - s2 + 1.0)
-                    f1 = (2.0 * precision * recall) / (precision + recall)
-                    sum += f1
-            sum /= len(example_predictions)
-            minimum_risk_f1.append(sum)
+        minimum_risk_f1 = cls._minimum_risk_f1(
+            np.array([pred["span_answer"]["start_position"] for pred in example_predictions], dtype=np.double),
+            np.array([pred["span_answer"]["end_position"] for pred in example_predictions], dtype=np.double))
 
         # if have span answer
-        have_span_answer = []
+        missing_target_type_logits = np.array(["target_type_logits" not in pred for pred in example_predictions])
         for pred in example_predictions:
             if "target_type_logits" not in pred:
                 pred["target_type_logits"] = [0, 0, 0, 0, 0]
-                have_span_answer.append(0.0)
-            elif pred["target_type_logits"][TargetType.SPAN_ANSWER] == max(pred["target_type_logits"]):
-                have_span_answer.append(1.0)
-            else:
-                have_span_answer.append(0.0)
-        if max(have_span_answer) == 1.0:
-            example_have_span_answer = 1.0
-        else:
-            example_have_span_answer = 0.0
+        target_type_logits = np.array([pred["target_type_logits"] for pred in example_predictions], dtype=np.double)
+        have_span_answer = ((target_type_logits[:, TargetType.SPAN_ANSWER] == target_type_logits.max(axis=1))
+                            & ~missing_target_type_logits).astype(np.double)
+        example_have_span_answer = float(have_span_answer.max())
 
-        average_norm_span_answer_score = 0.0
-        for pred in example_predictions:
-            average_norm_span_answer_score += pred["normalized_span_answer_score"]
-        average_norm_span_answer_score /= len(example_predictions)
-        features = []
-        for i, pred in enumerate(example_predictions):
-            feat = [
-                pred["span_answer_score"],
-                pred["cls_score"],
-                pred["start_logit"],
-                pred["end_logit"],
-                pred["target_type_logits"][TargetType.NO_ANSWER],   # no answer
-                pred["target_type_logits"][TargetType.SPAN_ANSWER],   # span answer
-                have_span_answer[i],
-                example_have_span_answer,
-                minimum_risk_f1[i],
-                pred["normalized_span_answer_score"],
-                pred["normalized_span_answer_score"] - average_norm_span_answer_score,
-                pred["start_stdev"],
-                pred["end_stdev"],
-                pred["query_passage_similarity"]
-            ]
-            features.append(feat)
-        return features
+        normalized_span_answer_score = column("normalized_span_answer_score")
+        average_norm_span_answer_score = normalized_span_answer_score.mean()
+
+        return np.column_stack([
+            column("span_answer_score"),
+            column("cls_score"),
+            column("start_logit"),
+            column("end_logit"),
+            target_type_logits[:, TargetType.NO_ANSWER],   # no answer
+            target_type_logits[:, TargetType.SPAN_ANSWER],   # span answer
+            have_span_answer,
+            np.full(len(example_predictions), example_have_span_answer),
+            minimum_risk_f1,
+            normalized_span_answer_score,
+            normalized_span_answer_score - average_norm_span_answer_score,
+            column("start_stdev"),
+            column("end_stdev"),
+            column("query_passage_similarity"),
+        ])
 
     def predict_scores(self, example_predictions) -> list:
         """
@@ -146,18 +149,28 @@ class ConfidenceScorer(object):
 
         if example_predictions is None:
             return None
-        features = self.make_features(example_predictions)
-        if len(features) == 0:
-            return [0.0] * len(example_predictions)
-        feature_dimension = len(features[0])
-        X = np.zeros((len(features), feature_dimension), dtype=np.double)
-        for i, feat in enumerate(features):
-            X[i, :] = feat
-        if not self.model_exists():
-            return [0.0] * len(example_predictions)
-        scores = self._confidence_model.predict_proba(X)
+        return self.predict_scores_batch([example_predictions])[0]
+
+    def predict_scores_batch(self, examples_predictions: list) -> list:
+        """
+        Compute confidence scores for the top-k predictions of many examples, with a single call to the confidence
+        model.
+
+        Args:
+            examples_predictions: For each example, top-k answers generated by postprocessor ExtractivePostProcessor.
+
+        Returns:
+            For each example, list of scores for each of its top-k answers.
+
+        """
+
+        features = [self._feature_matrix(example_predictions) for example_predictions in examples_predictions]
+        if not self.model_exists() or sum(len(X) for X in features) == 0:
+            return [[0.0] * len(example_predictions) for example_predictions in examples_predictions]
+
+        scores = self._confidence_model.predict_proba(np.concatenate(features))
         # scores[:,0] : scores for incorrect, scores[:, 1]: score for correct
-        return scores[:, 1]
+        return np.split(scores[:, 1], np.cumsum([len(X) for X in features])[:-1])
 
     @classmethod
     def reference_prediction_overlap(cls, ground_truth, prediction) -> float:
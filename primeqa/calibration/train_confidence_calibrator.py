@@ -512,8 +512,8 @@ def main():
     except:
         raise ValueError("Unable to load validation predictions from {}".format(validation_set_prediction_file))
 
-    for example_id in validation_predictions:
-        scores = confidence_scorer.predict_scores(validation_predictions[example_id])
+    all_scores = confidence_scorer.predict_scores_batch(list(validation_predictions.values()))
+    for example_id, scores in zip(validation_predictions, all_scores):
         for i in range(len(validation_predictions[example_id])):
             validation_predictions[example_id][i]["confidence_score"] = scores[i]
 
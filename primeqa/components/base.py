@@ -155,6 +155,15 @@ class Indexer:
     @abstractmethod
     def index(self, collection: Union[List[dict], str], *args, **kwargs):
         pass
+
+    def get_num_indexed_documents(self) -> Union[int, None]:
+        """
+        Number of documents indexed so far by a running `index` call, used to report indexing progress.
+
+        Returns:
+            Union[int, None]: number of indexed documents, None if this indexer doesn't track progress
+        """
+        return None
     
     
 @dataclass(init=False, repr=False, eq=False)
@@ -1,6 +1,8 @@
 from typing import Union, List
 from dataclasses import dataclass, field
 import json
+import os
+import glob
 
 from primeqa.components.base import Indexer as BaseIndexer
 from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
@@ -28,6 +30,7 @@ class ColBERTIndexer(BaseIndexer):
         nbits (int, optional): Number of bits. Defaults to 1.
         kmeans_niters (int, optional): Number of iterations (kmeans). Defaults to 4.
         num_partitions_max (int, optional): Maximum partions size. Defaults to 10000000.
+        num_encoder_processes (int, optional): CPU only, number of processes encoding documents in parallel. Defaults to 0 (encode in the indexing process).
 
     Important:
     1. Each field has metadata property which can carry additional information for other downstream usages.
@@ -103,6 +106,13 @@ class ColBERTIndexer(BaseIndexer):
             "api_support": True,
         },
     )
+    num_encoder_processes: int = field(
+        default=0,
+        metadata={
+            "name": "Number of encoder processes (CPU only)",
+            "range": [0, 64, 1],
+        },
+    )
 
     def __post_init__(self):
         self._config = ColBERTConfig(
@@ -119,6 +129,7 @@ class ColBERTIndexer(BaseIndexer):
             nbits=self.nbits,
             kmeans_niters=self.kmeans_niters,
             num_partitions_max=self.num_partitions_max,
+            num_encoder_processes=self.num_encoder_processes,
         )
 
         # Placeholder variables
@@ -140,12 +151,41 @@ class ColBERTIndexer(BaseIndexer):
             raise TypeError(
                 "ColBERT indexer expects path to `documents.tsv` as value for `collection` argument."
             )
+        if "append" in kwargs and kwargs["append"]:
+            # Encode only the documents in `collection` into the existing index, reusing its centroids
+            return self._indexer.add(self.index_name, collection)
+
         self._indexer.index(
             self.index_name,
             collection,
             overwrite="overwrite" in kwargs and kwargs["overwrite"],
         )
 
+    def delete(self, pids: List[int], compact: bool = False):
+        """
+        Deletes documents from the index. They are filtered out at search time until the index is compacted.
+
+        Args:
+            pids (List[int]): Positions of the documents in the indexed collection.
+            compact (bool, optional): If set to "True", also drops the documents from the inverted file. Defaults to False.
+        """
+        self._indexer.delete(self.index_name, pids, compact=compact)
+
+    def get_num_indexed_documents(self) -> Union[int, None]:
+        # Every encoded chunk is saved along with a `doclens.<chunk_idx>.json` file with one entry per document
+        num_indexed_documents = 0
+        for doclens_file_path in glob.glob(
+            os.path.join(self._config.index_path_, "doclens.*.json")
+        ):
+            try:
+                with open(doclens_file_path, "r", encoding="utf-8") as doclens_file:
+                    num_indexed_documents += len(json.load(doclens_file))
+            except ValueError:
+                # Chunk is still being written
+                continue
+
+        return num_indexed_documents
+
 
 @dataclass
 class DPRIndexer(BaseIndexer):
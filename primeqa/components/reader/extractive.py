@@ -2,16 +2,17 @@ from typing import List, Dict
 from dataclasses import dataclass, field
 import json
 
-from transformers import AutoConfig, AutoTokenizer, DataCollatorWithPadding
-from datasets import Dataset
+import torch
+from transformers import AutoConfig, AutoTokenizer
 
 from primeqa.components.base import Reader as BaseReader
+from primeqa.components.shared import load_shared
 from primeqa.mrc.models.heads.extractive import EXTRACTIVE_HEAD
 from primeqa.mrc.models.task_model import ModelForDownstreamTasks
+from primeqa.mrc.models.inference import ExtractiveQAModelRunner
 from primeqa.mrc.processors.preprocessors.base import BasePreProcessor
 from primeqa.mrc.processors.postprocessors.extractive import ExtractivePostProcessor
 from primeqa.mrc.processors.postprocessors.scorers import SupportedSpanScorers
-from primeqa.mrc.trainers.mrc import MRCTrainer
 
 
 @dataclass
@@ -28,6 +29,7 @@ class ExtractiveReader(BaseReader):
         max_answer_length (int, optional): Maximum answer length. Defaults to 32.
         scorer_type (str, optional): Scoring algorithm. Defaults to "weighted_sum_target_type_and_score_diff".
         min_score_threshold: (float, optional): Minimum score threshold. Defaults to None.
+        batch_size (int, optional): Maximum number of features per forward pass. Defaults to 8.
 
     Important:
         1. Each field has metadata property which can carry additional information for other downstream usages.
@@ -112,6 +114,14 @@ class ExtractiveReader(BaseReader):
             "exclude_from_hash": True,
         },
     )
+    batch_size: int = field(
+        default=8,
+        metadata={
+            "name": "Batch size",
+            "description": "Maximum number of features per forward pass",
+            "range": [1, 128, 1],
+        },
+    )
 
     def __post_init__(self):
         # Placeholder variables
@@ -119,7 +129,7 @@ class ExtractiveReader(BaseReader):
         self._tokenizer = None
         self._preprocessor = None
         self._scorer_type_as_enum = None
-        self._data_collector = None
+        self._model_runner = None
 
     def __hash__(self) -> int:
         # Step 1: Identify all fields to be included in the hash
@@ -141,21 +151,34 @@ class ExtractiveReader(BaseReader):
         config = AutoConfig.from_pretrained(self.model)
 
         # Initialize tokenizer
-        self._tokenizer = AutoTokenizer.from_pretrained(
-            self.model,
-            use_fast=self.use_fast,
-            config=config,
+        self._tokenizer = load_shared(
+            ("tokenizer", self.model, self.use_fast),
+            lambda: AutoTokenizer.from_pretrained(
+                self.model,
+                use_fast=self.use_fast,
+                config=config,
+            ),
         )
 
         config.sep_token_id = self._tokenizer.convert_tokens_to_ids(
             self._tokenizer.sep_token
         )
-        self._loaded_model = ModelForDownstreamTasks.from_config(
-            config,
-            self.model,
-            task_heads=task_heads,
+
+        # Load model, shared with other instances of the same model that differ in pre-/post-processing settings only
+        def load_model():
+            model = ModelForDownstreamTasks.from_config(
+                config,
+                self.model,
+                task_heads=task_heads,
+            )
+            model.set_task_head(next(iter(task_heads)))
+            if torch.cuda.is_available():
+                model.to("cuda")
+            return model
+
+        self._loaded_model = load_shared(
+            (self.__class__.__name__, self.model), load_model
         )
-        self._loaded_model.set_task_head(next(iter(task_heads)))
 
         # Initialize preprocessor
         self._preprocessor = BasePreProcessor(
@@ -185,8 +208,14 @@ class ExtractiveReader(BaseReader):
         else:
             raise ValueError(f"Unsupported scorer type: {self.scorer_type}")
 
-        # Configure data collector
-        self._data_collector = DataCollatorWithPadding(self._tokenizer)
+        # Configure model runner
+        self._model_runner = ExtractiveQAModelRunner(
+            self._loaded_model,
+            pad_token_id=self._tokenizer.pad_token_id,
+            batch_size=self.batch_size,
+            max_seq_len=self.max_seq_len,
+            pad_token_type_id=self._tokenizer.pad_token_type_id,
+        )
 
     def predict(
         self,
@@ -223,15 +252,7 @@ class ExtractiveReader(BaseReader):
             scorer_type=self._scorer_type_as_enum,
         )
 
-        # Step 3: Load trainer
-        trainer = MRCTrainer(
-            model=self._loaded_model,
-            tokenizer=self._tokenizer,
-            data_collator=self._data_collector,
-            post_process_function=postprocessor.process,
-        )
-
-        # Step 4: Prepare dataset from input texts and contexts
+        # Step 3: Prepare features from input texts and contexts
         assert len(questions) == len(contexts)
 
         if example_ids is None:
@@ -243,14 +264,14 @@ class ExtractiveReader(BaseReader):
             question=questions, context=contexts, example_id=example_ids
         )
 
-        eval_examples, eval_dataset = self._preprocessor.process_eval(
-            Dataset.from_dict(examples_dict)
+        eval_examples, eval_features = self._preprocessor.process_eval_examples(
+            examples_dict
         )
 
-        # Step 5: Run predict
+        # Step 4: Run predict
         predictions = {}
-        for example_id, raw_predictions in trainer.predict(
-            eval_dataset=eval_dataset, eval_examples=eval_examples
+        for example_id, raw_predictions in postprocessor.process(
+            eval_examples, eval_features, self._model_runner.predict(eval_features)
         ).items():
             predictions[example_id] = []
             for raw_prediction in raw_predictions:
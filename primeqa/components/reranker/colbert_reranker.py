@@ -141,16 +141,21 @@ class ColBERTReranker(BaseReranker):
             else self.include_title
         )
 
-        ranking_results = []
-        for query, docs in zip(queries, documents):
+        # Step 2: Score the documents of all queries at once, encoding documents shared by several queries only once
+        texts_per_query = []
+        for docs in documents:
             texts = []
             for p in docs:
                 if include_title and 'title' in p['document'] and p['document']['title'] is not None and len(p['document']['title'].strip()) > 0:
                     texts.append(p['document']['title'] + '\n\n' + p['document']['text'])
                 else:
                     texts.append(p['document']['text'])
+            texts_per_query.append(texts)
+
+        scores_per_query = self._loaded_model.rescore_batch(queries, texts_per_query)
 
-            scores = self._loaded_model.rescore(query, texts).tolist()
+        ranking_results = []
+        for docs, scores in zip(documents, scores_per_query):
             ranked_passage_indexes = np.array(scores).argsort()[::-1][:max_num_documents if max_num_documents > 0 else len(scores)].tolist()
 
             results = []
@@ -4,9 +4,11 @@ from dataclasses import dataclass, field
 import json
 import numpy as np
 import warnings
+import torch
 import torch.nn.functional as F
 
 from primeqa.components.base import Reranker as BaseReranker
+from primeqa.components.shared import load_shared
 from transformers import AutoTokenizer, AutoModelForSequenceClassification
 
 
@@ -82,8 +84,13 @@ class SeqClassificationReranker(BaseReranker):
         )
 
     def load(self, *args, **kwargs):
-        self._tokenizer = AutoTokenizer.from_pretrained(self.model)
-        self._loaded_model = AutoModelForSequenceClassification.from_pretrained(self.model)
+        self._tokenizer = load_shared(
+            ("tokenizer", self.model), lambda: AutoTokenizer.from_pretrained(self.model)
+        )
+        self._loaded_model = load_shared(
+            (self.__class__.__name__, self.model),
+            lambda: AutoModelForSequenceClassification.from_pretrained(self.model),
+        )
     
     def train(self, *args, **kwargs):
             pass
@@ -133,31 +140,50 @@ class SeqClassificationReranker(BaseReranker):
             else self.include_title
         )
         
-        ranking_results = []
-        for query, docs  in zip(queries,documents):
-            texts_a = [query] * len(docs)
-            texts_b = []
+        # Step 2: Flatten the (query, document) pairs of all queries, and sort them by length, so that batches are
+        # full however few documents each query has, and each batch is padded to about the length of its pairs
+        texts_a = []
+        texts_b = []
+        for query, docs in zip(queries, documents):
             for p in docs:
+                texts_a.append(query)
                 if include_title and 'title' in p['document'] and p['document']['title'] is not None and len(p['document']['title'].strip()) > 0:
                     texts_b.append(p['document']['title'] + '\n\n' + p['document']['text'])
                 else:
                     texts_b.append(p['document']['text'])
-                
-            scores = []
-            for start_ndx in range(0, len(texts_a), self.max_batch_size):
-                inputs = self._tokenizer(
-                    texts_a[start_ndx:start_ndx+self.max_batch_size],
-                    texts_b[start_ndx:start_ndx+self.max_batch_size],
-                    add_special_tokens=True,
-                    return_tensors='pt',
-                    max_length=self.max_seq_len,
+
+        if len(texts_a) == 0:
+            return [[] for _ in documents]
+
+        encodings = self._tokenizer(
+            texts_a,
+            texts_b,
+            add_special_tokens=True,
+            max_length=self.max_seq_len,
+            truncation=True)
+        order = sorted(range(len(texts_a)), key=lambda ndx: len(encodings['input_ids'][ndx]))
+
+        flat_scores = [0.0] * len(texts_a)
+        with torch.inference_mode():
+            for start_ndx in range(0, len(order), self.max_batch_size):
+                batch = order[start_ndx:start_ndx+self.max_batch_size]
+                inputs = self._tokenizer.pad(
+                    {n: [values[ndx] for ndx in batch] for n, values in encodings.items()},
                     padding='longest',
-                    truncation=True)
+                    return_tensors='pt')
                 inputs = {n: t.to(self._loaded_model.device) for n, t in inputs.items()}
                 outputs = self._loaded_model(**inputs).logits.detach().cpu()
                 s = outputs.shape[1] - 1
                 probs = F.softmax(outputs, dim=s)[:,s].numpy().tolist()
-                scores.extend(probs)
+                for ndx, prob in zip(batch, probs):
+                    flat_scores[ndx] = prob
+
+        # Step 3: Scatter the scores back to the documents of each query
+        ranking_results = []
+        offset = 0
+        for docs in documents:
+            scores = flat_scores[offset:offset+len(docs)]
+            offset += len(docs)
             ranked_passage_indexes = np.array(scores).argsort()[::-1][:max_num_documents if max_num_documents > 0 else len(scores)].tolist()
             results = []
             for idx in ranked_passage_indexes:
@@ -165,4 +191,3 @@ class SeqClassificationReranker(BaseReranker):
                 results.append(docs[idx])
             ranking_results.append(results)
         return ranking_results
-    
\ No newline at end of file
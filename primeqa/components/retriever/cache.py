@@ -0,0 +1,132 @@
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+
+def normalize_query(query: str) -> str:
+    """
+    Normalizes query text for cache lookups: Unicode NFC, with runs of whitespace collapsed. Case is kept, as query
+    encoders may be case sensitive.
+    """
+    return " ".join(unicodedata.normalize("NFC", str(query)).split())
+
+
+class _LRUCache:
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        # A disabled level neither hits nor misses
+        if self.max_size <= 0:
+            return None
+
+        value = self._entries.get(key)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self._entries.move_to_end(key)
+        return value
+
+    def put(self, key: Hashable, value: Any):
+        if self.max_size <= 0:
+            return
+
+        self._entries[key] = value
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def clear(self):
+        self._entries.clear()
+
+    def stats(self) -> Dict[str, int]:
+        return {"size": len(self._entries), "hits": self.hits, "misses": self.misses}
+
+
+class RetrieverCache:
+    """
+    Two-level cache of a retriever, for workloads with many repeated queries.
+
+    The first level maps normalized query text to the query embedding, which skips the query encoder. The second maps
+    normalized query text along with every search setting that changes the ranking to the ranked results, which skips
+    the search too. Both levels are bounded LRUs, and a level of size 0 is disabled.
+
+    Entries are only valid for one version of the index. `validate` clears both levels as soon as the version differs
+    from the one the entries were computed against, and `refresh` reloads the index of the retriever along with it.
+    """
+
+    def __init__(self, max_queries: int = 0, max_results: int = 0):
+        """
+        Args:
+            max_queries (int, optional): Max number of query embeddings. Defaults to 0 (disabled).
+            max_results (int, optional): Max number of ranked results. Defaults to 0 (disabled).
+        """
+        self._embeddings = _LRUCache(max_queries)
+        self._results = _LRUCache(max_results)
+        self._index_version = None
+        self._lock = threading.Lock()
+        self._reload_lock = threading.Lock()
+
+    @property
+    def enabled(self) -> bool:
+        return self._embeddings.max_size > 0 or self._results.max_size > 0
+
+    def validate(self, index_version: Hashable) -> bool:
+        """
+        Clears the cache if it was filled against another version of the index.
+
+        Returns:
+            bool: True if the cache was cleared.
+        """
+        with self._lock:
+            if index_version == self._index_version:
+                return False
+
+            cleared = self._index_version is not None
+            self._index_version = index_version
+            self._embeddings.clear()
+            self._results.clear()
+            return cleared
+
+    def refresh(self, get_index_version: Callable[[], Hashable], reload: Callable[[], Any]):
+        """
+        Validates the cache against the current version of the index, and calls `reload` if it changed. Concurrent
+        callers wait for a reload in progress, so that the index is reloaded once per version.
+
+        Args:
+            get_index_version (Callable[[], Hashable]): Returns the current version of the index.
+            reload (Callable[[], Any]): Reloads the index.
+        """
+        with self._reload_lock:
+            if self.validate(get_index_version()):
+                reload()
+
+    def get_embedding(self, query: str) -> Optional[Any]:
+        with self._lock:
+            return self._embeddings.get(normalize_query(query))
+
+    def put_embedding(self, query: str, embedding: Any):
+        with self._lock:
+            self._embeddings.put(normalize_query(query), embedding)
+
+    def get_results(self, query: str, settings: tuple) -> Optional[Any]:
+        with self._lock:
+            return self._results.get((normalize_query(query), settings))
+
+    def put_results(self, query: str, settings: tuple, results: Any):
+        with self._lock:
+            self._results.put((normalize_query(query), settings), results)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """
+        Returns:
+            Dict[str, Dict[str, int]]: size, hits and misses of the "embeddings" and "results" levels.
+        """
+        with self._lock:
+            return {"embeddings": self._embeddings.stats(), "results": self._results.stats()}
@@ -3,7 +3,11 @@ import os
 from dataclasses import dataclass, field
 import json
 
+import numpy as np
+import torch
+
 from primeqa.components.base import Retriever as BaseRetriever
+from primeqa.components.retriever.cache import RetrieverCache
 from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
 from primeqa.ir.dense.colbert_top.colbert.searcher import Searcher
 from primeqa.ir.dense.dpr_top.dpr.config import DPRSearchArguments
@@ -24,6 +28,10 @@ class ColBERTRetriever(BaseRetriever):
         ncells (int, optional): Number of cells. Defaults to None.
         centroid_score_threshold (float, optional): Centroid score threshold. Defaults to None.
         ndocs (int, optional): Number of documents in PLAID Stage 1. Defaults to None.
+        search_batch_size (int, optional): Number of queries searched together as one batch. Defaults to None (one query at a time).
+        load_index_with_mmap (bool, optional): Memory-map the index instead of loading it into memory, converting it once if needed. Defaults to False.
+        query_cache_size (int, optional): Number of query embeddings kept in an LRU cache, keyed by normalized query text. Defaults to 0 (disabled).
+        result_cache_size (int, optional): Number of ranked results kept in an LRU cache, keyed by normalized query text and search settings. Defaults to 0 (disabled).
 
     Important:
     1. Each field has metadata property which can carry additional information for other downstream usages.
@@ -77,6 +85,30 @@ class ColBERTRetriever(BaseRetriever):
             "name": "Number of documents in PLAID Stage 1",
         },
     )
+    search_batch_size: int = field(
+        default=None,
+        metadata={
+            "name": "Number of queries searched together as one batch",
+        },
+    )
+    load_index_with_mmap: bool = field(
+        default=False,
+        metadata={
+            "name": "Memory-map the index",
+        },
+    )
+    query_cache_size: int = field(
+        default=0,
+        metadata={
+            "name": "Number of cached query embeddings",
+        },
+    )
+    result_cache_size: int = field(
+        default=0,
+        metadata={
+            "name": "Number of cached query results",
+        },
+    )
 
     def __post_init__(self):
         self._config = ColBERTConfig(
@@ -86,9 +118,14 @@ class ColBERTRetriever(BaseRetriever):
             ncells=self.ncells,
             centroid_score_threshold=self.centroid_score_threshold,
             ndocs=self.ndocs,
+            search_batch_size=self.search_batch_size,
+            load_index_with_mmap=self.load_index_with_mmap,
         )
         # Placeholder variables
         self._searcher = None
+        self._cache = RetrieverCache(
+            max_queries=self.query_cache_size, max_results=self.result_cache_size
+        )
 
     def __hash__(self) -> int:
         # Step 1: Identify all fields to be included in the hash
@@ -112,6 +149,11 @@ class ColBERTRetriever(BaseRetriever):
             config=self._config,
         )
 
+    def get_index_version(self) -> int:
+        """Version of the index, bumped by every update of the index (see `IndexUpdater`)."""
+        with open(os.path.join(self._config.index_path, "metadata.json")) as f:
+            return json.load(f).get("version", 0)
+
     @classmethod
     def get_engine_type(cls):
         return "ColBERT"
@@ -137,6 +179,9 @@ class ColBERTRetriever(BaseRetriever):
             if "max_num_documents" in kwargs
             else self.max_num_documents
         )
+        if self._cache.enabled:
+            return self._predict_with_cache(input_texts, max_num_documents)
+
         ranking_results = self._searcher.search_all(
             {idx: str(input_text) for idx, input_text in enumerate(input_texts)},
             k=max_num_documents,
@@ -146,6 +191,45 @@ class ColBERTRetriever(BaseRetriever):
             for results_per_query in ranking_results.data.values()
         ]
 
+    def _predict_with_cache(self, input_texts: List[str], max_num_documents: int):
+        # Step 1: Drop cached entries (and reload the index) if the index was updated since they were computed
+        self._cache.refresh(self.get_index_version, self.load)
+        # Each request sticks to one searcher, even if the index is reloaded meanwhile
+        searcher = self._searcher
+
+        # Step 2: Look up cached results, keyed by every setting which changes the ranking
+        settings = (
+            max_num_documents,
+            self._config.ncells,
+            self._config.centroid_score_threshold,
+            self._config.ndocs,
+        )
+        results = [self._cache.get_results(input_text, settings) for input_text in input_texts]
+        missing = [idx for idx, result in enumerate(results) if result is None]
+        if not missing:
+            return [list(result) for result in results]
+
+        # Step 3: Encode only the queries whose embedding isn't cached either
+        embeddings = {idx: self._cache.get_embedding(input_texts[idx]) for idx in missing}
+        to_encode = [idx for idx in missing if embeddings[idx] is None]
+        if to_encode:
+            Q = searcher.encode([str(input_texts[idx]) for idx in to_encode])
+            for row, idx in enumerate(to_encode):
+                embeddings[idx] = Q[row : row + 1].clone()
+                self._cache.put_embedding(input_texts[idx], embeddings[idx])
+
+        # Step 4: Search the queries missing from the result cache
+        ranking_results = searcher.search_all_encoded(
+            {idx: str(input_texts[idx]) for idx in missing},
+            torch.cat([embeddings[idx] for idx in missing]),
+            k=max_num_documents,
+        )
+        for idx, results_per_query in ranking_results.data.items():
+            results[idx] = [(result[0], result[-1]) for result in results_per_query]
+            self._cache.put_results(input_texts[idx], settings, results[idx])
+
+        return [list(result) for result in results]
+
 @dataclass
 class DPRRetriever(BaseRetriever):
     """_summary_
@@ -156,6 +240,8 @@ class DPRRetriever(BaseRetriever):
         checkpoint (str, optional): Model to load. Defaults to checkpoint in index configuration.
         collection (str, optional): collection to load. Defaults to collection in index configuration.
         max_num_documents (int, optional): Maximum number of retrieved document. Defaults to 5.
+        query_cache_size (int, optional): Number of query embeddings kept in an LRU cache, keyed by normalized query text. Defaults to 0 (disabled).
+        result_cache_size (int, optional): Number of ranked results kept in an LRU cache, keyed by normalized query text and search settings. Defaults to 0 (disabled).
 
     Important:
     1. Each field has metadata property which can carry additional information for other downstream usages.
@@ -197,6 +283,18 @@ class DPRRetriever(BaseRetriever):
             "exclude_from_hash": True,
         },
     )
+    query_cache_size: int = field(
+        default=0,
+        metadata={
+            "name": "Number of cached query embeddings",
+        },
+    )
+    result_cache_size: int = field(
+        default=0,
+        metadata={
+            "name": "Number of cached query results",
+        },
+    )
 
     def __post_init__(self):
         self.checkpoint=None
@@ -216,8 +314,9 @@ class DPRRetriever(BaseRetriever):
         self._searcher = DPRSearcher(
             self._config,
         )
-
-
+        self._cache = RetrieverCache(
+            max_queries=self.query_cache_size, max_results=self.result_cache_size
+        )
 
     def __hash__(self) -> int:
         # Step 1: Identify all fields to be included in the hash
@@ -234,12 +333,23 @@ class DPRRetriever(BaseRetriever):
         )
 
     def load(self, *args, **kwargs):
+        # The searcher this replaces shuts its shard threads down once the requests still using it are done
         self._searcher = DPRSearcher(
             self._config,
         )
+
     def get_searcher(self):
         return self._searcher
 
+    def get_index_version(self) -> int:
+        """Version of the index. DPR indexes are rebuilt in place, so it's the latest modification time of the index
+        directory (files added or removed) and of the faiss and passages files in it (files rewritten)."""
+        with os.scandir(self._config.index_location) as entries:
+            return max(
+                [os.stat(self._config.index_location).st_mtime_ns]
+                + [entry.stat().st_mtime_ns for entry in entries if entry.is_file()]
+            )
+
     @classmethod
     def get_engine_type(cls):
         return "DPR"
@@ -266,9 +376,14 @@ class DPRRetriever(BaseRetriever):
             else self.max_num_documents
         )
 
-        retrieved_doc_ids, passages = self._searcher.search(
-            list(input_texts), max_num_documents, mode="query_list"
-        )
+        if self._cache.enabled:
+            retrieved_doc_ids, passages = self._search_with_cache(
+                input_texts, max_num_documents
+            )
+        else:
+            retrieved_doc_ids, passages = self._searcher.search(
+                list(input_texts), max_num_documents, mode="query_list"
+            )
         if return_passages:
             return retrieved_doc_ids, passages
         
@@ -281,3 +396,40 @@ class DPRRetriever(BaseRetriever):
                 retrieved_doc_ids, [passage["scores"] for passage in passages]
             )
         ]
+
+    def _search_with_cache(self, input_texts: List[str], max_num_documents: int):
+        # Step 1: Drop cached entries (and reload the index) if the index was updated since they were computed
+        self._cache.refresh(self.get_index_version, self.load)
+        # Each request sticks to one searcher, even if the index is reloaded meanwhile
+        searcher = self._searcher
+
+        # Step 2: Look up cached results
+        settings = (max_num_documents, searcher.opts.do_not_include_passages)
+        results = [self._cache.get_results(input_text, settings) for input_text in input_texts]
+        missing = [idx for idx, result in enumerate(results) if result is None]
+
+        if missing:
+            # Step 3: Encode only the queries whose embedding isn't cached either
+            embeddings = {idx: self._cache.get_embedding(input_texts[idx]) for idx in missing}
+            to_encode = [idx for idx in missing if embeddings[idx] is None]
+            if to_encode:
+                query_vectors = searcher.encode_queries(
+                    [str(input_texts[idx]) for idx in to_encode]
+                )
+                for row, idx in enumerate(to_encode):
+                    embeddings[idx] = query_vectors[row : row + 1].copy()
+                    self._cache.put_embedding(input_texts[idx], embeddings[idx])
+
+            # Step 4: Search the queries missing from the result cache
+            retrieved_doc_ids, passages = searcher.search_vectors(
+                np.concatenate([embeddings[idx] for idx in missing]), max_num_documents
+            )
+            for row, idx in enumerate(missing):
+                results[idx] = (retrieved_doc_ids[row], passages[row] if passages else None)
+                self._cache.put_results(input_texts[idx], settings, results[idx])
+
+        retrieved_doc_ids = [list(doc_ids) for doc_ids, _ in results]
+        passages = None
+        if not searcher.opts.do_not_include_passages:
+            passages = [dict(passage) for _, passage in results]
+        return retrieved_doc_ids, passages
@@ -0,0 +1,34 @@
+import threading
+import weakref
+from typing import Any, Callable, Hashable
+
+_shared_objects = weakref.WeakValueDictionary()
+_load_locks = {}
+_lock = threading.Lock()
+
+
+def load_shared(key: Hashable, loader: Callable[[], Any]) -> Any:
+    """
+    Loads an object, such as model weights, once per process and shares it across component instances.
+
+    The object is held weakly: it stays shared for as long as at least one component instance holds it, and is
+    released with the last of them (e.g., once the service factories evict them). Concurrent loads of the same key
+    wait for the first one to finish.
+
+    Args:
+        key: Identifies the object, e.g. the model name along with every setting which changes the loaded weights.
+        loader: Loads the object. Its result must support weak references (models and tokenizers do).
+
+    Returns:
+        The shared object.
+    """
+    with _lock:
+        load_lock = _load_locks.setdefault(key, threading.Lock())
+
+    with load_lock:
+        shared_object = _shared_objects.get(key)
+        if shared_object is None:
+            shared_object = loader()
+            _shared_objects[key] = shared_object
+
+    return shared_object
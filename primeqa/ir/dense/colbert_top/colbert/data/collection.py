@@ -1,31 +1,158 @@
 
 # Could be .tsv or .json. The latter always allows more customization via optional parameters.
-# I think it could be worth doing some kind of parallel reads too, if the file exceeds 1 GiBs.
-# Just need to use a datastructure that shares things across processes without too much pickling.
-# I think multiprocessing.Manager can do that!
+# TSV collections are memory-mapped rather than loaded (see MappedTSV), so that ranks share them through the page cache.
 
+import io
 import os
-import itertools
+import csv
+import mmap
+
+import numpy as np
 
 from primeqa.ir.dense.colbert_top.colbert.evaluation.loaders import load_collection
 from primeqa.ir.dense.colbert_top.colbert.infra.run import Run
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+def _row_to_passage(row, pid):
+    # As in load_collection
+    assert row[0] == 'id' or int(row[0]) == pid, f"pid: {row[0]}, line_idx: {pid}"
+
+    passage = row[1] if len(row) > 1 else None
+    if len(row) > 2:
+        passage = row[2] + ' | ' + passage
+
+    return passage
+
+
+# Sidecar of MappedTSV: ROWS_FORMAT, the size and the mtime (ns) of the collection, then the offsets of its rows.
+# The offsets of rows, rather than of lines, differ from those saved by PassageStore as soon as a row is blank or spans
+# several lines, hence a file of its own.
+ROWS_SUFFIX = '.rows.npy'
+ROWS_FORMAT = 1
+
+
+class MappedTSV:
+    """
+        Read-only view of a TSV collection (pid, passage[, title]) which never holds the passages in memory.
+
+        The byte offset of every row is computed once and saved next to the collection as `<path>.rows.npy`, after a
+        header recording the format and the size and mtime of the collection it was computed from. Both files are then
+        memory-mapped: a passage is parsed from its bytes on access, and processes on the same host (e.g., ranks) share
+        the pages of the collection through the page cache. Pickling only carries the path.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.offsets = self._load_offsets()
+        self._mmap = None
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, item):
+        if isinstance(item, slice):
+            start, stop, step = item.indices(len(self))
+            if step != 1:
+                return [self[pid] for pid in range(start, stop, step)]
+
+            return self._read(start, stop)
+
+        pid = int(item)
+        if pid < 0:
+            pid += len(self)
+        if not 0 <= pid < len(self):
+            raise IndexError(f"pid {item} is out of range for a collection of {len(self):,} passages")
+
+        return self._read(pid, pid + 1)[0]
+
+    def __iter__(self):
+        # Sequential reads don't need random access, stream the file instead of faulting in its pages
+        with open(self.path, newline='') as f:
+            rows = (row for row in csv.reader(f, delimiter='\t') if row)
+            for pid, row in enumerate(rows):
+                yield _row_to_passage(row, pid)
+
+    def __getstate__(self):
+        return {'path': self.path}
+
+    def __setstate__(self, state):
+        self.__init__(state['path'])
+
+    def _read(self, start, stop):
+        if start >= stop:
+            return []
+
+        if self._mmap is None:
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        text = self._mmap[int(self.offsets[start]):int(self.offsets[stop])].decode('utf-8')
+        rows = (row for row in csv.reader(io.StringIO(text, newline=''), delimiter='\t') if row)
+
+        return [_row_to_passage(row, pid) for pid, row in zip(range(start, stop), rows)]
+
+    def _load_offsets(self):
+        offsets_path = self.path + ROWS_SUFFIX
+        stat = os.stat(self.path)
+        header = np.array([ROWS_FORMAT, stat.st_size, stat.st_mtime_ns], dtype=np.int64)
+
+        if os.path.exists(offsets_path):
+            saved = np.load(offsets_path, mmap_mode='r')
+            if len(saved) > len(header) and np.array_equal(saved[:len(header)], header) and saved[-1] == stat.st_size:
+                return saved[len(header):]
+
+        offsets = self._compute_offsets()
+
+        try:
+            # Ranks may race to save the same offsets, each through its own temporary file
+            tmp_path = f'{offsets_path}.{os.getpid()}.tmp.npy'
+            np.save(tmp_path, np.concatenate([header, offsets]))
+            os.replace(tmp_path, offsets_path)
+        except OSError:
+            print_message(f"#> Could not save the offsets of {self.path}, keeping them in memory only")
+
+        return offsets
+
+    def _compute_offsets(self):
+        print_message(f"#> Computing the row offsets of {self.path}..")
+
+        position = 0
+
+        def lines(f):
+            nonlocal position
+            for line in f:
+                position += len(line)
+                yield line.decode('utf-8')
+
+        # The reader pulls exactly the lines of each row (more than one when a quoted field spans lines).
+        # Blank lines are skipped, as by load_collection, so they are folded into the row before them.
+        offsets = []
+        with open(self.path, 'rb') as f:
+            start = 0
+            for row in csv.reader(lines(f), delimiter='\t'):
+                if row:
+                    offsets.append(start)
+                start = position
+
+        offsets.append(position)
+
+        return np.array(offsets, dtype=np.int64)
 
 
 class Collection:
-    def __init__(self, path=None, data=None):
+    def __init__(self, path=None, data=None, in_memory=False):
         self.path = path
-        self.data = data or self._load_file(path)
+        self.in_memory = in_memory
+        self.data = data if data is not None else self._load_file(path)
 
     def __iter__(self):
-        # TODO: If __data isn't there, stream from disk!
         return self.data.__iter__()
 
     def __getitem__(self, item):
-        # TODO: Load from disk the first time this is called. Unless self.data is already not None.
         return self.data[item]
 
     def __len__(self):
-        # TODO: Load here too. Basically, let's make data a property function and, on first call, either load or get __data.
         return len(self.data)
 
     def _load_file(self, path):
@@ -33,7 +160,10 @@ class Collection:
         return self._load_tsv(path) if path.endswith('.tsv') else self._load_jsonl(path)
 
     def _load_tsv(self, path):
-        return load_collection(path)
+        if self.in_memory:
+            return load_collection(path)
+
+        return MappedTSV(path)
 
     def _load_jsonl(self, path):
         raise NotImplementedError()
@@ -66,19 +196,10 @@ class Collection:
 
         chunksize = chunksize or self.get_chunksize()
 
-        offset = 0
-        iterator = iter(self)
-
-        for chunk_idx, owner in enumerate(itertools.cycle(range(Run().nranks))):
-            L = [line for _, line in zip(range(chunksize), iterator)]
-
-            if len(L) > 0 and owner == rank:
-                yield (chunk_idx, offset, L)
-
-            offset += len(L)
-
-            if len(L) < chunksize:
-                return
+        # Chunks are assigned to ranks round-robin, each rank only reads its own
+        for chunk_idx, offset in enumerate(range(0, len(self), chunksize)):
+            if chunk_idx % Run().nranks == rank:
+                yield (chunk_idx, offset, self[offset:offset + chunksize])
     
     def get_chunksize(self):
         return min(25_000, 1 + len(self) // Run().nranks)  # 25k is great, 10k allows things to reside on GPU??
@@ -15,6 +15,7 @@ from primeqa.ir.dense.colbert_top.colbert.infra.launcher import Launcher
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import create_directory, print_message
 
 from primeqa.ir.dense.colbert_top.colbert.indexing.collection_indexer import encode
+from primeqa.ir.dense.colbert_top.colbert.indexing.index_updater import IndexUpdater
 
 
 class Indexer:
@@ -86,6 +87,29 @@ class Indexer:
 
         return self.index_path
 
+    def add(self, name, collection):
+        """
+           Appends the passages of `collection` to the existing index `name`, reusing its centroids.
+           Returns the range of pids assigned to them: the passages must be appended to the index's collection in the same order.
+        """
+        self.configure(index_name=name)
+        self.index_path = self.config.index_path_
+
+        # Encode as the index was encoded (e.g., same doc_maxlen and nbits)
+        config = ColBERTConfig.from_existing(self.config, ColBERTConfig.load_from_index(self.index_path))
+        config.configure(index_path=self.index_path)
+
+        return IndexUpdater(config).add(collection)
+
+    def delete(self, name, pids, compact=False):
+        """
+           Deletes the passages `pids` from the existing index `name`. See `IndexUpdater.delete`.
+        """
+        self.configure(index_name=name)
+        self.index_path = self.config.index_path_
+
+        IndexUpdater(self.config).delete(pids, compact=compact)
+
     def __launch(self, collection):
         manager = mp.Manager()
         shared_lists = [manager.list() for _ in range(self.config.nranks)]
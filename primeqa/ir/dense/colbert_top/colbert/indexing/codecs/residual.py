@@ -282,7 +282,7 @@ class ResidualCodec:
 
         D = []
         for codes_, residuals_ in zip(codes.split(1 << 15), residuals.split(1 << 15)):
-            codes_, residuals_ = codes_.cuda(), residuals_.cuda()
+            codes_, residuals_ = codes_.cuda().int(), residuals_.cuda()
             centroids_ = ResidualCodec.decompress_residuals(
                 residuals_,
                 self.bucket_weights,
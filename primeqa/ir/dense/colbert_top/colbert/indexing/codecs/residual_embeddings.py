@@ -18,16 +18,17 @@ class ResidualEmbeddings:
         assert codes.dim() == 1 and residuals.dim() == 2, (codes.size(), residuals.size())
         assert residuals.dtype == torch.uint8, residuals.dtype
 
-        self.codes = codes.to(torch.int32)  # (num_embeddings,) int32
+        # (num_embeddings,) int32, or int16 as narrowed by the index loader for indexes with few enough centroids
+        self.codes = codes if codes.dtype == torch.int16 else codes.to(torch.int32)
         self.residuals = residuals   # (num_embeddings, compressed_dim) uint8
 
     @classmethod
-    def load_chunks(cls, index_path, chunk_idxs, num_embeddings):
+    def load_chunks(cls, index_path, chunk_idxs, num_embeddings, codes_dtype=torch.int32):
         num_embeddings += 512  # pad for access with strides
 
         dim, nbits = get_dim_and_nbits(index_path)
 
-        codes = torch.empty(num_embeddings, dtype=torch.int32)
+        codes = torch.empty(num_embeddings, dtype=codes_dtype)
         residuals = torch.empty(num_embeddings, dim // 8 * nbits, dtype=torch.uint8)
 
         codes_offset = 0
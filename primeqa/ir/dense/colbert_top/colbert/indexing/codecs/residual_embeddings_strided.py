@@ -10,7 +10,8 @@ class ResidualEmbeddingsStrided:
         self.use_gpu = self.codec.use_gpu
 
         self.codes_strided = StridedTensor(self.codes, doclens, use_gpu=self.use_gpu)
-        self.residuals_strided = StridedTensor(self.residuals, doclens, use_gpu=self.use_gpu)
+        self.residuals_strided = StridedTensor(self.residuals, doclens, use_gpu=self.use_gpu,
+                                               offsets=self.codes_strided.offsets)
 
     def lookup_eids(self, embedding_ids, codes=None, out_device='cuda'):
         codes = self.codes[embedding_ids] if codes is None else codes
@@ -18,8 +18,9 @@ from primeqa.ir.dense.colbert_top.colbert.modeling.checkpoint import Checkpoint
 from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection
 
 from primeqa.ir.dense.colbert_top.colbert.indexing.collection_encoder import CollectionEncoder
+from primeqa.ir.dense.colbert_top.colbert.indexing.encoding_pipeline import EncodingPipeline
 from primeqa.ir.dense.colbert_top.colbert.indexing.index_saver import IndexSaver
-from primeqa.ir.dense.colbert_top.colbert.indexing.utils import optimize_ivf
+from primeqa.ir.dense.colbert_top.colbert.indexing.utils import build_pid_ivf
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import flatten, print_message
 
 from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
@@ -286,6 +287,9 @@ class CollectionIndexer():
         # sample_avg_residual = (sample - sample_reconstruct).mean(dim=0)
 
     def index(self):
+        if not torch.cuda.is_available() and self.config.num_encoder_processes > 1:
+            return self._index_with_pipeline()
+
         with self.saver.thread():
             batches = self.collection.enumerate_batches(rank=self.rank)
             for chunk_idx, offset, passages in tqdm.tqdm(batches, disable=self.rank > 0):
@@ -302,6 +306,18 @@ class CollectionIndexer():
                 self.saver.save_chunk(chunk_idx, offset, embs, doclens)
                 del embs, doclens
 
+    def _index_with_pipeline(self):
+        pipeline = EncodingPipeline(self.config, self.checkpoint, self.config.num_encoder_processes)
+
+        with self.saver.thread():
+            batches = self.collection.enumerate_batches(rank=self.rank)
+            for chunk_idx, offset, embs, doclens in pipeline.run(batches):
+                Run().print_main(f"#> Saving chunk {chunk_idx}: \t {len(doclens):,} passages "
+                                 f"and {embs.size(0):,} embeddings. From #{offset:,} onward.")
+
+                self.saver.save_chunk(chunk_idx, offset, embs, doclens)
+                del embs, doclens
+
     def finalize(self):
         if self.rank > 0:
             return
@@ -344,49 +360,14 @@ class CollectionIndexer():
         assert len(self.embedding_offsets) == self.num_chunks, len(self.embedding_offsets)
 
     def _build_ivf(self):
-        # Maybe we should several small IVFs? Every 250M embeddings, so that's every 1 GB.
-        # It would save *memory* here and *disk space* regarding the int64.
-        # But we'd have to decide how many IVFs to use during retrieval: many (loop) or one?
-        # A loop seems nice if we can find a size that's large enough for speed yet small enough to fit on GPU!
-        # Then it would help nicely for batching later: 1GB.
-
-        codes = torch.empty(self.num_embeddings,)
-        print_memory_stats(f'RANK:{self.rank}')
-
-        for chunk_idx in range(self.num_chunks):
-            offset = self.embedding_offsets[chunk_idx]
-            chunk_codes = ResidualCodec.Embeddings.load_codes(self.config.index_path_, chunk_idx)
-
-            codes[offset:offset+chunk_codes.size(0)] = chunk_codes
-
-        print_message(f"offset: {offset}")
-        print_message(f"chunk codes size(0): {chunk_codes.size(0)}")
-        print_message(f"codes size(0): {codes.size(0)}")
-        print_message(f"codes size(): {codes.size()}")
-
-
-        assert offset+chunk_codes.size(0) == codes.size(0), (offset, chunk_codes.size(0), codes.size())
-
-
-        print_memory_stats(f'RANK:{self.rank}')
-
-        codes = codes.sort()
-        ivf, values = codes.indices, codes.values
-
-        print_memory_stats(f'RANK:{self.rank}')
-
-        partitions, ivf_lengths = values.unique_consecutive(return_counts=True)
-
-
-        print_message(f">>>>partition.size(0): {partitions.size(0)}")
-        print_message(f">>>>num_partition: {self.num_partitions}")
-
-        # All partitions should be non-empty. (We can use torch.histc otherwise.)
-        assert partitions.size(0) == self.num_partitions, (partitions.size(), self.num_partitions)
+        # Streams the codes of one chunk at a time, so memory stays bounded by the pid-level IVF itself.
+        _, ivf_lengths = build_pid_ivf(self.config.index_path_, self.num_chunks, self.num_partitions)
 
         print_memory_stats(f'RANK:{self.rank}')
 
-        _, _ = optimize_ivf(ivf, ivf_lengths, self.config.index_path_)
+        # All partitions should be non-empty.
+        num_nonempty_partitions = int((ivf_lengths > 0).sum())
+        assert num_nonempty_partitions == self.num_partitions, (num_nonempty_partitions, self.num_partitions)
 
     def _update_metadata(self):
         config = self.config
@@ -0,0 +1,181 @@
+"""
+Pipelined encoding of a collection on CPU-only hosts.
+
+The stages run concurrently and are connected by bounded queues, so that memory stays flat however far ahead the
+first stages get:
+
+1. a tokenizer thread sorts the passages of each chunk by length and tokenizes them into batches, padded only to the
+   longest passage of their batch;
+2. `num_encoders` encoder processes, each pinned to its own subset of the cores, run the model over the batches;
+3. a collector thread puts the embeddings of each chunk back into passage order;
+4. the caller compresses each chunk and hands it to the `IndexSaver` thread, which writes it to disk.
+"""
+
+import os
+import queue
+import threading
+import traceback
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+
+from primeqa.ir.dense.colbert_top.colbert.modeling.checkpoint import Checkpoint
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+
+def _encode_batches(config, cores, input_queue, output_queue):
+    if hasattr(os, 'sched_setaffinity'):
+        os.sched_setaffinity(0, cores)
+    torch.set_num_threads(len(cores))
+
+    try:
+        checkpoint = Checkpoint(config.checkpoint, colbert_config=config).cpu()
+
+        with torch.inference_mode():
+            for chunk_idx, batch_offset, input_ids, attention_mask in iter(input_queue.get, None):
+                D, mask = checkpoint.doc(input_ids, attention_mask, keep_dims='return_mask')
+                mask = mask.squeeze(-1)
+
+                output_queue.put((chunk_idx, batch_offset, D[mask].half(), mask.sum(-1)))
+    except Exception:
+        output_queue.put(traceback.format_exc())
+
+    output_queue.put(None)
+
+
+class _Chunk:
+    def __init__(self, offset, order, num_batches):
+        self.offset = offset
+        self.order = order
+        self.num_batches = num_batches
+        self.batches = {}
+
+
+class EncodingPipeline:
+    def __init__(self, config, checkpoint, num_encoders):
+        self.config = config
+        self.doc_tokenizer = checkpoint.doc_tokenizer
+        self.num_encoders = num_encoders
+
+    def run(self, batches):
+        """
+            Encodes the chunks of `batches`, as given by `Collection.enumerate_batches`.
+            Yields (chunk_idx, offset, embs, doclens) for each chunk, in the order their encoding completes.
+        """
+        context = mp.get_context('spawn')
+
+        self._input_queue = context.Queue(maxsize=4 * self.num_encoders)
+        self._output_queue = context.Queue(maxsize=4 * self.num_encoders)
+        self._chunks_queue = queue.Queue(maxsize=2)
+        self._chunks = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+        cores = sorted(os.sched_getaffinity(0)) if hasattr(os, 'sched_getaffinity') else list(range(os.cpu_count()))
+        cores_per_encoder = np.array_split(cores, min(self.num_encoders, len(cores)))
+        cores_per_encoder = [cores_per_encoder[idx % len(cores_per_encoder)].tolist() for idx in range(self.num_encoders)]
+
+        print_message(f"#> Encoding with {self.num_encoders} processes of {len(cores_per_encoder[0])} cores each..")
+
+        encoders = [context.Process(target=_encode_batches, args=(self.config, encoder_cores, self._input_queue, self._output_queue),
+                                    daemon=True)
+                    for encoder_cores in cores_per_encoder]
+        for encoder in encoders:
+            encoder.start()
+        self._encoders = encoders
+
+        tokenizer = threading.Thread(target=self._tokenize, args=(batches,), daemon=True)
+        collector = threading.Thread(target=self._collect, daemon=True)
+        tokenizer.start()
+        collector.start()
+
+        try:
+            for chunk in iter(self._chunks_queue.get, None):
+                if isinstance(chunk, Exception):
+                    raise chunk
+
+                yield chunk
+        finally:
+            self._stop.set()
+
+            for encoder in encoders:
+                encoder.terminate()
+                encoder.join()
+
+    def _put(self, queue_, item):
+        # Give up on a full queue once the pipeline is stopped, e.g., after a failure further down
+        while not self._stop.is_set():
+            try:
+                return queue_.put(item, timeout=1)
+            except queue.Full:
+                continue
+
+    def _tokenize(self, batches):
+        bsize = self.config.bsize
+
+        try:
+            for chunk_idx, offset, passages in batches:
+                # Sort by length, so that each batch is padded to about the length of its passages
+                order = sorted(range(len(passages)), key=lambda idx: len(passages[idx]))
+
+                with self._lock:
+                    self._chunks[chunk_idx] = _Chunk(offset, order, num_batches=-(-len(order) // bsize))
+
+                for batch_offset in range(0, len(order), bsize):
+                    batch_text = [passages[idx] for idx in order[batch_offset:batch_offset + bsize]]
+                    input_ids, attention_mask = self.doc_tokenizer.tensorize(batch_text)
+
+                    self._put(self._input_queue, (chunk_idx, batch_offset, input_ids, attention_mask))
+        except Exception:
+            self._put(self._chunks_queue, RuntimeError(f"Tokenization failed:\n{traceback.format_exc()}"))
+
+        for _ in range(self.num_encoders):
+            self._put(self._input_queue, None)
+
+    def _collect(self):
+        num_finished_encoders = 0
+
+        while num_finished_encoders < self.num_encoders:
+            try:
+                result = self._output_queue.get(timeout=60)
+            except queue.Empty:
+                # An encoder killed (e.g., by the OOM killer) never posts its None
+                exitcodes = [encoder.exitcode for encoder in self._encoders if not encoder.is_alive()]
+                if len(exitcodes) > num_finished_encoders:
+                    self._put(self._chunks_queue, RuntimeError(f"An encoder process died (exit codes: {exitcodes})"))
+                    return
+                continue
+
+            if result is None:
+                num_finished_encoders += 1
+                continue
+
+            if isinstance(result, str):
+                self._put(self._chunks_queue, RuntimeError(f"Encoding failed:\n{result}"))
+                return
+
+            chunk_idx, batch_offset, embs, doclens = result
+
+            with self._lock:
+                chunk = self._chunks[chunk_idx]
+                chunk.batches[batch_offset] = (embs.clone(), doclens.clone())
+                if len(chunk.batches) < chunk.num_batches:
+                    continue
+
+                del self._chunks[chunk_idx]
+
+            self._put(self._chunks_queue, (chunk_idx, chunk.offset, *self._restore_order(chunk)))
+
+        self._put(self._chunks_queue, None)
+
+    def _restore_order(self, chunk):
+        batches = [chunk.batches[batch_offset] for batch_offset in sorted(chunk.batches)]
+        sorted_doclens = torch.cat([doclens for _, doclens in batches])
+        sorted_embs = torch.cat([embs for embs, _ in batches]).split(sorted_doclens.tolist())
+
+        positions = torch.tensor(chunk.order).argsort().tolist()
+        embs = torch.cat([sorted_embs[position] for position in positions])
+        doclens = sorted_doclens[positions].tolist()
+
+        return embs, doclens
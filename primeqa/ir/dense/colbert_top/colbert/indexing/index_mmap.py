@@ -0,0 +1,167 @@
+"""
+Flat binary layout of a compressed ColBERT index that can be memory-mapped at search time.
+
+Each tensor needed by the searcher (codes, residuals, doclens and the pid-level IVF) is written as a
+single raw (native byte order) file, described by `mmap.json`. Mapping these files with `torch.from_file`
+lets a searcher start without deserializing or copying the index, and lets several processes on one
+host share the same pages through the page cache.
+
+Files are never rewritten in place: each one is written under a temporary name and moved over the previous
+version, so searchers that still map the previous version keep reading its (unlinked) inode.
+"""
+
+import os
+import argparse
+import ujson
+import torch
+import numpy as np
+
+from filelock import FileLock
+
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_doclens
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual_embeddings import ResidualEmbeddings, get_dim_and_nbits
+from primeqa.ir.dense.colbert_top.colbert.indexing.utils import optimize_ivf
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+MMAP_METADATA_FILENAME = 'mmap.json'
+MMAP_LOCK_FILENAME = 'mmap.lock'
+
+# Padding (in embeddings) appended to codes and residuals, as in ResidualEmbeddings.load_chunks, for access with strides
+EMBEDDINGS_PADDING = 512
+
+
+def has_mmap_layout(index_path):
+    """
+        True if the index has a memory-mapped layout that is consistent with its current `metadata.json`.
+    """
+    mmap_metadata_path = os.path.join(index_path, MMAP_METADATA_FILENAME)
+
+    if not os.path.exists(mmap_metadata_path):
+        return False
+
+    with open(mmap_metadata_path) as f:
+        mmap_metadata = ujson.load(f)
+
+    with open(os.path.join(index_path, 'metadata.json')) as f:
+        metadata = ujson.load(f)
+
+    return (mmap_metadata['num_chunks'], mmap_metadata['num_embeddings']) == (metadata['num_chunks'], metadata['num_embeddings'])
+
+
+def load_mmap_tensor(index_path, name):
+    """
+        Memory-maps the tensor `name` written by `convert_index_to_mmap`. The mapping is private and
+        read-only in practice: pages are shared across processes until written to, which the searcher never does.
+    """
+    with open(os.path.join(index_path, MMAP_METADATA_FILENAME)) as f:
+        entry = ujson.load(f)['tensors'][name]
+
+    shape = entry['shape']
+    numel = int(np.prod(shape))
+    dtype = getattr(torch, entry['dtype'])
+
+    tensor = torch.from_file(os.path.join(index_path, entry['filename']), shared=False, size=numel, dtype=dtype)
+
+    return tensor.view(*shape)
+
+
+def convert_index_to_mmap(index_path):
+    """
+        One-time conversion of an index saved as `.pt` chunks into the flat binary layout.
+        Chunks are streamed one at a time, so the conversion needs memory for a single chunk only.
+        `mmap.json` is written last, so a partially converted index is never picked up by the loader.
+        Processes that start together convert the index once: the others wait for the lock and reuse the layout.
+    """
+    with FileLock(os.path.join(index_path, MMAP_LOCK_FILENAME)):
+        if has_mmap_layout(index_path):
+            return
+
+        _convert_index_to_mmap(index_path)
+
+
+def _convert_index_to_mmap(index_path):
+    print_message(f"#> Converting the index at {index_path} to the memory-mapped layout..")
+
+    with open(os.path.join(index_path, 'metadata.json')) as f:
+        metadata = ujson.load(f)
+
+    num_chunks, num_embeddings = metadata['num_chunks'], metadata['num_embeddings']
+    dim, nbits = get_dim_and_nbits(index_path)
+    packed_dim = dim // 8 * nbits
+
+    tensors = {}
+
+    with open(_temporary_path(index_path, 'codes.bin'), 'wb') as codes_f, \
+         open(_temporary_path(index_path, 'residuals.bin'), 'wb') as residuals_f:
+        for chunk_idx in range(num_chunks):
+            chunk = ResidualEmbeddings.load(index_path, chunk_idx)
+            codes_f.write(chunk.codes.numpy().astype(np.int32).tobytes())
+            residuals_f.write(chunk.residuals.numpy().astype(np.uint8).tobytes())
+
+        codes_f.write(np.zeros(EMBEDDINGS_PADDING, dtype=np.int32).tobytes())
+        residuals_f.write(np.zeros((EMBEDDINGS_PADDING, packed_dim), dtype=np.uint8).tobytes())
+
+    _replace(index_path, 'codes.bin')
+    _replace(index_path, 'residuals.bin')
+
+    tensors['codes'] = _describe('codes.bin', 'int32', [num_embeddings + EMBEDDINGS_PADDING])
+    tensors['residuals'] = _describe('residuals.bin', 'uint8', [num_embeddings + EMBEDDINGS_PADDING, packed_dim])
+
+    doclens = np.asarray(load_doclens(index_path, flatten=True), dtype=np.int64)
+    assert doclens.sum() == num_embeddings, (doclens.sum(), num_embeddings)
+    tensors['doclens'] = _save_array(index_path, 'doclens.bin', doclens)
+
+    ivf, ivf_lengths = _load_pid_ivf(index_path)
+    ivf = ivf.numpy().astype(np.int32)
+    ivf_lengths = ivf_lengths.numpy().astype(np.int64)
+
+    # Pad the IVF in advance so that StridedTensor doesn't have to concatenate padding onto the mapped tensor
+    ivf = np.concatenate((ivf, np.zeros(int(ivf_lengths.max()), dtype=np.int32)))
+    tensors['ivf'] = _save_array(index_path, 'ivf.pid.bin', ivf)
+    tensors['ivf_lengths'] = _save_array(index_path, 'ivf.lengths.bin', ivf_lengths)
+
+    with open(_temporary_path(index_path, MMAP_METADATA_FILENAME), 'w') as f:
+        f.write(ujson.dumps({'num_chunks': num_chunks, 'num_embeddings': num_embeddings, 'tensors': tensors}, indent=4) + '\n')
+    _replace(index_path, MMAP_METADATA_FILENAME)
+
+    print_message(f"#> Saved the memory-mapped layout to {index_path}")
+
+
+def _load_pid_ivf(index_path):
+    if os.path.exists(os.path.join(index_path, "ivf.pid.pt")):
+        return torch.load(os.path.join(index_path, "ivf.pid.pt"), map_location='cpu')
+
+    assert os.path.exists(os.path.join(index_path, "ivf.pt")), f"ivf.pt not found in {index_path}"
+    ivf, ivf_lengths = torch.load(os.path.join(index_path, "ivf.pt"), map_location='cpu')
+    return optimize_ivf(ivf, ivf_lengths, index_path)
+
+
+def _temporary_path(index_path, filename):
+    return os.path.join(index_path, f'{filename}.tmp')
+
+
+def _replace(index_path, filename):
+    # A new inode, rather than truncating the file mapped by running searchers
+    os.replace(_temporary_path(index_path, filename), os.path.join(index_path, filename))
+
+
+def _save_array(index_path, filename, array):
+    array.tofile(_temporary_path(index_path, filename))
+    _replace(index_path, filename)
+    return _describe(filename, str(array.dtype), list(array.shape))
+
+
+def _describe(filename, dtype, shape):
+    return {'filename': filename, 'dtype': dtype, 'shape': shape}
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Convert a ColBERT index to the memory-mapped layout.')
+    parser.add_argument('--index_path', type=str, required=True)
+    args = parser.parse_args()
+
+    convert_index_to_mmap(args.index_path)
+
+
+if __name__ == "__main__":
+    main()
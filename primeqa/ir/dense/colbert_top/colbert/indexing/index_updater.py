@@ -0,0 +1,219 @@
+"""
+Incremental updates of an existing PLAID index, without re-training its centroids.
+
+New passages are encoded and compressed with the index's `ResidualCodec`, then saved as additional chunks. Their
+(centroid, pid) pairs are merged into `ivf.pid.pt`. Deleted passages are tombstoned in `deleted_pids.pt` and filtered
+out of the candidates at search time, so pids (i.e., line positions in the collection) never change. `compact` then
+drops tombstoned pids from the IVF. Their embeddings remain in the chunks until the index is rebuilt from scratch,
+which is also what re-clusters the centroids once the appended passages have drifted too far from the sample they
+were trained on.
+
+Searchers loaded before an update keep serving the previous state of the index and must be reloaded to pick it up.
+"""
+
+import os
+import ujson
+import torch
+
+from primeqa.ir.dense.colbert_top.colbert.infra.run import Run
+from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection
+from primeqa.ir.dense.colbert_top.colbert.modeling.checkpoint import Checkpoint
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
+from primeqa.ir.dense.colbert_top.colbert.indexing.collection_encoder import CollectionEncoder
+from primeqa.ir.dense.colbert_top.colbert.indexing.index_saver import IndexSaver
+from primeqa.ir.dense.colbert_top.colbert.indexing.index_mmap import MMAP_METADATA_FILENAME, _load_pid_ivf
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_doclens
+from primeqa.ir.dense.colbert_top.colbert.indexing.utils import group_pids_by_centroid
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message
+
+DELETED_PIDS_FILENAME = 'deleted_pids.pt'
+
+
+def load_deleted_pids(index_path):
+    """
+        Sorted tensor of the tombstoned pids of the index (empty if none were deleted).
+    """
+    deleted_pids_path = os.path.join(index_path, DELETED_PIDS_FILENAME)
+
+    if not os.path.exists(deleted_pids_path):
+        return torch.empty(0, dtype=torch.int32)
+
+    return torch.load(deleted_pids_path, map_location='cpu')
+
+
+def merge_ivf(ivf, ivf_lengths, codes, pids):
+    """
+        Adds the (centroid, pid) pairs given by `codes` and `pids` (one entry per embedding) to a pid-level IVF.
+        Lists stay sorted and free of duplicates, as built by `build_pid_ivf`.
+    """
+    num_partitions = ivf_lengths.size(0)
+    num_pids = 1 + max(int(ivf.max()) if ivf.numel() else 0, int(pids.max()) if pids.numel() else 0)
+
+    centroids = torch.arange(num_partitions).repeat_interleave(ivf_lengths.long())
+
+    return group_pids_by_centroid(torch.cat((centroids, codes.long())), torch.cat((ivf.long(), pids.long())),
+                                  num_partitions, num_pids)
+
+
+def prune_ivf(ivf, ivf_lengths, deleted_pids):
+    """
+        Removes `deleted_pids` from every list of a pid-level IVF.
+    """
+    centroids = torch.arange(ivf_lengths.size(0)).repeat_interleave(ivf_lengths.long())
+    keep = ~torch.isin(ivf, deleted_pids.to(ivf.dtype))
+
+    return ivf[keep], torch.bincount(centroids[keep], minlength=ivf_lengths.size(0))
+
+
+class IndexUpdater:
+    def __init__(self, config):
+        self.config = config
+        self.index_path = config.index_path_
+
+    def add(self, collection):
+        """
+            Encodes the passages of `collection` into new chunks of the index.
+            Returns the range of pids assigned to them, which follow the pids already in the index.
+        """
+        collection = Collection.cast(collection)
+
+        metadata = self._load_metadata()
+        first_chunk_idx = metadata['num_chunks']
+        first_pid = len(load_doclens(self.index_path, flatten=True))
+        embedding_offset = metadata['num_embeddings']
+
+        if len(collection) == 0:
+            return range(first_pid, first_pid)
+
+        # The memory-mapped layout no longer matches the index, drop it until it's converted again
+        self._remove_mmap_layout()
+
+        checkpoint = Checkpoint(self.config.checkpoint, colbert_config=self.config)
+        if torch.cuda.is_available():
+            checkpoint = checkpoint.cuda()
+
+        encoder = CollectionEncoder(self.config, checkpoint)
+        saver = IndexSaver(self.config)
+
+        chunksize = collection.get_chunksize()
+        chunk_idxs = []
+
+        with torch.inference_mode(), saver.thread():
+            for offset in range(0, len(collection), chunksize):
+                chunk_idx = first_chunk_idx + len(chunk_idxs)
+                passages = collection[offset:offset + chunksize]
+
+                embs, doclens = encoder.encode_passages(passages)
+                embs = embs.half()
+
+                Run().print_main(f"#> Appending chunk {chunk_idx}: \t {len(passages):,} passages "
+                                 f"and {embs.size(0):,} embeddings. From #{first_pid + offset:,} onward.")
+
+                saver.save_chunk(chunk_idx, first_pid + offset, embs, doclens)
+                chunk_idxs.append(chunk_idx)
+                del embs, doclens
+
+        new_codes, new_pids = [], []
+
+        for chunk_idx in chunk_idxs:
+            chunk_metadata = self._set_embedding_offset(chunk_idx, embedding_offset)
+            embedding_offset += chunk_metadata['num_embeddings']
+
+            with open(os.path.join(self.index_path, f'doclens.{chunk_idx}.json')) as f:
+                doclens = torch.tensor(ujson.load(f))
+
+            pids = torch.arange(chunk_metadata['passage_offset'], chunk_metadata['passage_offset'] + doclens.size(0))
+            new_codes.append(ResidualCodec.Embeddings.load_codes(self.index_path, chunk_idx))
+            new_pids.append(pids.repeat_interleave(doclens))
+
+        ivf, ivf_lengths = _load_pid_ivf(self.index_path)
+        ivf, ivf_lengths = merge_ivf(ivf, ivf_lengths, torch.cat(new_codes), torch.cat(new_pids))
+        self._save_ivf(ivf, ivf_lengths)
+
+        metadata['num_chunks'] = first_chunk_idx + len(chunk_idxs)
+        metadata['num_embeddings'] = embedding_offset
+        metadata['avg_doclen'] = embedding_offset / (first_pid + len(collection))
+        self._save_metadata(metadata)
+
+        print_message(f"#> Appended {len(collection):,} passages to the index at {self.index_path}")
+
+        return range(first_pid, first_pid + len(collection))
+
+    def delete(self, pids, compact=False):
+        """
+            Tombstones `pids`, so that they are no longer retrieved. With `compact`, they are also dropped from the IVF.
+        """
+        num_passages = len(load_doclens(self.index_path, flatten=True))
+
+        pids = torch.as_tensor(list(pids), dtype=torch.int32)
+        assert pids.numel() == 0 or (0 <= int(pids.min()) and int(pids.max()) < num_passages), \
+            f"pids must be in [0, {num_passages})"
+
+        deleted_pids = torch.unique(torch.cat((load_deleted_pids(self.index_path), pids)))
+
+        deleted_pids_path = os.path.join(self.index_path, DELETED_PIDS_FILENAME)
+        torch.save(deleted_pids, deleted_pids_path + '.tmp')
+        os.replace(deleted_pids_path + '.tmp', deleted_pids_path)
+
+        self._save_metadata(self._load_metadata())
+
+        print_message(f"#> {deleted_pids.numel():,} passages of the index at {self.index_path} are deleted")
+
+        if compact:
+            self.compact()
+
+    def compact(self):
+        """
+            Drops the tombstoned pids from the IVF, so that they no longer take part in candidate generation.
+        """
+        deleted_pids = load_deleted_pids(self.index_path)
+        if deleted_pids.numel() == 0:
+            return
+
+        self._remove_mmap_layout()
+
+        ivf, ivf_lengths = _load_pid_ivf(self.index_path)
+        self._save_ivf(*prune_ivf(ivf, ivf_lengths, deleted_pids))
+        self._save_metadata(self._load_metadata())
+
+        print_message(f"#> Compacted the IVF of the index at {self.index_path}")
+
+    def _load_metadata(self):
+        with open(os.path.join(self.index_path, 'metadata.json')) as f:
+            return ujson.load(f)
+
+    def _save_metadata(self, metadata):
+        # Every update bumps the version of the index, e.g., for retrievers to invalidate their caches
+        metadata['version'] = metadata.get('version', 0) + 1
+
+        metadata_path = os.path.join(self.index_path, 'metadata.json')
+
+        with open(metadata_path + '.tmp', 'w') as f:
+            f.write(ujson.dumps(metadata, indent=4) + '\n')
+
+        os.replace(metadata_path + '.tmp', metadata_path)
+
+    def _set_embedding_offset(self, chunk_idx, embedding_offset):
+        metadata_path = os.path.join(self.index_path, f'{chunk_idx}.metadata.json')
+
+        with open(metadata_path) as f:
+            chunk_metadata = ujson.load(f)
+
+        chunk_metadata['embedding_offset'] = embedding_offset
+
+        with open(metadata_path, 'w') as f:
+            f.write(ujson.dumps(chunk_metadata, indent=4) + '\n')
+
+        return chunk_metadata
+
+    def _save_ivf(self, ivf, ivf_lengths):
+        ivf_path = os.path.join(self.index_path, 'ivf.pid.pt')
+
+        torch.save((ivf, ivf_lengths), ivf_path + '.tmp')
+        os.replace(ivf_path + '.tmp', ivf_path)
+
+    def _remove_mmap_layout(self):
+        mmap_metadata_path = os.path.join(self.index_path, MMAP_METADATA_FILENAME)
+
+        if os.path.exists(mmap_metadata_path):
+            os.remove(mmap_metadata_path)
@@ -1,45 +1,41 @@
 import os
+import ujson
 import torch
 import tqdm
 
 from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_doclens
+from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual_embeddings import ResidualEmbeddings
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message, flatten
 
+
+def group_pids_by_centroid(codes, pids, num_partitions, num_pids):
+    """
+        Groups (centroid, pid) pairs, one per embedding, into a pid-level IVF: lists sorted by centroid, then pid,
+        without duplicates. Both are packed into a single int64 key, so that one sort groups and deduplicates them.
+        Returns the pids of the lists (int32) along with the length of each list.
+    """
+    keys = torch.unique(codes.long() * num_pids + pids.long())
+
+    ivf = (keys % num_pids).to(torch.int32)
+    ivf_lengths = torch.bincount(keys // num_pids, minlength=num_partitions)
+
+    return ivf, ivf_lengths
+
+
 def optimize_ivf(orig_ivf, orig_ivf_lengths, index_path):
     print_message("#> Optimizing IVF to store map from centroids to list of pids..")
 
     print_message("#> Building the emb2pid mapping..")
     all_doclens = load_doclens(index_path, flatten=False)
 
-    all_doclens = flatten(all_doclens)
-    total_num_embeddings = sum(all_doclens)
-
-    emb2pid = torch.zeros(total_num_embeddings, dtype=torch.int)
-
-    """
-    EVENTUALLY: Use two tensors. emb2pid_offsets will have every 256th element.
-    emb2pid_delta will have the delta from the corresponding offset,
-    """
-
-    offset_doclens = 0
-    for pid, dlength in enumerate(all_doclens):
-        emb2pid[offset_doclens: offset_doclens + dlength] = pid
-        offset_doclens += dlength
+    all_doclens = torch.tensor(flatten(all_doclens))
+    emb2pid = torch.arange(all_doclens.size(0), dtype=torch.int32).repeat_interleave(all_doclens)
 
     print_message("len(emb2pid) =", len(emb2pid))
 
-    ivf = emb2pid[orig_ivf]
-    unique_pids_per_centroid = []
-    ivf_lengths = []
-
-    offset = 0
-    for length in tqdm.tqdm(orig_ivf_lengths.tolist()):
-        pids = torch.unique(ivf[offset:offset+length])
-        unique_pids_per_centroid.append(pids)
-        ivf_lengths.append(pids.shape[0])
-        offset += length
-    ivf = torch.cat(unique_pids_per_centroid)
-    ivf_lengths = torch.tensor(ivf_lengths)
+    num_partitions = orig_ivf_lengths.size(0)
+    codes = torch.arange(num_partitions).repeat_interleave(orig_ivf_lengths.long())
+    ivf, ivf_lengths = group_pids_by_centroid(codes, emb2pid[orig_ivf.long()], num_partitions, all_doclens.size(0))
 
     original_ivf_path = os.path.join(index_path, 'ivf.pt')
     optimized_ivf_path = os.path.join(index_path, 'ivf.pid.pt')
@@ -51,3 +47,58 @@ def optimize_ivf(orig_ivf, orig_ivf_lengths, index_path):
     return ivf, ivf_lengths
 
 
+def build_pid_ivf(index_path, num_chunks, num_partitions):
+    """
+        Builds `ivf.pid.pt` straight from the saved chunks, streaming their codes from disk one chunk at a time.
+
+        Chunks hold disjoint, increasing ranges of pids, so the list of a centroid is the concatenation of its
+        per-chunk lists. A first pass counts the length of every per-chunk list, which gives the position of each
+        of them in the IVF. A second pass writes them in place. Memory is bounded by the IVF itself plus one chunk.
+    """
+    print_message("#> Building the IVF from centroids to list of pids..")
+
+    chunk_doclens = []
+    for chunk_idx in range(num_chunks):
+        with open(os.path.join(index_path, f'doclens.{chunk_idx}.json')) as f:
+            chunk_doclens.append(torch.tensor(ujson.load(f), dtype=torch.int64))
+
+    num_pids = sum(doclens.size(0) for doclens in chunk_doclens)
+
+    def chunk_ivf(chunk_idx, pid_offset):
+        codes = ResidualEmbeddings.load_codes(index_path, chunk_idx)
+        doclens = chunk_doclens[chunk_idx]
+        pids = torch.arange(pid_offset, pid_offset + doclens.size(0), dtype=torch.int32).repeat_interleave(doclens)
+
+        assert codes.size(0) == pids.size(0), (chunk_idx, codes.size(), pids.size())
+
+        return group_pids_by_centroid(codes, pids, num_partitions, num_pids)
+
+    # Pass 1: lengths of the per-chunk lists
+    chunk_ivf_lengths = []
+    pid_offset = 0
+    for chunk_idx in tqdm.tqdm(range(num_chunks)):
+        _, ivf_lengths = chunk_ivf(chunk_idx, pid_offset)
+        chunk_ivf_lengths.append(ivf_lengths)
+        pid_offset += chunk_doclens[chunk_idx].size(0)
+
+    ivf_lengths = torch.stack(chunk_ivf_lengths).sum(dim=0)
+    ivf_offsets = torch.cumsum(ivf_lengths, dim=0) - ivf_lengths
+
+    # Pass 2: copy each per-chunk list right after the lists of the previous chunks for the same centroid
+    ivf = torch.empty(int(ivf_lengths.sum()), dtype=torch.int32)
+    pid_offset = 0
+    for chunk_idx in tqdm.tqdm(range(num_chunks)):
+        chunk_ivf_, chunk_ivf_lengths_ = chunk_ivf(chunk_idx, pid_offset)
+
+        chunk_ivf_offsets = torch.cumsum(chunk_ivf_lengths_, dim=0) - chunk_ivf_lengths_
+        positions = torch.arange(chunk_ivf_.size(0)) + (ivf_offsets - chunk_ivf_offsets).repeat_interleave(chunk_ivf_lengths_)
+        ivf[positions] = chunk_ivf_
+
+        ivf_offsets += chunk_ivf_lengths_
+        pid_offset += chunk_doclens[chunk_idx].size(0)
+
+    optimized_ivf_path = os.path.join(index_path, 'ivf.pid.pt')
+    torch.save((ivf, ivf_lengths), optimized_ivf_path)
+    print_message(f"#> Saved optimized IVF to {optimized_ivf_path}")
+
+    return ivf, ivf_lengths
@@ -149,6 +149,9 @@ class TrainingSettings:
 
     shuffle_every_epoch: bool = DefaultVal(False)
 
+    # Number of processes assembling batches from pre-tokenized triples (0 tokenizes each batch in the training process)
+    num_batcher_workers: int = DefaultVal(0)
+
     save_steps: int = DefaultVal(2000)
     save_epochs: int = DefaultVal(-1)
     epochs: int = DefaultVal(10)
@@ -179,6 +182,10 @@ class IndexingSettings:
     kmeans_niters: int = DefaultVal(20)
 
     num_partitions_max: int = DefaultVal(10000000)
+
+    # CPU only: number of encoder processes of the pipelined indexer (0 or 1 encodes in the indexing process)
+    num_encoder_processes: int = DefaultVal(0)
+
     @property
     def index_path_(self):
         return self.index_path or os.path.join(self.index_root_, self.index_name)
@@ -188,3 +195,5 @@ class SearchSettings:
     ncells: int = DefaultVal(None)
     centroid_score_threshold: float = DefaultVal(None)
     ndocs: int = DefaultVal(None)
+    search_batch_size: int = DefaultVal(None)
+    load_index_with_mmap: bool = DefaultVal(False)
@@ -1,3 +1,3 @@
 from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.query_tokenization import *
 from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.doc_tokenization import *
-from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import tensorize_triples
+from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization.utils import tensorize_triples, split_triples
@@ -20,6 +20,10 @@ def tensorize_triples(query_tokenizer, doc_tokenizer, queries, passages, scores,
 
     # (positive_ids, negative_ids), (positive_mask, negative_mask) = D_ids, D_mask
 
+    return split_triples(Q_ids, Q_mask, D_ids, D_mask, scores, bsize, nway)
+
+
+def split_triples(Q_ids, Q_mask, D_ids, D_mask, scores, bsize, nway):
     query_batches = _split_into_batches(Q_ids, Q_mask, bsize)
     doc_batches = _split_into_batches(D_ids, D_mask, bsize * nway)
     # positive_batches = _split_into_batches(positive_ids, positive_mask, bsize)
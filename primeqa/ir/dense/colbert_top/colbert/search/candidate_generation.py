@@ -18,6 +18,25 @@ class CandidateGeneration:
         cells = cells.unique(sorted=False)
         return cells, scores
 
+    def get_cells_batch(self, Q, ncells):
+        """
+            Supply Q = (num_queries, query_maxlen, dim). The centroids are scored against every query
+            token of the batch in a single matrix product. Returns the probed cells as a
+            (num_queries, query_maxlen * ncells) tensor and the centroid scores per query as
+            (num_queries, num_centroids, query_maxlen).
+        """
+        num_queries, query_maxlen, dim = Q.size()
+
+        scores = (self.codec.centroids @ Q.reshape(-1, dim).T)  # (num_centroids, num_queries * query_maxlen)
+        if ncells == 1:
+            cells = scores.argmax(dim=0, keepdim=True).permute(1, 0)
+        else:
+            cells = scores.topk(ncells, dim=0, sorted=False).indices.permute(1, 0)
+        cells = cells.reshape(num_queries, -1)
+
+        scores = scores.view(-1, num_queries, query_maxlen).permute(1, 0, 2)
+        return cells, scores
+
     def generate_candidate_eids(self, Q, ncells):
         cells, scores = self.get_cells(Q, ncells)
 
@@ -61,3 +80,27 @@ class CandidateGeneration:
             pids, pids_counts = pids.cuda(), pids_counts.cuda()
 
         return pids, centroid_scores
+
+    def generate_candidates_batch(self, config, Q):
+        """
+            Batched counterpart of `generate_candidates`. Returns a list with the sorted, deduplicated
+            candidate pids of each query and the per-query centroid scores.
+        """
+        ncells = config.ncells
+
+        assert isinstance(self.ivf, StridedTensor)
+        assert Q.dim() == 3
+
+        if self.use_gpu:
+            Q = Q.cuda().half()
+
+        cells, scores = self.get_cells_batch(Q, ncells)
+
+        all_pids = []
+        for query_cells in cells:
+            pids, cell_lengths = self.ivf.lookup(query_cells.unique(sorted=False))
+            if self.use_gpu:
+                pids = pids.cuda()
+            all_pids.append(torch.unique(pids, sorted=True))
+
+        return all_pids, scores
@@ -1,7 +1,8 @@
 #include <pthread.h>
 #include <torch/extension.h>
 
-typedef struct decompress_args {
+template <typename code_t>
+struct decompress_args_t {
     int tid;
     int nthreads;
 
@@ -17,15 +18,16 @@ typedef struct decompress_args {
     uint8_t* reversed_bit_map;
     uint8_t* bucket_weight_combinations;
     uint8_t* binary_residuals;
-    int* codes;
+    code_t* codes;
     float* centroids;
     int64_t* cumulative_lengths;
 
     float* output;
-} decompress_args_t;
+};
 
+template <typename code_t>
 void* decompress(void* args) {
-    decompress_args_t* decompress_args = (decompress_args_t*)args;
+    decompress_args_t<code_t>* decompress_args = (decompress_args_t<code_t>*)args;
 
     int npids_per_thread = (int)std::ceil(((float)decompress_args->npids) /
                                           decompress_args->nthreads);
@@ -77,7 +79,8 @@ void* decompress(void* args) {
     return NULL;
 }
 
-torch::Tensor decompress_residuals(
+template <typename code_t>
+torch::Tensor decompress_residuals_impl(
     const torch::Tensor pids, const torch::Tensor lengths,
     const torch::Tensor offsets, const torch::Tensor bucket_weights,
     const torch::Tensor reversed_bit_map,
@@ -96,7 +99,7 @@ torch::Tensor decompress_residuals(
     uint8_t* bucket_weight_combinations_a =
         bucket_weight_combinations.data_ptr<uint8_t>();
     uint8_t* binary_residuals_a = binary_residuals.data_ptr<uint8_t>();
-    int* codes_a = codes.data_ptr<int>();
+    code_t* codes_a = codes.data_ptr<code_t>();
     float* centroids_a = centroids.data_ptr<float>();
 
     int64_t cumulative_lengths[npids + 1];
@@ -116,7 +119,7 @@ torch::Tensor decompress_residuals(
     auto nthreads = at::get_num_threads();
 
     pthread_t threads[nthreads];
-    decompress_args_t args[nthreads];
+    decompress_args_t<code_t> args[nthreads];
 
     for (int i = 0; i < nthreads; i++) {
         args[i].tid = i;
@@ -140,7 +143,7 @@ torch::Tensor decompress_residuals(
 
         args[i].output = output_a;
 
-        int rc = pthread_create(&threads[i], NULL, decompress, (void*)&args[i]);
+        int rc = pthread_create(&threads[i], NULL, decompress<code_t>, (void*)&args[i]);
         if (rc) {
             fprintf(stderr, "Unable to create thread %d: %d\n", i, rc);
             std::exit(1);
@@ -154,6 +157,27 @@ torch::Tensor decompress_residuals(
     return output;
 }
 
+// Codes are int16 when the index has few enough centroids, see IndexLoader
+torch::Tensor decompress_residuals(
+    const torch::Tensor pids, const torch::Tensor lengths,
+    const torch::Tensor offsets, const torch::Tensor bucket_weights,
+    const torch::Tensor reversed_bit_map,
+    const torch::Tensor bucket_weight_combinations,
+    const torch::Tensor binary_residuals, const torch::Tensor codes,
+    const torch::Tensor centroids, const int dim, const int nbits) {
+    if (codes.dtype() == torch::kInt16) {
+        return decompress_residuals_impl<int16_t>(
+            pids, lengths, offsets, bucket_weights, reversed_bit_map,
+            bucket_weight_combinations, binary_residuals, codes, centroids,
+            dim, nbits);
+    } else {
+        return decompress_residuals_impl<int>(
+            pids, lengths, offsets, bucket_weights, reversed_bit_map,
+            bucket_weight_combinations, binary_residuals, codes, centroids,
+            dim, nbits);
+    }
+}
+
 PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
     m.def("decompress_residuals_cpp", &decompress_residuals,
           "Decompress residuals");
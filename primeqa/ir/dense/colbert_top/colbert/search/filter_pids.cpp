@@ -6,7 +6,8 @@
 #include <numeric>
 #include <utility>
 
-typedef struct maxsim_args {
+template <typename code_t>
+struct maxsim_args_t {
     int tid;
     int nthreads;
 
@@ -16,16 +17,17 @@ typedef struct maxsim_args {
 
     int* pids;
     float* centroid_scores;
-    int* codes;
+    code_t* codes;
     int64_t* doclens;
     int64_t* offsets;
     bool* idx;
 
     std::priority_queue<std::pair<float, int>> approx_scores;
-} maxsim_args_t;
+};
 
+template <typename code_t>
 void* maxsim(void* args) {
-    maxsim_args_t* maxsim_args = (maxsim_args_t*)args;
+    maxsim_args_t<code_t>* maxsim_args = (maxsim_args_t<code_t>*)args;
 
     float per_doc_approx_scores[maxsim_args->nquery_vectors];
     for (int k = 0; k < maxsim_args->nquery_vectors; k++) {
@@ -68,14 +70,15 @@ void* maxsim(void* args) {
     return NULL;
 }
 
+template <typename code_t>
 void filter_pids_helper(int ncentroids, int nquery_vectors, int npids,
-                        int* pids, float* centroid_scores, int* codes,
+                        int* pids, float* centroid_scores, code_t* codes,
                         int64_t* doclens, int64_t* offsets, bool* idx,
                         int nfiltered_docs, int* filtered_pids) {
     auto nthreads = at::get_num_threads();
 
     pthread_t threads[nthreads];
-    maxsim_args_t args[nthreads];
+    maxsim_args_t<code_t> args[nthreads];
 
     for (int i = 0; i < nthreads; i++) {
         args[i].tid = i;
@@ -94,7 +97,7 @@ void filter_pids_helper(int ncentroids, int nquery_vectors, int npids,
 
         args[i].approx_scores = std::priority_queue<std::pair<float, int>>();
 
-        int rc = pthread_create(&threads[i], NULL, maxsim, (void*)&args[i]);
+        int rc = pthread_create(&threads[i], NULL, maxsim<code_t>, (void*)&args[i]);
         if (rc) {
             fprintf(stderr, "Unable to create thread %d: %d\n", i, rc);
             std::exit(1);
@@ -123,7 +126,8 @@ void filter_pids_helper(int ncentroids, int nquery_vectors, int npids,
     }
 }
 
-torch::Tensor filter_pids(const torch::Tensor pids,
+template <typename code_t>
+torch::Tensor filter_pids_impl(const torch::Tensor pids,
                           const torch::Tensor centroid_scores,
                           const torch::Tensor codes,
                           const torch::Tensor doclens,
@@ -135,7 +139,7 @@ torch::Tensor filter_pids(const torch::Tensor pids,
 
     auto pids_a = pids.data_ptr<int>();
     auto centroid_scores_a = centroid_scores.data_ptr<float>();
-    auto codes_a = codes.data_ptr<int>();
+    auto codes_a = codes.data_ptr<code_t>();
     auto doclens_a = doclens.data_ptr<int64_t>();
     auto offsets_a = offsets.data_ptr<int64_t>();
     auto idx_a = idx.data_ptr<bool>();
@@ -163,6 +167,22 @@ torch::Tensor filter_pids(const torch::Tensor pids,
         .clone();
 }
 
+// Codes are int16 when the index has few enough centroids, see IndexLoader
+torch::Tensor filter_pids(const torch::Tensor pids,
+                          const torch::Tensor centroid_scores,
+                          const torch::Tensor codes,
+                          const torch::Tensor doclens,
+                          const torch::Tensor offsets, const torch::Tensor idx,
+                          int nfiltered_docs) {
+    if (codes.dtype() == torch::kInt16) {
+        return filter_pids_impl<int16_t>(pids, centroid_scores, codes, doclens,
+                                         offsets, idx, nfiltered_docs);
+    } else {
+        return filter_pids_impl<int>(pids, centroid_scores, codes, doclens,
+                                     offsets, idx, nfiltered_docs);
+    }
+}
+
 PYBIND11_MODULE(TORCH_EXTENSION_NAME, m) {
     m.def("filter_pids_cpp", &filter_pids, "Filter pids");
 }
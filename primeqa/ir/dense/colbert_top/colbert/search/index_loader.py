@@ -6,19 +6,26 @@ import numpy as np
 from primeqa.ir.dense.colbert_top.colbert.utils.utils import lengths2offsets, print_message, dotdict, flatten
 from primeqa.ir.dense.colbert_top.colbert.indexing.codecs.residual import ResidualCodec
 from primeqa.ir.dense.colbert_top.colbert.indexing.utils import optimize_ivf
+from primeqa.ir.dense.colbert_top.colbert.indexing.index_mmap import has_mmap_layout, load_mmap_tensor, convert_index_to_mmap
+from primeqa.ir.dense.colbert_top.colbert.indexing.index_updater import load_deleted_pids
 from primeqa.ir.dense.colbert_top.colbert.search.strided_tensor import StridedTensor
 
 
 class IndexLoader:
-    def __init__(self, index_path, use_gpu=torch.cuda.is_available()):
+    def __init__(self, index_path, use_gpu=torch.cuda.is_available(), load_index_with_mmap=False):
         self.index_path = index_path
         self.use_gpu = use_gpu
+        self.load_index_with_mmap = load_index_with_mmap
+
+        if self.load_index_with_mmap and not has_mmap_layout(self.index_path):
+            convert_index_to_mmap(self.index_path)
 
         self._load_codec()
         self._load_ivf()
 
         self._load_doclens()
         self._load_embeddings()
+        self._load_deleted_pids()
 
     def _load_codec(self):
         print_message(f"#> Loading codec...")
@@ -27,30 +34,59 @@ class IndexLoader:
     def _load_ivf(self):
         print_message(f"#> Loading IVF...")
 
-        if os.path.exists(os.path.join(self.index_path, "ivf.pid.pt")):
+        if self.load_index_with_mmap:
+            ivf = load_mmap_tensor(self.index_path, 'ivf')
+            ivf_lengths = load_mmap_tensor(self.index_path, 'ivf_lengths')
+        elif os.path.exists(os.path.join(self.index_path, "ivf.pid.pt")):
             ivf, ivf_lengths = torch.load(os.path.join(self.index_path, "ivf.pid.pt"), map_location='cpu')
         else:
             assert os.path.exists(os.path.join(self.index_path, "ivf.pt")), f"ivf.pt not found in {self.index_path}"
             ivf, ivf_lengths = torch.load(os.path.join(self.index_path, "ivf.pt"), map_location='cpu')
             ivf, ivf_lengths = optimize_ivf(ivf, ivf_lengths, self.index_path)
 
-        ivf = StridedTensor(ivf, ivf_lengths, use_gpu=self.use_gpu)
+        # Older indexes may hold int64 pids
+        ivf = StridedTensor(ivf.to(torch.int32), ivf_lengths, use_gpu=self.use_gpu)
 
         self.ivf = ivf
 
     def _load_doclens(self):
+        if self.load_index_with_mmap:
+            self.doclens = load_mmap_tensor(self.index_path, 'doclens')
+            return
+
         doclens = []
 
+        # One tensor per chunk, rather than a Python int per passage. Doclens stay int64, as the search kernels
+        # and the offsets of the strided tensors index with them.
         for chunk_idx in range(self.num_chunks):
             with open(os.path.join(self.index_path, f'doclens.{chunk_idx}.json')) as f:
-                chunk_doclens = ujson.load(f)
-                doclens.extend(chunk_doclens)
+                doclens.append(torch.tensor(ujson.load(f), dtype=torch.int64))
 
-        self.doclens = torch.tensor(doclens)
+        self.doclens = torch.cat(doclens)
 
     def _load_embeddings(self):
+        if self.load_index_with_mmap:
+            self.embeddings = ResidualCodec.Embeddings(load_mmap_tensor(self.index_path, 'codes'),
+                                                       load_mmap_tensor(self.index_path, 'residuals'))
+            return
+
+        # Halve the memory of the codes whenever every centroid id fits in an int16
+        codes_dtype = torch.int16 if self.codec.centroids.size(0) <= 2 ** 15 else torch.int32
+
         self.embeddings = ResidualCodec.Embeddings.load_chunks(self.index_path, range(self.num_chunks),
-                                                               self.num_embeddings)
+                                                               self.num_embeddings, codes_dtype=codes_dtype)
+
+    def _load_deleted_pids(self):
+        deleted_pids = load_deleted_pids(self.index_path)
+
+        # One flag per pid, so that tombstoned candidates are dropped with a single lookup
+        self.pid_is_deleted = None
+        if deleted_pids.numel() > 0:
+            print_message(f"#> Loaded {deleted_pids.numel():,} deleted pids...")
+            self.pid_is_deleted = torch.zeros(len(self.doclens), dtype=torch.bool)
+            self.pid_is_deleted[deleted_pids.long()] = True
+            if self.use_gpu:
+                self.pid_is_deleted = self.pid_is_deleted.cuda()
 
     @property
     def metadata(self):
@@ -20,13 +20,15 @@ from torch.utils.cpp_extension import load
 import sys
 
 class IndexScorer(IndexLoader, CandidateGeneration):
-    def __init__(self, index_path, use_gpu):
-        super().__init__(index_path, use_gpu=use_gpu)
+    def __init__(self, index_path, use_gpu, load_index_with_mmap=False):
+        super().__init__(index_path, use_gpu=use_gpu, load_index_with_mmap=load_index_with_mmap)
 
         IndexScorer.try_load_torch_extensions(use_gpu)
 
         self.embeddings_strided = ResidualEmbeddingsStrided(self.codec, self.embeddings, self.doclens)
 
+        self.report_memory()
+
     @classmethod
     def try_load_torch_extensions(cls, use_gpu):
         if hasattr(cls, "loaded_extensions") or use_gpu:
@@ -89,13 +91,52 @@ class IndexScorer(IndexLoader, CandidateGeneration):
 
         return embedding_ids, centroid_scores
 
+    def drop_deleted_pids(self, pids):
+        if self.pid_is_deleted is None:
+            return pids
+
+        return pids[~self.pid_is_deleted[pids.long()]]
+
     def embedding_ids_to_pids(self, embedding_ids):
-        all_pids = torch.unique(self.emb2pid[embedding_ids.long()].cuda(), sorted=False)
+        # The offsets of the passages' embeddings stand in for a full emb2pid mapping
+        offsets = self.embeddings_strided.codes_strided.offsets
+        pids = torch.searchsorted(offsets, embedding_ids.long().to(offsets.device), right=True) - 1
+        if self.use_gpu:
+            pids = pids.cuda()
+        all_pids = torch.unique(pids, sorted=False)
         return all_pids
 
+    def memory_usage(self):
+        """
+            Bytes held by each component of the loaded index. With `load_index_with_mmap`, codes, residuals,
+            doclens and the IVF are mapped from disk and shared by every searcher on the host.
+        """
+        components = {
+            'centroids': self.codec.centroids,
+            'ivf': self.ivf.tensor,
+            'ivf_lengths': self.ivf.lengths,
+            'ivf_offsets': self.ivf.offsets,
+            'doclens': self.doclens,
+            'doclens_offsets': self.embeddings_strided.codes_strided.offsets,
+            'codes': self.embeddings.codes,
+            'residuals': self.embeddings.residuals,
+        }
+        if self.pid_is_deleted is not None:
+            components['deleted_pids'] = self.pid_is_deleted
+
+        return {name: tensor.numel() * tensor.element_size() for name, tensor in components.items()}
+
+    def report_memory(self):
+        memory_usage = self.memory_usage()
+
+        print_message(f"#> Index memory: {sum(memory_usage.values()) / 2 ** 30:,.2f} GiB "
+                      f"({'mapped' if self.load_index_with_mmap else 'loaded'}), of which: " +
+                      ", ".join(f"{name} = {num_bytes / 2 ** 20:,.1f} MiB" for name, num_bytes in memory_usage.items()))
+
     def rank(self, config, Q, k):
         with torch.inference_mode():
             pids, centroid_scores = self.retrieve(config, Q)
+            pids = self.drop_deleted_pids(pids)
             scores, pids = self.score_pids(config, Q, pids, centroid_scores)
 
             scores_sorter = scores.sort(descending=True)
@@ -103,6 +144,42 @@ class IndexScorer(IndexLoader, CandidateGeneration):
 
             return pids, scores
 
+    def rank_batch(self, config, Q, k):
+        """
+            Batched counterpart of `rank` for Q = (num_queries, *, dim).
+
+            Centroid scoring runs as a single matrix product for the whole batch. Candidates are pruned
+            per query, but every passage that survives pruning is decompressed only once for the batch,
+            however many queries retrieved it. Returns one (pids, scores) pair per query.
+        """
+        with torch.inference_mode():
+            all_pids, all_centroid_scores = self.generate_candidates_batch(config, Q[:, :config.query_maxlen])
+
+            all_pids = [self.filter_pids_by_centroids(config, self.drop_deleted_pids(pids), centroid_scores.contiguous())
+                        for pids, centroid_scores in zip(all_pids, all_centroid_scores)]
+            num_pids = [len(pids) for pids in all_pids]
+
+            if sum(num_pids) == 0:
+                return [([], []) for _ in all_pids]
+
+            batch_pids, batch_idxs = torch.unique(torch.cat(all_pids), return_inverse=True)
+            D_packed, D_lengths = self.decompress_pids(batch_pids)
+            D_strided = StridedTensor(D_packed, D_lengths, use_gpu=self.use_gpu)
+
+            results = []
+            for query_idx, (pids, idxs) in enumerate(zip(all_pids, batch_idxs.split(num_pids))):
+                if len(pids) == 0:
+                    results.append(([], []))
+                    continue
+
+                D_packed_, D_lengths_ = D_strided.lookup(idxs)
+                scores = colbert_score_packed(Q[query_idx:query_idx+1], D_packed_, D_lengths_, config)
+
+                scores_sorter = scores.sort(descending=True)
+                results.append((pids[scores_sorter.indices].tolist(), scores_sorter.values.tolist()))
+
+            return results
+
     def score_pids(self, config, Q, pids, centroid_scores):
         """
             Always supply a flat list or tensor for `pids`.
@@ -112,6 +189,25 @@ class IndexScorer(IndexLoader, CandidateGeneration):
             Otherwise, each query matrix will be compared against the *aligned* passage.
         """
 
+        pids = self.filter_pids_by_centroids(config, pids, centroid_scores)
+
+        # Rank final list of docs using full approximate embeddings (including residuals)
+        D_packed, D_mask = self.decompress_pids(pids)
+
+        if Q.size(0) == 1:
+            return colbert_score_packed(Q, D_packed, D_mask, config), pids
+
+        D_strided = StridedTensor(D_packed, D_mask, use_gpu=self.use_gpu)
+        D_padded, D_lengths = D_strided.as_padded_tensor()
+
+        return colbert_score(Q, D_padded, D_lengths, config), pids
+
+    def filter_pids_by_centroids(self, config, pids, centroid_scores):
+        """
+            Prunes the candidate `pids` of a single query down to at most `config.ndocs // 4` passages,
+            using only the centroid scores of their codes (no residual decompression).
+        """
+
         # TODO: Remove batching?
         batch_size = 2 ** 20
 
@@ -158,31 +254,30 @@ class IndexScorer(IndexLoader, CandidateGeneration):
                     self.embeddings_strided.codes_strided.offsets, idx, config.ndocs
                 )
 
-        # Rank final list of docs using full approximate embeddings (including residuals)
-        if self.use_gpu:
-            D_packed, D_mask = self.lookup_pids(pids)
-        else:
-            D_packed = IndexScorer.decompress_residuals(
-                    pids,
-                    self.doclens,
-                    self.embeddings_strided.codes_strided.offsets,
-                    self.codec.bucket_weights,
-                    self.codec.reversed_bit_map,
-                    self.codec.decompression_lookup_table,
-                    self.embeddings.residuals,
-                    self.embeddings.codes,
-                    self.codec.centroids,
-                    self.codec.dim,
-                    self.codec.nbits
-                )
-            D_packed = torch.nn.functional.normalize(D_packed.to(torch.float32), p=2, dim=-1)
-            D_mask = self.doclens[pids.long()]
-
-        if Q.size(0) == 1:
-            return colbert_score_packed(Q, D_packed, D_mask, config), pids
-
-        D_strided = StridedTensor(D_packed, D_mask, use_gpu=self.use_gpu)
-        D_padded, D_lengths = D_strided.as_padded_tensor()
+        return pids
 
-        return colbert_score(Q, D_padded, D_lengths, config), pids
+    def decompress_pids(self, pids):
+        """
+            Returns the packed, normalized approximate embeddings (including residuals) of `pids`
+            along with their lengths.
+        """
+        if self.use_gpu:
+            return self.lookup_pids(pids)
+
+        D_packed = IndexScorer.decompress_residuals(
+                pids,
+                self.doclens,
+                self.embeddings_strided.codes_strided.offsets,
+                self.codec.bucket_weights,
+                self.codec.reversed_bit_map,
+                self.codec.decompression_lookup_table,
+                self.embeddings.residuals,
+                self.embeddings.codes,
+                self.codec.centroids,
+                self.codec.dim,
+                self.codec.nbits
+            )
+        D_packed = torch.nn.functional.normalize(D_packed.to(torch.float32), p=2, dim=-1)
+        D_mask = self.doclens[pids.long()]
 
+        return D_packed, D_mask
@@ -130,6 +130,8 @@ torch::Tensor segmented_lookup(const torch::Tensor input,
                                const torch::Tensor offsets) {
     if (input.dtype() == torch::kUInt8) {
         return segmented_lookup_impl<uint8_t>(input, pids, lengths, offsets);
+    } else if (input.dtype() == torch::kInt16) {
+        return segmented_lookup_impl<int16_t>(input, pids, lengths, offsets);
     } else if (input.dtype() == torch::kInt32) {
         return segmented_lookup_impl<int>(input, pids, lengths, offsets);
     } else if (input.dtype() == torch::kInt64) {
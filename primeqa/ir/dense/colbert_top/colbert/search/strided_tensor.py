@@ -11,8 +11,8 @@ from torch.utils.cpp_extension import load
 
 
 class StridedTensor(StridedTensorCore):
-    def __init__(self, packed_tensor, lengths, dim=None, use_gpu=torch.cuda.is_available()):
-        super().__init__(packed_tensor, lengths, dim=dim, use_gpu=use_gpu)
+    def __init__(self, packed_tensor, lengths, dim=None, use_gpu=torch.cuda.is_available(), offsets=None):
+        super().__init__(packed_tensor, lengths, dim=dim, use_gpu=use_gpu, offsets=offsets)
 
         StridedTensor.try_load_torch_extensions(use_gpu)
 
@@ -7,7 +7,7 @@ from primeqa.ir.dense.colbert_top.colbert.utils.utils import flatten
 
 
 class StridedTensorCore:
-    def __init__(self, packed_tensor, lengths, dim=None, use_gpu=torch.cuda.is_available()):
+    def __init__(self, packed_tensor, lengths, dim=None, use_gpu=torch.cuda.is_available(), offsets=None):
         self.dim = dim
         self.tensor = packed_tensor
         self.inner_dims = self.tensor.size()[1:]
@@ -18,8 +18,11 @@ class StridedTensorCore:
         self.strides = _select_strides(self.lengths, [.5, .75, .9, .95]) + [self.lengths.max().item()]
         self.max_stride = self.strides[-1]
 
-        zero = torch.zeros(1, dtype=torch.long, device=self.lengths.device)
-        self.offsets = torch.cat((zero, torch.cumsum(self.lengths, dim=0)))
+        # Tensors strided by the same lengths can share their offsets
+        if offsets is None:
+            zero = torch.zeros(1, dtype=torch.long, device=self.lengths.device)
+            offsets = torch.cat((zero, torch.cumsum(self.lengths, dim=0)))
+        self.offsets = offsets
 
         if self.offsets[-2] + self.max_stride > self.tensor.size(0):
             # if self.tensor.size(0) > 10_000_000:
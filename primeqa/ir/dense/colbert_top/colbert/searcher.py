@@ -64,7 +64,7 @@ class Searcher:
         if use_gpu:
             self.checkpoint = self.checkpoint.cuda()
 
-        self.ranker = IndexScorer(self.index, use_gpu)
+        self.ranker = IndexScorer(self.index, use_gpu, load_index_with_mmap=self.config.load_index_with_mmap)
 
         print_memory_stats()
 
@@ -97,6 +97,51 @@ class Searcher:
         scores = colbert_score(Q, D, attention_mask, self.config)
         return scores
 
+    def rescore_batch(self, text_queries: List[str], text_documents: List[List[str]], bsize=128):
+        """
+            Scores each query of `text_queries` against its own list of documents in `text_documents`, in one pass.
+            Documents shared by several queries are encoded once, in batches of documents of about the same length,
+            each padded only to its longest document. Returns one list of scores per query.
+        """
+        from primeqa.ir.dense.colbert_top.colbert.modeling.colbert import colbert_score
+
+        docs = list(dict.fromkeys(doc for docs_ in text_documents for doc in docs_))
+        scores = [[0.0] * len(docs_) for docs_ in text_documents]
+        if len(docs) == 0:
+            return scores
+
+        with torch.inference_mode():
+            Q = self.encode(list(text_queries))
+
+            self.checkpoint.doc_tokenizer.doc_maxlen = self.config.doc_maxlen
+            batches, reverse_indices = self.checkpoint.doc_tokenizer.tensorize(docs, bsize=bsize)
+
+            # Group the (query, document) pairs by the batch which holds the document
+            doc_positions = dict(zip(docs, reverse_indices.tolist()))
+            pairs_per_batch = [[] for _ in batches]
+            for query_idx, docs_ in enumerate(text_documents):
+                for rank, doc in enumerate(docs_):
+                    position = doc_positions[doc]
+                    pairs_per_batch[position // bsize].append((query_idx, rank, position % bsize))
+
+            for (input_ids, attention_mask), pairs in zip(batches, pairs_per_batch):
+                # Documents are padded to the longest of the collection, trim the batch to its own longest
+                doc_maxlen = int(attention_mask.sum(-1).max())
+                input_ids, attention_mask = input_ids[:, :doc_maxlen], attention_mask[:, :doc_maxlen]
+
+                D = self.checkpoint.doc(input_ids, attention_mask, keep_dims=True)
+
+                for offset in range(0, len(pairs), bsize):
+                    query_idxs, ranks, rows = zip(*pairs[offset:offset+bsize])
+                    rows = torch.tensor(rows)
+
+                    pair_scores = colbert_score(Q[list(query_idxs)], D[rows], attention_mask[rows], self.config)
+
+                    for query_idx, rank, score in zip(query_idxs, ranks, pair_scores.tolist()):
+                        scores[query_idx][rank] = score
+
+        return scores
+
     def search(self, text: str, k=10):
         assert not self.rescore_only,  f"It looks like the engine was initialized for rescoring only."
         return self.dense_search(self.encode(text), k)
@@ -110,9 +155,24 @@ class Searcher:
 
         return self._search_all_Q(queries, Q, k)
 
+    def search_all_encoded(self, queries: TextQueries, Q: torch.Tensor, k=10):
+        """
+            Counterpart of `search_all` for queries already encoded by `encode`, e.g. from a cache.
+        """
+        assert not self.rescore_only,  f"It looks like the engine was initialized for rescoring only."
+        return self._search_all_Q(Queries.cast(queries), Q, k)
+
     def _search_all_Q(self, queries, Q, k):
-        all_scored_pids = [list(zip(*self.dense_search(Q[query_idx:query_idx+1], k=k)))
-                           for query_idx in tqdm(range(Q.size(0)))]
+        search_batch_size = self.config.search_batch_size
+
+        if search_batch_size and search_batch_size > 1:
+            all_scored_pids = []
+            for offset in tqdm(range(0, Q.size(0), search_batch_size)):
+                all_scored_pids.extend(list(zip(*scored_pids))
+                                       for scored_pids in self.dense_search_batch(Q[offset:offset+search_batch_size], k=k))
+        else:
+            all_scored_pids = [list(zip(*self.dense_search(Q[query_idx:query_idx+1], k=k)))
+                               for query_idx in tqdm(range(Q.size(0)))]
 
         data = {qid: val for qid, val in zip(queries.keys(), all_scored_pids)}
 
@@ -124,7 +184,7 @@ class Searcher:
 
         return Ranking(data=data, provenance=provenance)
 
-    def dense_search(self, Q: torch.Tensor, k=10):
+    def _configure_search_defaults(self, k):
         if k <= 10:
             if self.config.ncells is None:
                 self.configure(ncells=1)
@@ -147,6 +207,22 @@ class Searcher:
             if self.config.ndocs is None:
                 self.configure(ndocs=max(k * 4, 4096))
 
+    def dense_search(self, Q: torch.Tensor, k=10):
+        self._configure_search_defaults(k)
+
         pids, scores = self.ranker.rank(self.config, Q, k)
 
         return pids[:k], list(range(1, k+1)), scores[:k]
+
+    def dense_search_batch(self, Q: torch.Tensor, k=10):
+        """
+            Searches a batch of query matrices Q = (num_queries, *, dim) at once.
+            Returns one (pids, ranks, scores) triple per query, as `dense_search` does for a single query.
+        """
+        self._configure_search_defaults(k)
+
+        results = []
+        for pids, scores in self.ranker.rank_batch(self.config, Q, k):
+            results.append((pids[:k], list(range(1, k+1)), scores[:k]))
+
+        return results
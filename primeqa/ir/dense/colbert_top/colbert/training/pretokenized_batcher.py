@@ -0,0 +1,323 @@
+"""
+Training batches assembled from pre-tokenized queries and passages by background processes.
+
+The queries and the collection are tokenized once into token-id arrays, which are saved next to them, or in the run
+directory when theirs is read-only (see `TokenizedTexts`), and memory-mapped afterwards. Later runs and the other ranks therefore skip tokenization.
+
+The training process keeps the order of the triples and the position in it, as `LazyBatcher` does. It hands the
+triples of the next batches to worker processes, which look up their tokens and pad them into batches. At most
+`prefetch` batches are in flight. `shuffle` and `skip_to_batch` discard the batches prefetched for the previous
+order or position, so both behave exactly as with `LazyBatcher`.
+"""
+
+import os
+import time
+import queue
+import random
+import hashlib
+import traceback
+
+import numpy as np
+import torch
+import torch.multiprocessing as mp
+import ujson
+
+from primeqa.ir.dense.colbert_top.colbert.infra.config.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.infra.run import Run
+from primeqa.ir.dense.colbert_top.colbert.utils.utils import print_message, zipstar
+from primeqa.ir.dense.colbert_top.colbert.modeling.tokenization import split_triples
+from primeqa.ir.dense.colbert_top.colbert.modeling.factory import get_query_tokenizer, get_doc_tokenizer
+
+from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection
+from primeqa.ir.dense.colbert_top.colbert.data.queries import Queries
+from primeqa.ir.dense.colbert_top.colbert.data.examples import Examples
+
+
+class TokenizedTexts:
+    """
+        Token ids and attention mask of a list of texts, as given by a tokenizer's `tensorize`, without the trailing
+        padding. The rows of all texts are concatenated in `ids.bin` (int32) and `mask.bin` (int8), and row i spans
+        offsets[i]:offsets[i+1]. `keys.json` optionally maps keys (e.g., qids) to row numbers.
+    """
+
+    def __init__(self, path):
+        self.path = path
+
+        with open(os.path.join(path, 'metadata.json')) as f:
+            metadata = ujson.load(f)
+
+        self.pad_token_id = metadata['pad_token_id']
+        self.offsets = np.load(os.path.join(path, 'offsets.npy'), mmap_mode='r')
+        self.ids = np.memmap(os.path.join(path, 'ids.bin'), dtype=np.int32, mode='r') if self.offsets[-1] else None
+        self.mask = np.memmap(os.path.join(path, 'mask.bin'), dtype=np.int8, mode='r') if self.offsets[-1] else None
+
+        self.keys = None
+        if os.path.exists(os.path.join(path, 'keys.json')):
+            with open(os.path.join(path, 'keys.json')) as f:
+                self.keys = {key: row for row, key in enumerate(ujson.load(f))}
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def tensorize(self, rows):
+        """
+            Pads the given rows to the longest of them, as `tensorize` pads a batch of texts.
+        """
+        starts, ends = self.offsets[rows], self.offsets[np.asarray(rows) + 1]
+        maxlen = int((ends - starts).max())
+
+        ids = np.full((len(rows), maxlen), self.pad_token_id, dtype=np.int64)
+        mask = np.zeros((len(rows), maxlen), dtype=np.int64)
+
+        for idx, (start, end) in enumerate(zip(starts, ends)):
+            ids[idx, :end - start] = self.ids[start:end]
+            mask[idx, :end - start] = self.mask[start:end]
+
+        return ids, mask
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(os.path.join(path, 'metadata.json'))
+
+    @classmethod
+    def build(cls, path, texts, tokenizer, keys=None, chunksize=10_000):
+        """
+            Tokenizes `texts` (an iterable, e.g., a streamed collection) chunk by chunk with `tokenizer.tensorize`.
+        """
+        os.makedirs(path, exist_ok=True)
+
+        pad_token_id = tokenizer.tok.pad_token_id
+        all_lengths = []
+
+        with open(os.path.join(path, 'ids.bin'), 'wb') as ids_file, open(os.path.join(path, 'mask.bin'), 'wb') as mask_file:
+            def save_chunk(chunk):
+                ids, mask = tokenizer.tensorize(chunk)
+
+                # Trailing padding is dropped and restored by `tensorize`, anything else (e.g., [MASK]) is kept
+                positions = torch.arange(1, ids.size(1) + 1)
+                lengths = (~((ids == pad_token_id) & (mask == 0)) * positions).max(dim=1).values
+                kept = positions - 1 < lengths.unsqueeze(1)
+
+                ids_file.write(ids[kept].numpy().astype(np.int32).tobytes())
+                mask_file.write(mask[kept].numpy().astype(np.int8).tobytes())
+                all_lengths.append(lengths.numpy())
+
+            chunk = []
+            for text in texts:
+                chunk.append(text)
+                if len(chunk) == chunksize:
+                    save_chunk(chunk)
+                    chunk = []
+                    print_message(f"#> Tokenized {sum(map(len, all_lengths)):,} texts..")
+
+            if chunk:
+                save_chunk(chunk)
+
+        offsets = np.zeros(1 + sum(map(len, all_lengths)), dtype=np.int64)
+        if all_lengths:
+            np.cumsum(np.concatenate(all_lengths), out=offsets[1:])
+        np.save(os.path.join(path, 'offsets.npy'), offsets)
+
+        if keys is not None:
+            with open(os.path.join(path, 'keys.json'), 'w') as f:
+                ujson.dump(list(keys), f)
+
+        # Written last, as it marks the directory as complete
+        with open(os.path.join(path, 'metadata.json'), 'w') as f:
+            ujson.dump({'pad_token_id': pad_token_id, 'num_texts': len(offsets) - 1}, f)
+
+        return cls(path)
+
+
+def _tokenized_path(source_path, tokenizer, checkpoint, maxlen):
+    key = f'{type(tokenizer).__name__}|{checkpoint}|{maxlen}|{getattr(tokenizer, "attend_to_mask_tokens", None)}'
+    digest = hashlib.md5(key.encode()).hexdigest()[:16]
+
+    run_path = os.path.join(Run().path_, 'tokenized', digest)
+    if source_path is None:
+        return run_path
+
+    # Next to the source, unless its directory is read-only (and the texts weren't tokenized there before)
+    path = os.path.join(f'{source_path}.tokenized', digest)
+    if TokenizedTexts.exists(path):
+        return path
+
+    try:
+        os.makedirs(path, exist_ok=True)
+    except OSError:
+        return run_path
+
+    return path if os.access(path, os.W_OK) else run_path
+
+
+def _assemble_batches(queries_path, collection_path, nway, task_queue, result_queue):
+    torch.set_num_threads(1)
+
+    try:
+        queries = TokenizedTexts(queries_path)
+        collection = TokenizedTexts(collection_path)
+    except Exception:
+        result_queue.put((None, None, traceback.format_exc()))
+        return
+
+    for generation, offset, triples in iter(task_queue.get, None):
+        try:
+            query_rows, pids, all_scores = [], [], []
+
+            # As in LazyBatcher.__next__
+            for query, *pids_ in triples:
+                pids_ = pids_[:nway]
+
+                try:
+                    pids_, scores = zipstar(pids_)
+                except:
+                    scores = []
+
+                query_rows.append(queries.keys[query])
+                pids.extend(pids_)
+                all_scores.extend(scores)
+
+            assert len(all_scores) in [0, len(pids)], len(all_scores)
+
+            result_queue.put((generation, offset, (*queries.tensorize(query_rows), *collection.tensorize(pids), all_scores)))
+        except Exception:
+            result_queue.put((generation, offset, traceback.format_exc()))
+
+
+class PretokenizedBatcher():
+    def __init__(self, config: ColBERTConfig, triples, queries, collection, rank=0, nranks=1):
+        self.bsize, self.accumsteps = config.bsize, config.accumsteps
+        self.nway = config.nway
+        self.num_workers = config.num_batcher_workers
+        self.prefetch = 4 * self.num_workers
+
+        self.position = 0
+        self.triples = Examples.cast(triples, nway=self.nway).tolist(rank, nranks)
+
+        queries = Queries.cast(queries)
+        collection = Collection.cast(collection)
+
+        query_tokenizer = get_query_tokenizer(config.checkpoint, config)
+        doc_tokenizer = get_doc_tokenizer(config.checkpoint, config)
+
+        self.queries_path = _tokenized_path(queries.path, query_tokenizer, config.checkpoint, config.query_maxlen)
+        self.collection_path = _tokenized_path(collection.path, doc_tokenizer, config.checkpoint, config.doc_maxlen)
+
+        # The first rank tokenizes, the others wait for it and map its arrays. They poll for them rather than wait in a
+        # barrier, as tokenizing a large collection takes longer than the timeout of collectives.
+        if rank < 1:
+            if not TokenizedTexts.exists(self.queries_path):
+                print_message(f"#> Tokenizing {len(queries):,} queries into {self.queries_path}")
+                TokenizedTexts.build(self.queries_path, queries.values(), query_tokenizer, keys=queries.keys())
+
+            if not TokenizedTexts.exists(self.collection_path):
+                print_message(f"#> Tokenizing {len(collection):,} passages into {self.collection_path}")
+                TokenizedTexts.build(self.collection_path, collection, doc_tokenizer)
+        else:
+            self._wait_for_tokenized_texts()
+
+        self._workers = None
+        self._generation = 0
+        self._next_offset = None
+        self._ready = {}
+
+    def _wait_for_tokenized_texts(self, poll_secs=5, log_secs=300):
+        waited_secs = 0
+        while not (TokenizedTexts.exists(self.queries_path) and TokenizedTexts.exists(self.collection_path)):
+            if waited_secs % log_secs == 0:
+                print_message(f"#> Waiting for the first rank to tokenize into {self.queries_path} and {self.collection_path}..")
+
+            time.sleep(poll_secs)
+            waited_secs += poll_secs
+
+    def __iter__(self):
+        return self
+
+    def __len__(self):
+        return len(self.triples)
+
+    def __next__(self):
+        offset, endpos = self.position, min(self.position + self.bsize, len(self.triples))
+        self.position = endpos
+
+        if offset + self.bsize > len(self.triples):
+            raise StopIteration
+
+        self._dispatch(offset)
+        Q_ids, Q_mask, D_ids, D_mask, scores = self._wait_for(offset)
+
+        return split_triples(torch.from_numpy(Q_ids), torch.from_numpy(Q_mask),
+                             torch.from_numpy(D_ids), torch.from_numpy(D_mask),
+                             scores, self.bsize // self.accumsteps, self.nway)
+
+    def _start_workers(self):
+        context = mp.get_context('spawn')
+
+        self._task_queue = context.Queue()
+        self._result_queue = context.Queue()
+
+        self._workers = [context.Process(target=_assemble_batches,
+                                         args=(self.queries_path, self.collection_path, self.nway,
+                                               self._task_queue, self._result_queue),
+                                         daemon=True)
+                         for _ in range(self.num_workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def _dispatch(self, offset):
+        if self._workers is None:
+            self._start_workers()
+
+        if self._next_offset is None:
+            self._next_offset = offset
+
+        # Keep the next `prefetch` (full) batches in flight
+        while self._next_offset + self.bsize <= len(self.triples) and self._next_offset < offset + self.prefetch * self.bsize:
+            triples = self.triples[self._next_offset:self._next_offset + self.bsize]
+            self._task_queue.put((self._generation, self._next_offset, triples))
+            self._next_offset += self.bsize
+
+    def _wait_for(self, offset):
+        while offset not in self._ready:
+            try:
+                generation, offset_, batch = self._result_queue.get(timeout=60)
+            except queue.Empty:
+                if not all(worker.is_alive() for worker in self._workers):
+                    raise RuntimeError(f"A batcher worker died (exit codes: {[worker.exitcode for worker in self._workers]})")
+                continue
+
+            if isinstance(batch, str):
+                raise RuntimeError(f"Assembling a batch failed:\n{batch}")
+
+            # Batches prefetched before a shuffle or a skip are stale
+            if generation == self._generation:
+                self._ready[offset_] = batch
+
+        return self._ready.pop(offset)
+
+    def _discard_prefetched(self):
+        self._generation += 1
+        self._next_offset = None
+        self._ready = {}
+
+    def close(self):
+        if self._workers is None:
+            return
+
+        for worker in self._workers:
+            worker.terminate()
+            worker.join()
+
+        self._workers = None
+
+    # adding shuffle
+    def shuffle(self):
+        print_message("#> Shuffling triples...")
+        random.shuffle(self.triples)
+        self._discard_prefetched()
+
+    # adding for training loop logic
+    def skip_to_batch(self, batch_idx, intended_batch_size):
+        print_message(f'Skipping to batch #{batch_idx} (with intended_batch_size = {intended_batch_size}) for training.')
+        self.position = intended_batch_size * batch_idx
+        self._discard_prefetched()
@@ -23,6 +23,7 @@ from primeqa.ir.dense.colbert_top.colbert.training.eager_batcher_v2 import Eager
 
 from primeqa.ir.dense.colbert_top.colbert.utils.amp import MixedPrecisionManager
 from primeqa.ir.dense.colbert_top.colbert.training.lazy_batcher import LazyBatcher
+from primeqa.ir.dense.colbert_top.colbert.training.pretokenized_batcher import PretokenizedBatcher
 from primeqa.ir.dense.colbert_top.colbert.parameters import DEVICE
 
 from primeqa.ir.dense.colbert_top.colbert.modeling.colbert import ColBERT
@@ -101,6 +102,8 @@ def train(config: ColBERTConfig, triples, queries=None, collection=None):
     if collection is not None:
         if config.reranker:
             reader = RerankBatcher(config, triples, queries, collection, (0 if config.rank == -1 else config.rank), config.nranks)
+        elif config.num_batcher_workers > 0:
+            reader = PretokenizedBatcher(config, triples, queries, collection, (0 if config.rank == -1 else config.rank), config.nranks)
         else:
             reader = LazyBatcher(config, triples, queries, collection, (0 if config.rank == -1 else config.rank), config.nranks)
         assert config.teacher_checkpoint is None, "Student/Teacher training is not supported for numerical triples (yet)"
@@ -385,6 +388,10 @@ def train(config: ColBERTConfig, triples, queries=None, collection=None):
                     # manage_checkpoints(config, colbert, optimizer, amp, batch_idx + 1, num_per_epoch, epoch_idx, train_loss)
                     manage_checkpoints_with_path_save(config, colbert, optimizer, amp, batch_idx + 1, num_per_epoch, epoch_idx, train_loss)
 
+    # stop the worker processes of the reader, if any
+    if isinstance(reader, PretokenizedBatcher):
+        reader.close()
+
     # save last model
     name = os.path.join(path, "colbert-LAST.dnn")
     print_message('name:' + name)
@@ -52,6 +52,8 @@ class Arguments():
 
         # adding shuffle option
         self.add_argument('--shuffle_every_epoch', dest='shuffle_every_epoch', default=False, action='store_true')
+        # pre-tokenized triples, assembled into batches by background processes
+        self.add_argument('--num_batcher_workers', dest='num_batcher_workers', default=0, type=int)
         # support checkpoint
         self.add_argument('--save_every', dest='save_every', default=None, type=int)
         # TODO: deprecate save_steps and save_epochs
@@ -157,6 +157,10 @@ class DPRIndexingArguments:
         default=True, metadata={"help": "Use sharded index"}
     )
 
+    columnar_index: bool = field(
+        default=True, metadata={"help": "Store passage vectors in a memory mappable float16 .npy matrix, separate from the passage records"}
+    )
+
 
 @dataclass
 class DPRSearchArguments:
@@ -207,4 +211,8 @@ class DPRSearchArguments:
 
     max_doc_length: int = field(
         default=128, metadata={"help": "Maximum number of tokens in a document"}
+    )
+
+    shard_search_threads: int = field(
+        default=0, metadata={"help": "Number of threads searching the shards of a sharded index concurrently (0 for one per shard)"}
     )
\ No newline at end of file
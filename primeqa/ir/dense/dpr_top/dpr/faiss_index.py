@@ -1,5 +1,5 @@
 import numpy as np
-from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import Corpus
+from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import Corpus, passages_shard_name
 from primeqa.ir.dense.dpr_top.util.args_help import fill_from_args
 import faiss
 from primeqa.ir.dense.dpr_top.util.reporting import Reporting
@@ -76,10 +76,9 @@ def build_index(corpus_dir, output_file, opts: IndexOptions):
         max_norm = 0
         num_vectors = 0
         start_time = time.time()
-        for psg in corpus:
-            vector = psg['vector']
-            max_norm = max(max_norm, np.linalg.norm(vector))
-            num_vectors += 1
+        for vector_batch in corpus.iter_vectors(opts.index_batch_size):
+            max_norm = max(max_norm, np.linalg.norm(vector_batch.astype(np.float32), axis=1).max())
+            num_vectors += len(vector_batch)
         print(f'found max norm = {max_norm} over {num_vectors} vectors in {(time.time()-start_time)/60} min.')
         opts.max_norm = max_norm
         opts.num_vectors = num_vectors
@@ -133,18 +132,21 @@ def build_index(corpus_dir, output_file, opts: IndexOptions):
 
     report = Reporting()
 
-    for pndx, psg in enumerate(corpus):
-        if (pndx % 100000) == 0:
-            logger.info(f'processed {pndx} passages')
+    pndx = 0
+    for vector_batch in corpus.iter_vectors(opts.index_batch_size):
         if report.is_time():
             print(report.progress_str(instance_name='vector'))
-        vector = psg['vector']
-        vectors[vector_ndx] = vector
-        vector_ndx += 1
-        if vector_ndx == opts.index_batch_size:
-            logger.info(f'processed {pndx} passages')
-            add_to_index(vectors)
-            vector_ndx = 0
+        batch_ndx = 0
+        while batch_ndx < len(vector_batch):
+            count = min(len(vector_batch) - batch_ndx, opts.index_batch_size - vector_ndx)
+            vectors[vector_ndx:vector_ndx + count] = vector_batch[batch_ndx:batch_ndx + count]
+            vector_ndx += count
+            batch_ndx += count
+            pndx += count
+            if vector_ndx == opts.index_batch_size:
+                logger.info(f'processed {pndx} passages')
+                add_to_index(vectors)
+                vector_ndx = 0
     if vector_ndx > 0:
         add_to_index(vectors[:vector_ndx])
     logger.info(f'processed {len(corpus)} passages')
@@ -159,7 +161,7 @@ if __name__ == "__main__":
     class CmdOptions(IndexOptions):
         def __init__(self):
             super().__init__()
-            self.collection = ''  # can be a directory with passages*.json.gz.records or a single such file
+            self.collection = ''  # can be a directory with passages*.json.gz.records (or passages*.json.records) or a single such file
             self.__required_args__ = ['collection']
 
     opts = CmdOptions()
@@ -169,8 +171,8 @@ if __name__ == "__main__":
         output_file = os.path.join(opts.collection, 'index.faiss')
     else:
         base_dir, filename = os.path.split(opts.collection)
-        assert filename.startswith('passages') and filename.endswith('.json.gz.records')
-        index_fname = f'index{filename[len("passages"):-len(".json.gz.records")]}.faiss'
+        assert passages_shard_name(filename) is not None
+        index_fname = f'index{passages_shard_name(filename)}.faiss'
         output_file = os.path.join(base_dir, index_fname)
 
     build_index(opts.collection, output_file, opts)
@@ -8,7 +8,8 @@ from typing import List
 import numpy as np
 import re
 
-from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import gzip_str
+from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import gzip_str, ColumnarCorpusWriter, LEGACY_RECORDS_SUFFIX, RECORDS_SUFFIX, \
+    pid_hash, write_pid_index
 from primeqa.ir.dense.dpr_top.dpr.faiss_index import build_index, IndexOptions
 
 from primeqa.ir.dense.dpr_top.util.reporting import Reporting
@@ -32,6 +33,7 @@ class Options(IndexOptions):
         self.collection = ''
         self.output_dir = ''  # the output_dir will have the passages dataset and the hnsw_index.faiss
         self.bsize = 16
+        self.columnar_index = True  # write float16 vectors to a memory mappable vectors*.npy instead of inside the passage records
         self.__required_args__ = ['output_dir']
         self.max_doc_length=128 # to match dataloader_biencoder.make_batch : self.ctx_tokenizer(ctx_titles, ctx_texts
 
@@ -63,11 +65,12 @@ class DPRIndexer():
         return embeddings.detach().cpu().to(dtype=torch.float16).numpy()
 
 
-    def write(self, cur_offset, offsets, passage_file, doc_batch: List[Passage], embeddings):
+    def write(self, cur_offset, offsets, passage_file, doc_batch: List[Passage], embeddings, pid_hashes):
         assert len(doc_batch) == embeddings.shape[0]
         assert len(embeddings.shape) == 2
         for di, doc in enumerate(doc_batch):
             doc = doc.to_dict()
+            pid_hashes.append(pid_hash(doc['pid']))
             doc['vector'] = base64.b64encode(embeddings[di].astype(np.float16)).decode('ascii')
             jstr_gz = gzip_str(json.dumps(doc))
             offsets.append(cur_offset)
@@ -77,9 +80,23 @@ class DPRIndexer():
 
 
     def index(self):
+        name = f'_{self.embed_num}_of_{self.embed_count}'
+        records_suffix = RECORDS_SUFFIX if self.opts.columnar_index else LEGACY_RECORDS_SUFFIX
         offsets = []
+        pid_hashes = []
         cur_offset = 0
-        passages = write_open(os.path.join(self.opts.output_dir, f'passages_{self.embed_num}_of_{self.embed_count}.json.gz.records'), binary=True)
+        if self.opts.columnar_index:
+            writer = ColumnarCorpusWriter(self.opts.output_dir, name)
+        else:
+            passages = write_open(os.path.join(self.opts.output_dir, f'passages{name}{records_suffix}'), binary=True)
+
+        def write_batch(doc_batch):
+            nonlocal cur_offset
+            embeddings = self.embed(doc_batch, self.ctx_encoder, self.ctx_tokenizer)
+            if self.opts.columnar_index:
+                writer.write([doc.to_dict() for doc in doc_batch], embeddings)
+            else:
+                cur_offset = self.write(cur_offset, offsets, passages, doc_batch, embeddings, pid_hashes)
 
         report = Reporting()
         doc_batch = []
@@ -92,21 +109,23 @@ class DPRIndexer():
                 logger.info(f'on instance {report.check_count}, {report.check_count/report.elapsed_seconds()} instances per second')
             doc_batch.append(passage)
             if len(doc_batch) == self.opts.bsize:
-                embeddings = self.embed(doc_batch, self.ctx_encoder, self.ctx_tokenizer)
-                cur_offset = self.write(cur_offset, offsets, passages, doc_batch, embeddings)
+                write_batch(doc_batch)
                 doc_batch = []
         if len(doc_batch) > 0:
-            embeddings = self.embed(doc_batch, self.ctx_encoder, self.ctx_tokenizer)
-            cur_offset = self.write(cur_offset, offsets, passages, doc_batch, embeddings)
-        offsets.append(cur_offset)  # just the length of the file
-        passages.close()
-        with write_open(os.path.join(self.opts.output_dir, f'offsets_{self.embed_num}_of_{self.embed_count}.npy'), binary=True) as f:
-            np.save(f, np.array(offsets, dtype=np.int64), allow_pickle=False)
-        logger.info(f'wrote passages_{self.embed_num}_of_{self.embed_count}.json.gz.records in {report.elapsed_time_str()}')
-        #print(f'Wrote passages_{self.embed_num}_of_{self.embed_count}.json.gz.records in {report.elapsed_time_str()}')
+            write_batch(doc_batch)
+        if self.opts.columnar_index:
+            writer.close()
+        else:
+            offsets.append(cur_offset)  # just the length of the file
+            passages.close()
+            with write_open(os.path.join(self.opts.output_dir, f'offsets{name}.npy'), binary=True) as f:
+                np.save(f, np.array(offsets, dtype=np.int64), allow_pickle=False)
+            write_pid_index(os.path.join(self.opts.output_dir, f'pid_index{name}.npy'), pid_hashes)
+        logger.info(f'wrote passages{name}{records_suffix} in {report.elapsed_time_str()}')
+        #print(f'Wrote passages{name}{records_suffix} in {report.elapsed_time_str()}')
 
         if self.opts.sharded_index:
-            build_index(os.path.join(self.opts.output_dir, f'passages_{self.embed_num}_of_{self.embed_count}.json.gz.records'),
-                        os.path.join(self.opts.output_dir, f'index_{self.embed_num}_of_{self.embed_count}.faiss'), self.opts)
+            build_index(os.path.join(self.opts.output_dir, f'passages{name}{records_suffix}'),
+                        os.path.join(self.opts.output_dir, f'index{name}.faiss'), self.opts)
         elif self.embed_count == 1:
             build_index(self.opts.output_dir, os.path.join(self.opts.output_dir, 'index.faiss'), self.opts)
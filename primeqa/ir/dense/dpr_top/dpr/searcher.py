@@ -6,6 +6,8 @@ import os
 import numpy as np
 import ujson as json
 import logging
+from concurrent.futures import ThreadPoolExecutor
+import faiss
 
 from transformers import (DPRQuestionEncoder, DPRQuestionEncoderTokenizer, DPRQuestionEncoderTokenizerFast, DPRContextEncoder, DPRContextEncoderTokenizerFast)
 
@@ -13,7 +15,7 @@ from primeqa.ir.dense.dpr_top.util.line_corpus import read_lines, write_open
 from primeqa.ir.dense.dpr_top.util.reporting import Reporting
 from primeqa.ir.dense.dpr_top.dpr.dpr_util import DPROptions, queries_to_vectors
 from primeqa.ir.dense.dpr_top.util.args_help import fill_from_config
-from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import Corpus
+from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import Corpus, passages_shard_name
 from primeqa.ir.dense.dpr_top.dpr.faiss_index import ANNIndex
 from primeqa.ir.dense.dpr_top.dpr.config import DPRSearchArguments
 
@@ -43,6 +45,7 @@ class Options(DPROptions):
         self.query_file_type = 'id_text'
         self.__required_args__ = ['index_location', 'output_dir']
         self.output_json = False
+        self.shard_search_threads = 0  # 0 for one thread per shard
 
         self.rescore_only = rescore_only
 
@@ -97,34 +100,51 @@ class DPRSearcher():
             # we search each index, then take the top-k results overall
             logger.info(f'Using sharded faiss, reading shards from {self.opts.index_location}')
             for filename in os.listdir(self.opts.index_location):
-                if filename.startswith('passages') and filename.endswith('.json.gz.records'):
-                    name = filename[len("passages"):-len(".json.gz.records")]
+                name = passages_shard_name(filename)
+                if name is not None:
                     logger.info(f'Reading {filename}')
                     self.shards.append((ANNIndex(os.path.join(self.opts.index_location, f'index{name}.faiss')),
-                                   Corpus(os.path.join(self.opts.index_location, f'passages{name}.json.gz.records'))))
+                                   Corpus(os.path.join(self.opts.index_location, filename))))
             self.dim = self.shards[0][0].dim()
             assert all([self.dim == shard[0].dim() for shard in self.shards])
             logger.info(f'Using sharded faiss with {len(self.shards)} shards.')
+            # faiss releases the GIL while searching, so the shards can be searched concurrently from threads
+            self.shard_executor = ThreadPoolExecutor(max_workers=self.opts.shard_search_threads if self.opts.shard_search_threads > 0 else len(self.shards))
         self.dummy_doc = {'pid': 'N/A', 'title': '', 'text': '', 'vector': np.zeros(self.dim, dtype=np.float32)}
 
-    def merge_results(self, query_vectors, k): # from corpus_server_direct.merge_results
-            # CONSIDER: consider ResultHeap (https://github.com/matsui528/faiss_tips)
-            all_scores = np.zeros((query_vectors.shape[0], k * len(self.shards)), dtype=np.float32)
-            all_indices = np.zeros((query_vectors.shape[0], k * len(self.shards)), dtype=np.int64)
-            for si, shard in enumerate(self.shards):
-                index_i, passages_i = shard
-                scores, indexes = index_i.search(query_vectors, k)
+    def merge_results(self, query_vectors, k, with_vectors=False): # from corpus_server_direct.merge_results
+            # search all shards concurrently, then keep the k best hits per query in a heap
+            # the heap keeps the smallest distances, so we negate the scores
+            # a hit is identified by ndx * num_shards + shard_ndx, so only the final top-k passages are loaded
+            # (without decoding their vectors, unless with_vectors)
+            num_shards = len(self.shards)
+            heap = faiss.ResultHeap(query_vectors.shape[0], k)
+            shard_results = self.shard_executor.map(lambda shard: shard[0].search(query_vectors, k), self.shards)
+            for si, (scores, indexes) in enumerate(shard_results):
                 assert len(scores.shape) == 2
                 assert scores.shape[1] == k
                 assert scores.shape == indexes.shape
                 assert scores.dtype == np.float32
                 assert indexes.dtype == np.int64
-                all_scores[:, si * k: (si + 1) * k] = scores
-                all_indices[:, si * k: (si + 1) * k] = indexes
-            kbest = all_scores.argsort()[:, -k:][:, ::-1]
-            docs = [[self.shards[ndx // k][1][all_indices[bi, ndx]] for ndx in ndxs] for bi, ndxs in enumerate(kbest)]
-            return docs, np.sort(all_scores)[:, ::-1][:, 0:k]
-
+                # faiss returns index -1 when a shard has fewer than k passages
+                found = indexes >= 0
+                heap.add_result(np.where(found, -scores, np.inf).astype(np.float32),
+                                np.where(found, indexes * num_shards + si, -1))
+            heap.finalize()
+            def load(ndx):
+                passages = self.shards[ndx % num_shards][1]
+                return passages[ndx // num_shards] if with_vectors else passages.get_passage(ndx // num_shards)
+
+            docs = [[load(ndx) if ndx >= 0 else self.dummy_doc for ndx in ndxs] for ndxs in heap.I]
+            return docs, -heap.D
+
+    def close(self):
+        # there are no shards in rescore_only mode
+        if getattr(self, 'shards', None) is not None:
+            self.shard_executor.shutdown(wait=False)
+
+    def __del__(self):
+        self.close()
 
     def init_title_to_title(self):
         self.passages_of_titles = {}
@@ -148,7 +168,7 @@ class DPRSearcher():
             _, indexes = self.index.search(vectors, self.opts.top_k)
             docs = [[self.passages[ndx] for ndx in ndxs] for ndxs in indexes]
         else:
-            docs, _ = self.merge_results(vectors, self.opts.top_k)
+            docs, _ = self.merge_results(vectors, self.opts.top_k, with_vectors=True)
 
         return docs # first and only query
 
@@ -168,6 +188,37 @@ class DPRSearcher():
 
         return final_reranked_score
 
+    def encode_queries(self, queries: List[str]) -> np.ndarray:
+        with torch.no_grad():
+            query_vectors_tensor = queries_to_vectors(self.tokenizer, self.qencoder, queries)
+            return query_vectors_tensor.detach().cpu().numpy().astype(np.float32)
+
+    def search_vectors(self, query_vectors: np.ndarray, top_k: int):
+        # from from corpus_server_direct.retrieve_docs
+        batch_size = query_vectors.shape[0]
+        assert query_vectors.shape[1] == self.dim
+
+        if self.shards is None:
+            doc_scores, indexes = self.index.search(query_vectors, top_k)
+            docs = [[self.passages.get_passage(ndx) for ndx in ndxs] for ndxs in indexes]
+        else:
+            docs, doc_scores = self.merge_results(query_vectors, top_k)
+
+        doc_dicts = [{'pid': [dqk['pid'] for dqk in dq],
+                      'title': [dqk['title'] for dqk in dq],
+                      'text': [dqk['text'] for dqk in dq]} for dq in docs]
+
+        docs = doc_dicts # Because in corpus_server_directretrieve_docs: "retval = {'docs': doc_dicts}"
+
+        retrieved_doc_ids = [dd['pid'] for dd in docs]
+
+        passages = None
+        if not self.opts.do_not_include_passages:
+            passages = [{'titles': dd['title'], 'texts': dd['text'], 'scores': doc_scores[dndx].tolist()} for dndx, dd in enumerate(docs)]
+
+        return retrieved_doc_ids, passages
+        # ^ from dpr_apply.retrieve
+
     def search(self, query_batch = None, top_k = 10, mode: Union['query_list', 'queries_and_results_in_files', None] = None):
         # from corpus_server_direct.run
         def _get_docs_by_pids(pids, *, dummy_if_missing=False):
@@ -191,34 +242,7 @@ class DPRSearcher():
 
         # from dpr_apply
         def retrieve(queries):
-            with torch.no_grad():
-                query_vectors_tensor = queries_to_vectors(self.tokenizer, self.qencoder, queries)
-
-                # from from corpus_server_direct.retrieve_docs
-                query_vectors = query_vectors_tensor.detach().cpu().numpy().astype(np.float32)
-                batch_size = query_vectors.shape[0]
-                assert query_vectors.shape[1] == self.dim
-
-                if self.shards is None:
-                    doc_scores, indexes = self.index.search(query_vectors, self.opts.top_k)
-                    docs = [[self.passages[ndx] for ndx in ndxs] for ndxs in indexes]
-                else:
-                    docs, doc_scores = self.merge_results(query_vectors, self.opts.top_k)
-
-                doc_dicts = [{'pid': [dqk['pid'] for dqk in dq],
-                              'title': [dqk['title'] for dqk in dq],
-                              'text': [dqk['text'] for dqk in dq]} for dq in docs]
-
-            docs = doc_dicts # Because in corpus_server_directretrieve_docs: "retval = {'docs': doc_dicts}"
-
-            retrieved_doc_ids = [dd['pid'] for dd in docs]
-
-            passages = None
-            if not self.opts.do_not_include_passages:
-                passages = [{'titles': dd['title'], 'texts': dd['text'], 'scores': doc_scores[dndx].tolist()} for dndx, dd in enumerate(docs)]
-
-            return retrieved_doc_ids, passages
-            # ^ from dpr_apply.retrieve
+            return self.search_vectors(self.encode_queries(queries), self.opts.top_k)
 
         # from convert_for_kilt_eval
         def to_distinct_doc_ids(passage_ids):
@@ -4,8 +4,19 @@ import numpy as np
 import os
 import mmap
 import codecs
+import struct
 import threading
 
+from primeqa.ir.util.pid_index import pid_hash, write_pid_index
+
+# legacy format: passagesX.json.gz.records holds zlib compressed json records, the vector base64 encoded inside each record
+LEGACY_RECORDS_SUFFIX = '.json.gz.records'
+# columnar format: passagesX.json.records holds plain json records without vectors, vectorsX.npy holds the float16 vectors
+RECORDS_SUFFIX = '.json.records'
+
+# fixed size of the .npy header written by ColumnarCorpusWriter, so the final shape can be filled in after streaming the vectors
+NPY_HEADER_LENGTH = 128
+
 
 def gzip_str(str):
     return codecs.encode(str.encode('utf-8'), 'zlib')
@@ -17,35 +28,93 @@ def gunzip_str(bytes):
     # return gzip.decompress(bytes).decode('utf-8')
 
 
+def passages_shard_name(filename):
+    """
+    :param filename: a file name like passagesX.json.gz.records or passagesX.json.records
+    :return: the shard name X, or None if filename is not a passages file
+    """
+    if not filename.startswith('passages'):
+        return None
+    for suffix in (LEGACY_RECORDS_SUFFIX, RECORDS_SUFFIX):
+        if filename.endswith(suffix):
+            return filename[len('passages'):-len(suffix)]
+    return None
+
+
+def _npy_header(dtype, shape):
+    header = repr({'descr': np.lib.format.dtype_to_descr(np.dtype(dtype)), 'fortran_order': False, 'shape': tuple(shape)})
+    prefix = np.lib.format.magic(1, 0)
+    padding = NPY_HEADER_LENGTH - len(prefix) - 2 - len(header) - 1
+    assert padding >= 0, f'shape {shape} does not fit in the .npy header'
+    header = header + ' ' * padding + '\n'
+    return prefix + struct.pack('<H', len(header)) + header.encode('latin1')
+
+
+class ColumnarCorpusWriter:
+    """
+    Writes one shard of a DPR index in the columnar format:
+      passagesX.json.records - the passages (pid, title, text, ...) as plain json records
+      offsetsX.npy - the start offset of each record in passagesX.json.records, plus the length of the file
+      vectorsX.npy - the passage vectors as a single float16 matrix, in the same order as the records
+      pid_indexX.npy - the rows of the passages sorted by the hash of their pid, see write_pid_index
+    The vectors are streamed to disk, so the writer never holds more than one batch in memory.
+    """
+    def __init__(self, output_dir, name):
+        self.output_dir = output_dir
+        self.name = name
+        self.records = open(os.path.join(output_dir, f'passages{name}{RECORDS_SUFFIX}'), 'wb')
+        self.vectors = open(os.path.join(output_dir, f'vectors{name}.npy'), 'wb')
+        self.vectors.write(b'\0' * NPY_HEADER_LENGTH)
+        self.offsets = [0]
+        self.pid_hashes = []
+        self.dim = 0
+
+    def write(self, docs, embeddings: np.ndarray):
+        assert len(docs) == embeddings.shape[0]
+        assert len(embeddings.shape) == 2
+        self.dim = embeddings.shape[1]
+        for doc in docs:
+            jstr = json.dumps(doc).encode('utf-8')
+            self.records.write(jstr)
+            self.offsets.append(self.offsets[-1] + len(jstr))
+            self.pid_hashes.append(pid_hash(doc['pid']))
+        self.vectors.write(np.ascontiguousarray(embeddings, dtype=np.float16).tobytes())
+
+    def close(self):
+        self.records.close()
+        self.vectors.seek(0)
+        self.vectors.write(_npy_header(np.float16, (len(self.offsets) - 1, self.dim)))
+        self.vectors.close()
+        with open(os.path.join(self.output_dir, f'offsets{self.name}.npy'), 'wb') as f:
+            np.save(f, np.array(self.offsets, dtype=np.int64), allow_pickle=False)
+        write_pid_index(os.path.join(self.output_dir, f'pid_index{self.name}.npy'), self.pid_hashes)
+
+
 class Corpus:
     def __init__(self, dir):
-        # either pass a dir or a specific passagesX.json.gz.records file
+        # either pass a dir or a specific passagesX.json.gz.records / passagesX.json.records file
         files = []
         base_dir, filename = os.path.split(dir)
-        if filename.startswith('passages') and filename.endswith('.json.gz.records'):
+        if passages_shard_name(filename) is not None:
             dir = base_dir
-            offset_fname = f'offsets{filename[len("passages"):-len(".json.gz.records")]}.npy'
-            if not os.path.exists(os.path.join(dir, offset_fname)):
-                raise ValueError(f'no offsets file for {filename}!')
-            files.append((filename, offset_fname))
+            files.append(self._shard_files(dir, filename))
         else:
             # for every file like 'passagesX.json.gz.records' there must be a file offsetsX.npy
             for filename in os.listdir(dir):
-                if filename.startswith('passages') and filename.endswith('.json.gz.records'):
-                    offset_fname = f'offsets{filename[len("passages"):-len(".json.gz.records")]}.npy'
-                    if not os.path.exists(os.path.join(dir, offset_fname)):
-                        raise ValueError(f'no offsets file for {filename}!')
-                    files.append((filename, offset_fname))
+                if passages_shard_name(filename) is not None:
+                    files.append(self._shard_files(dir, filename))
         files.sort(key=lambda x: x[0])  # we sort the offsets files, that is our order
 
         # build offsets table
         # self.offsets will be nx3 self.offsets[i] == file_ndx, start_offset, end_offset
         per_file_offsets = []
         total_passage_count = 0
-        for file_pair in files:
-            per_file_offsets.append(np.load(os.path.join(dir, file_pair[1])))
+        for file_triple in files:
+            per_file_offsets.append(np.load(os.path.join(dir, file_triple[1])))
             total_passage_count += len(per_file_offsets[-1]) - 1
         self.offsets = np.zeros((total_passage_count, 3), dtype=np.int64)
+        # self.file_starts[i] is the index of the first passage of file i
+        self.file_starts = np.zeros(len(files) + 1, dtype=np.int64)
         total_passage_count = 0
         for file_ndx, file_offsets in enumerate(per_file_offsets):
             passage_count = len(file_offsets)-1
@@ -53,45 +122,130 @@ class Corpus:
             self.offsets[total_passage_count:total_passage_count + passage_count, 1] = file_offsets[:-1]
             self.offsets[total_passage_count:total_passage_count + passage_count, 2] = file_offsets[1:]
             total_passage_count += passage_count
+            self.file_starts[file_ndx + 1] = total_passage_count
 
         # self.mms will be list of memory mapped files (self.files)
+        # self.vectors will be the memory mapped vector matrix of each file, None for the legacy format
         self.mms = []
         self.files = []
-        for file_pair in files:
-            file = open(os.path.join(dir, file_pair[0]), "rb")
+        self.vectors = []
+        for file_triple in files:
+            file = open(os.path.join(dir, file_triple[0]), "rb")
             self.files.append(file)
-            self.mms.append(mmap.mmap(file.fileno(), 0, prot=mmap.PROT_READ))
+            self.mms.append(mmap.mmap(file.fileno(), 0, prot=mmap.PROT_READ) if os.path.getsize(file.name) > 0 else b'')
+            if file_triple[2] is not None:
+                self.vectors.append(np.load(os.path.join(dir, file_triple[2]), mmap_mode='r'))
+            else:
+                self.vectors.append(None)
+        # self.pid_indexes will be the memory mapped pid index of each file, None if any file has no pid index
+        self.dir = dir
+        self.shard_names = [passages_shard_name(file_triple[0]) for file_triple in files]
+        self.pid_indexes = self._load_pid_indexes()
         self.pid2ndx = dict()
         self.lock = threading.Lock()
 
+    def _load_pid_indexes(self):
+        paths = [os.path.join(self.dir, f'pid_index{name}.npy') for name in self.shard_names]
+        if not all(os.path.exists(path) for path in paths):
+            return None
+        return [np.load(path, mmap_mode='r') for path in paths]
+
+    def save_pid_index(self):
+        """
+        Write the pid_indexX.npy files for a corpus indexed before they existed, so later get_by_pid calls don't
+        have to decode every record.
+        """
+        for file_ndx, name in enumerate(self.shard_names):
+            first, last = self.file_starts[file_ndx], self.file_starts[file_ndx + 1]
+            write_pid_index(os.path.join(self.dir, f'pid_index{name}.npy'),
+                            [pid_hash(self.get_passage(ndx)['pid']) for ndx in range(first, last)])
+        self.pid_indexes = self._load_pid_indexes()
+
+    @staticmethod
+    def _shard_files(dir, filename):
+        name = passages_shard_name(filename)
+        offset_fname = f'offsets{name}.npy'
+        if not os.path.exists(os.path.join(dir, offset_fname)):
+            raise ValueError(f'no offsets file for {filename}!')
+        vectors_fname = None
+        if filename.endswith(RECORDS_SUFFIX):
+            vectors_fname = f'vectors{name}.npy'
+            if not os.path.exists(os.path.join(dir, vectors_fname)):
+                raise ValueError(f'no vectors file for {filename}!')
+        return filename, offset_fname, vectors_fname
+
     def __len__(self):
         return len(self.offsets)
 
     def __getitem__(self, index):
         if index >= len(self.offsets):
             raise IndexError
-        bytes = self.get_raw(index)
-        jobj = json.loads(gunzip_str(bytes))
-        jobj['vector'] = np.frombuffer(base64.decodebytes(jobj['vector'].encode('ascii')), dtype=np.float16)
+        jobj = self.get_passage(index)
+        file_ndx = self.offsets[index][0]
+        if self.vectors[file_ndx] is not None:
+            jobj['vector'] = self.vectors[file_ndx][index - self.file_starts[file_ndx]]
+        else:
+            jobj['vector'] = np.frombuffer(base64.decodebytes(jobj['vector'].encode('ascii')), dtype=np.float16)
         return jobj
 
+    def get_passage(self, index):
+        """
+        :param index: the passage index
+        :return: the passage record (pid, title, text), without decoding its vector
+        """
+        file_ndx = self.offsets[index][0]
+        bytes = self.get_raw(index)
+        if self.vectors[file_ndx] is not None:
+            return json.loads(bytes)
+        return json.loads(gunzip_str(bytes))
+
     def get_raw(self, index):
         file_ndx, start_offset, end_offset = self.offsets[index]
         return self.mms[file_ndx][start_offset:end_offset]
 
+    def iter_vectors(self, batch_size):
+        """
+        Iterate over the float16 passage vectors, in passage order, in batches of at most batch_size.
+        For the columnar format the batches are views of the memory mapped vectors, no records are decoded.
+        """
+        for file_ndx, vectors in enumerate(self.vectors):
+            if vectors is not None:
+                for start in range(0, len(vectors), batch_size):
+                    yield vectors[start:start + batch_size]
+            else:
+                first, last = self.file_starts[file_ndx], self.file_starts[file_ndx + 1]
+                for start in range(first, last, batch_size):
+                    yield np.stack([self[ndx]['vector'] for ndx in range(start, min(start + batch_size, last))])
+
     def get_by_pid(self, pid):
+        if self.pid_indexes is not None:
+            ndx = self._find_pid(pid)
+            return self[ndx] if ndx is not None else None
         with self.lock:
             if len(self.pid2ndx) == 0:
                 for ndx in range(len(self.offsets)):
-                    obj = json.loads(gunzip_str(self.get_raw(ndx)))
-                    pidi = obj['pid']
+                    pidi = self.get_passage(ndx)['pid']
                     self.pid2ndx[pidi] = ndx
             if pid not in self.pid2ndx:
                 return None
             return self[self.pid2ndx[pid]]
 
+    def _find_pid(self, pid):
+        # binary search the pid hash in each file's pid index, then confirm the pid on the record (hashes may collide)
+        key = pid_hash(pid)
+        for file_ndx, pid_index in enumerate(self.pid_indexes):
+            hashes = pid_index[:, 0]
+            start = np.searchsorted(hashes, key, side='left')
+            end = np.searchsorted(hashes, key, side='right')
+            for row in pid_index[start:end, 1]:
+                ndx = self.file_starts[file_ndx] + row
+                if self.get_passage(ndx)['pid'] == pid:
+                    return ndx
+        return None
+
     def close(self):
         for mm in self.mms:
-            mm.close()
+            if isinstance(mm, mmap.mmap):
+                mm.close()
         for file in self.files:
             file.close()
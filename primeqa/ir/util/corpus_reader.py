@@ -4,6 +4,7 @@ import ujson as json
 import csv
 from pathlib import Path
 from primeqa.util.file_utils import read_open
+from primeqa.ir.util.passage_store import PassageStore
 from tqdm import tqdm
 from tqdm import tqdm
 
@@ -85,14 +86,22 @@ class DocumentCollection:
         document/passage and optionally has a documnet title and id.  If there is no id provided one will 
         assigned starting at 1. 
         
+        A single uncompressed tsv file with a header row is not loaded in memory, its documents are looked up
+        through a memory mapped PassageStore instead.
+        
         Args: 
             input_files: list[str] one or more input files
             
         """
         self.reader = corpus_reader(input_files, fieldnames=fieldnames)
         self.id_to_document = None
-        self.load_corpus()
-        print(len(self.id_to_document))
+        self.passage_store = None
+        if fieldnames is None and isinstance(input_files, (str, os.PathLike)) and str(input_files).endswith('.tsv') \
+                and os.path.isfile(input_files):
+            self.passage_store = PassageStore(str(input_files), has_header=True)
+        else:
+            self.load_corpus()
+            print(len(self.id_to_document))
     
     
     def load_corpus(self):
@@ -118,14 +127,14 @@ class DocumentCollection:
         Args:
             output_file (str): tsv file where each row is in format 'id\ttext\title'
         """
-        if self.id_to_document == None:
+        if self.id_to_document == None and self.passage_store is None:
             self.load_corpus()
             
         with open(output_file,'w') as f:
             fieldnames = ['id', 'text', 'title']
             tsv_writer = csv.DictWriter(f, delimiter='\t', lineterminator='\n', quoting=csv.QUOTE_MINIMAL, fieldnames=fieldnames)
             tsv_writer.writeheader()
-            tsv_writer.writerows(self.id_to_document.values())
+            tsv_writer.writerows(self.passage_store if self.passage_store is not None else self.id_to_document.values())
     
     def add_document_text_to_hit(self, hits: list):
         """
@@ -145,12 +154,29 @@ class DocumentCollection:
         for hit in hits:
             search_results_with_docs.append(
                 {
-                    'document': self.id_to_document[hit[0]],
+                    'document': self.get_document(hit[0]),
                     'score': hit[1]
                 }
             )
         
         return search_results_with_docs
+
+    def get_document(self, document_id: str):
+        """
+        Look up a document by id
+
+        Args:
+            document_id: id of the document
+
+        Returns:
+            dict: the document, with keys 'id', 'text' and 'title'
+        """
+        if self.passage_store is None:
+            return self.id_to_document[document_id]
+        document = self.passage_store.get_by_pid(document_id)
+        if document is None:
+            raise KeyError(document_id)
+        return document
         
     
     
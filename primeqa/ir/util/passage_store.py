@@ -0,0 +1,167 @@
+import csv
+import logging
+import mmap
+import os
+import typing
+
+import numpy as np
+import ujson as json
+
+from primeqa.ir.util.pid_index import pid_hash, make_pid_index
+
+logger = logging.getLogger(__name__)
+
+# sidecar files written next to the collection, see PassageStore
+OFFSETS_SUFFIX = '.offsets.npy'
+PID_INDEX_SUFFIX = '.pid_index.npy'
+METADATA_SUFFIX = '.passages.json'
+
+HEADER_IDS = ('id', 'pid')
+
+
+def _parse_line(line: bytes) -> typing.List[str]:
+    return next(csv.reader([line.decode('utf-8').rstrip('\r\n')], delimiter='\t'), [])
+
+
+class PassageStore:
+    """
+    Read-only, memory mapped lookup of the passages of a collection tsv (one passage per line, tab separated).
+    The first time a collection is opened, two sidecar files are written next to it:
+      <collection>.offsets.npy - the start offset of each line in the collection, plus the length of the file
+      <collection>.pid_index.npy - the lines sorted by the hash of their id, see write_pid_index
+    Later instances only map the collection and the sidecars, so opening a store is O(1) and the pages are shared by
+    every process on the host. The sidecars are rebuilt if the collection changes. If they can not be written, e.g.
+    in a read-only directory, the offsets and the pid index are kept in memory instead.
+
+    Lines are addressed by their index in the file, header included, which is the ColBERT pid of the passage.
+    Passages can also be looked up by the value of their id column with get_by_pid. Fields may be quoted as written
+    by the csv module, but a passage can not span several lines.
+    """
+    def __init__(self, collection: str, has_header: typing.Optional[bool] = None):
+        """
+        Args:
+            collection: path to the collection tsv
+            has_header: whether the first line holds the field names, by default if its first field is 'id' or 'pid'
+        """
+        self.collection = collection
+        with open(collection, 'rb') as f:
+            first_row = _parse_line(f.readline())
+        if has_header is None:
+            has_header = len(first_row) > 0 and first_row[0] in HEADER_IDS
+        self.has_header = has_header
+        self.fieldnames = first_row if has_header else ['id', 'text', 'title']
+
+        if self._has_sidecars():
+            self.offsets = np.load(collection + OFFSETS_SUFFIX, mmap_mode='r')
+            self.pid_index = np.load(collection + PID_INDEX_SUFFIX, mmap_mode='r')
+        else:
+            self.offsets, self.pid_index = self.build()
+        self.file = open(collection, 'rb')
+        self.mm = mmap.mmap(self.file.fileno(), 0, prot=mmap.PROT_READ) if len(self.offsets) > 1 else b''
+
+    def _has_sidecars(self) -> bool:
+        metadata_path = self.collection + METADATA_SUFFIX
+        if not all(os.path.exists(self.collection + suffix) for suffix in (OFFSETS_SUFFIX, PID_INDEX_SUFFIX)) \
+                or not os.path.exists(metadata_path):
+            return False
+        with open(metadata_path) as f:
+            return json.load(f) == self._collection_metadata()
+
+    def _collection_metadata(self) -> dict:
+        stat = os.stat(self.collection)
+        return {'size': stat.st_size, 'mtime_ns': stat.st_mtime_ns}
+
+    def build(self) -> typing.Tuple[np.ndarray, np.ndarray]:
+        """
+        Write the sidecar files of the collection in a single pass over it. The metadata file is replaced last, so
+        a partially written store is never picked up, and concurrent builds of the same collection are safe.
+
+        Returns:
+            the offsets and the pid index, which are only kept in memory if the sidecars could not be written
+        """
+        offsets = [0]
+        pid_hashes = []
+        with open(self.collection, 'rb') as f:
+            for line_idx, line in enumerate(f):
+                offsets.append(offsets[-1] + len(line))
+                pid_hashes.append(pid_hash(self._to_document(_parse_line(line), line_idx)['id']))
+
+        offsets = np.array(offsets, dtype=np.int64)
+        pid_index = make_pid_index(pid_hashes)
+
+        tmp_suffix = f'.{os.getpid()}.tmp'
+        try:
+            with open(self.collection + OFFSETS_SUFFIX + tmp_suffix, 'wb') as f:
+                np.save(f, offsets, allow_pickle=False)
+            with open(self.collection + PID_INDEX_SUFFIX + tmp_suffix, 'wb') as f:
+                np.save(f, pid_index, allow_pickle=False)
+            with open(self.collection + METADATA_SUFFIX + tmp_suffix, 'w') as f:
+                f.write(json.dumps(self._collection_metadata()))
+
+            for suffix in (OFFSETS_SUFFIX, PID_INDEX_SUFFIX, METADATA_SUFFIX):
+                os.replace(self.collection + suffix + tmp_suffix, self.collection + suffix)
+        except OSError:
+            logger.warning(f'Could not save the passage store of {self.collection}, keeping it in memory only')
+            for suffix in (OFFSETS_SUFFIX, PID_INDEX_SUFFIX, METADATA_SUFFIX):
+                if os.path.exists(self.collection + suffix + tmp_suffix):
+                    os.remove(self.collection + suffix + tmp_suffix)
+
+        return offsets, pid_index
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, line_idx: int) -> dict:
+        """
+        :param line_idx: index of the line in the collection
+        :return: the passage as a document dict, with keys 'id', 'text' and 'title' as in DocumentCollection
+        """
+        if not 0 <= line_idx < len(self):
+            raise IndexError(line_idx)
+        return self._to_document(self.get_row(line_idx), line_idx)
+
+    def _to_document(self, row: typing.List[str], line_idx: int) -> dict:
+        fields = dict(zip(self.fieldnames, row))
+        pid = fields.get('id', fields.get('pid', ''))
+        if len(pid) == 0:
+            # a passage without id gets its 1-based row number, as in DocumentCollection
+            pid = str(line_idx if self.has_header else line_idx + 1)
+        return {
+            'text': fields.get('text', fields.get('contents', '')),
+            'title': fields.get('title', ''),
+            'id': pid
+        }
+
+    def __iter__(self) -> typing.Iterator[dict]:
+        for line_idx in range(1 if self.has_header else 0, len(self)):
+            yield self[line_idx]
+
+    def get_row(self, line_idx: int) -> typing.List[str]:
+        """
+        :param line_idx: index of the line in the collection
+        :return: the fields of the line
+        """
+        return _parse_line(self.mm[self.offsets[line_idx]:self.offsets[line_idx + 1]])
+
+    def get_by_pid(self, pid: str) -> typing.Optional[dict]:
+        """
+        :param pid: value of the id column of the passage
+        :return: the passage as a document dict, or None if the collection has no passage with this id
+        """
+        key = pid_hash(pid)
+        hashes = self.pid_index[:, 0]
+        start = np.searchsorted(hashes, key, side='left')
+        end = np.searchsorted(hashes, key, side='right')
+        for line_idx in self.pid_index[start:end, 1]:
+            # confirm the id on the line, as hashes may collide
+            if self.has_header and line_idx == 0:
+                continue
+            document = self[int(line_idx)]
+            if document['id'] == pid:
+                return document
+        return None
+
+    def close(self):
+        if isinstance(self.mm, mmap.mmap):
+            self.mm.close()
+        self.file.close()
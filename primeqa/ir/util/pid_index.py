@@ -0,0 +1,32 @@
+import hashlib
+
+import numpy as np
+
+
+def pid_hash(pid):
+    """
+    :param pid: a passage id
+    :return: a stable signed 64 bit hash of the passage id, as stored in pid index files
+    """
+    return int.from_bytes(hashlib.blake2b(str(pid).encode('utf-8'), digest_size=8).digest(), 'little', signed=True)
+
+
+def make_pid_index(pid_hashes):
+    """
+    :param pid_hashes: the pid_hash of the passage in each row
+    :return: an (n, 2) int64 array of (pid_hash, row) sorted by pid_hash, so the row of a pid can be found by
+             binary search
+    """
+    pid_hashes = np.asarray(pid_hashes, dtype=np.int64)
+    order = np.argsort(pid_hashes, kind='stable')
+    return np.stack((pid_hashes[order], order.astype(np.int64)), axis=1)
+
+
+def write_pid_index(path, pid_hashes):
+    """
+    Write the pid index of the given rows, see make_pid_index, to be memory mapped later.
+    :param path: the .npy file to write
+    :param pid_hashes: the pid_hash of the passage in each row
+    """
+    with open(path, 'wb') as f:
+        np.save(f, make_pid_index(pid_hashes), allow_pickle=False)
@@ -0,0 +1,100 @@
+import threading
+from typing import List, Dict, Any, Tuple
+
+import numpy as np
+import torch
+from transformers import PreTrainedModel
+
+
+class ExtractiveQAModelRunner:
+    """
+    Runs a model with an extractive QA head over tokenized features for inference, without a `Trainer`.
+
+    Features are sorted by length and batched, so each batch is only padded to the length of its longest feature
+    (rounded up to `pad_to_multiple_of`). Model inputs are written into buffers allocated once on the model's device
+    and reused across calls, so concurrent calls run one at a time.
+    """
+    model_input_names = ('input_ids', 'attention_mask', 'token_type_ids')
+
+    def __init__(self,
+                 model: PreTrainedModel,
+                 pad_token_id: int,
+                 batch_size: int = 8,
+                 max_seq_len: int = 512,
+                 pad_to_multiple_of: int = 8,
+                 pad_token_type_id: int = 0):
+        """
+        Args:
+            model: Model with an extractive QA task head set.
+            pad_token_id: Id of the tokenizer's padding token.
+            batch_size: Max number of features per forward pass.
+            max_seq_len: Max length of the features, as used by the preprocessor.
+            pad_to_multiple_of: Pad batches to a multiple of this length.
+            pad_token_type_id: Token type id used for padding.
+        """
+        self._model = model.eval()
+        self._device = next(model.parameters()).device
+        self._batch_size = batch_size
+        self._max_seq_len = max_seq_len
+        self._pad_to_multiple_of = pad_to_multiple_of
+        self._pad_values = dict(input_ids=pad_token_id, attention_mask=0, token_type_ids=pad_token_type_id)
+        # Flat buffers, so that the inputs of every batch are contiguous views
+        self._host_buffers = {name: np.zeros(batch_size * max_seq_len, dtype=np.int64)
+                              for name in self.model_input_names}
+        self._device_buffers = {name: torch.zeros(batch_size * max_seq_len, dtype=torch.long, device=self._device)
+                                for name in self.model_input_names}
+        self._lock = threading.Lock()
+
+    def predict(self, features: List[Dict[str, Any]]) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """
+        Args:
+            features: Features from `BasePreProcessor.process_eval_examples`.
+
+        Returns:
+            Start logits, end logits and target type logits of the features, in the shape and order expected by
+            `ExtractivePostProcessor.process` (logits past the end of a feature are padded with -100).
+        """
+        input_names = [name for name in self.model_input_names if name in features[0]]
+        lengths = np.array([len(feature['input_ids']) for feature in features])
+        if lengths.max() > self._max_seq_len:
+            raise ValueError(f"Feature of length {lengths.max()} exceeds max_seq_len {self._max_seq_len}")
+
+        start_logits = np.full((len(features), lengths.max()), -100, dtype=np.float32)
+        end_logits = np.full((len(features), lengths.max()), -100, dtype=np.float32)
+        target_type_logits = None
+
+        # Longest features first, so that features of similar length share a batch
+        order = np.argsort(-lengths, kind='stable')
+        with self._lock, torch.inference_mode():
+            for batch_start in range(0, len(order), self._batch_size):
+                batch = order[batch_start:batch_start + self._batch_size]
+                seq_len = self._padded_length(lengths[batch[0]])
+                inputs = {name: self._fill_buffers(name, [features[idx][name] for idx in batch], seq_len)
+                          for name in input_names}
+
+                outputs = self._model(**inputs, return_dict=True)
+
+                n_logits = min(seq_len, lengths.max())
+                start_logits[batch, :n_logits] = outputs.start_logits[:, :n_logits].float().cpu().numpy()
+                end_logits[batch, :n_logits] = outputs.end_logits[:, :n_logits].float().cpu().numpy()
+                batch_target_type_logits = outputs.target_type_logits.float().cpu().numpy()
+                if target_type_logits is None:
+                    target_type_logits = np.zeros((len(features), batch_target_type_logits.shape[-1]),
+                                                  dtype=np.float32)
+                target_type_logits[batch] = batch_target_type_logits
+
+        return start_logits, end_logits, target_type_logits
+
+    def _padded_length(self, length: int) -> int:
+        multiple = self._pad_to_multiple_of
+        return min(-(-length // multiple) * multiple, self._max_seq_len)
+
+    def _fill_buffers(self, name: str, values: List[List[int]], seq_len: int) -> torch.Tensor:
+        host_buffer = self._host_buffers[name][:len(values) * seq_len].reshape(len(values), seq_len)
+        host_buffer.fill(self._pad_values[name])
+        for row, row_values in enumerate(values):
+            host_buffer[row, :len(row_values)] = row_values
+
+        device_buffer = self._device_buffers[name][:len(values) * seq_len].view(len(values), seq_len)
+        device_buffer.copy_(torch.from_numpy(host_buffer))
+        return device_buffer
@@ -80,7 +80,6 @@ class ExtractivePostProcessor(AbstractPostProcessor):
                                  f"and feature ({feat_example_idx})")
             example_features = list(example_features)
             example_id = example_features[0]['example_id']
-            contexts = example["context"]
             example_start_logits = all_start_logits[start_idx:start_idx+len(example_features)]
             example_end_logits = all_end_logits[start_idx:start_idx+len(example_features)]
             example_targettype_preds = all_targettype_logits[start_idx:start_idx+len(example_features)]
@@ -95,105 +94,75 @@ class ExtractivePostProcessor(AbstractPostProcessor):
                 example_query_passage_similarity = None
             start_idx += len(example_features)
 
-            min_null_prediction = None
-            prelim_predictions = []
+            # Candidate spans of all features of the example, in the order (feature, start rank, end rank)
+            candidate_feature_indices = []
+            candidate_start_indexes = []
+            candidate_end_indexes = []
+            candidate_scores = []
 
             for i, input_feature in enumerate(example_features):
                 if input_feature['example_id'] != example_id:
                     raise ValueError(f"Example id mismatch between example ({example_id}) "
                                  f"and feature ({input_feature['example_id']})")
-                start_logits = example_start_logits[i].tolist()
-                end_logits = example_end_logits[i].tolist()
-                target_type_logits = example_targettype_preds[i].tolist()
-
-                if example_start_stdev is not None and example_end_stdev is not None \
-                        and example_query_passage_similarity is not None:
-                    start_stdev = example_start_stdev[i].tolist()
-                    end_stdev = example_end_stdev[i].tolist()
-                    query_passage_similarity = float(example_query_passage_similarity[i])
-                else:
-                    start_stdev = [0.0] * len(start_logits)
-                    end_stdev = [0.0] * len(end_logits)
-                    query_passage_similarity = 0.0
                 offset_mapping = input_feature["offset_mapping"]
-
                 token_is_max_context = input_feature.get("token_is_max_context", None)
-                # Update minimum null prediction.
+
+                start_logits = np.asarray(example_start_logits[i], dtype=np.float64)
+                end_logits = np.asarray(example_end_logits[i], dtype=np.float64)
+                target_type_logits = np.asarray(example_targettype_preds[i], dtype=np.float64)
                 feature_null_score = start_logits[0] + end_logits[0]
-                if min_null_prediction is None or min_null_prediction["score"] > feature_null_score:
-                    min_null_prediction = {
-                        "offsets": (0, 0),
-                        "score": feature_null_score,
-                        "start_logit": start_logits[0],
-                        "end_logit": end_logits[0],
-                    }
-
-                start_indexes = np.argsort(start_logits[:len(offset_mapping)])[-1 : -self._n_best_size - 1 : -1].tolist()
-                end_indexes = np.argsort(end_logits[:len(offset_mapping)])[-1 : -self._n_best_size - 1 : -1].tolist()
-                for start_index in start_indexes:
-                    for end_index in end_indexes:
-                    # Don't consider out-of-scope answers, either because the indices are out of bounds or correspond
-                    # to part of the input_ids that are not in the context.
-                        if (
-                            start_index >= len(offset_mapping)
-                            or end_index >= len(offset_mapping)
-                            or offset_mapping[start_index] is None
-                            or len(offset_mapping[start_index]) < 2
-                            or offset_mapping[end_index] is None
-                            or len(offset_mapping[end_index]) < 2
-                        ):
-                            continue
-                        # Don't consider answers with a length that is either < 0 or > max_answer_length.
-                        if end_index < start_index or end_index - start_index + 1 > self._max_answer_length:
-                            continue
-                        # Don't consider answer that don't have the maximum context available (if such information is
-                        # provided).
-                        if token_is_max_context is not None and not token_is_max_context.get(str(start_index), False):
-                            continue
-
-                        start_position = offset_mapping[start_index][0]
-                        end_position = offset_mapping[end_index][1]
-
-                        if self._single_context_multiple_passages:
-                            passage_candidates = example['passage_candidates']
-                            for context_idx in range(len(passage_candidates['start_positions'])):
-                                passage_start_position = passage_candidates['start_positions'][context_idx]
-                                passage_end_position = passage_candidates['end_positions'][context_idx]
-                                if passage_start_position <= start_position <= end_position <= passage_end_position:
-                                    break
-                            else:
-                                context_idx = -1
-                            passage_text = contexts[0]
-                        else:
-                            context_idx = input_feature['context_idx']
-                            passage_text = contexts[context_idx]
-
-                        span_answer_text = passage_text[offset_mapping[start_index][0]:offset_mapping[end_index][1]]
-                        span_answer_score = self._score_calculator(start_logits[start_index] + end_logits[end_index],
-                                                feature_null_score, target_type_logits)
-                        prelim_predictions.append(
-                        {
-                            'example_id': input_feature['example_id'],
-                            'cls_score': feature_null_score,
-                            'start_logit': start_logits[start_index],
-                            'end_logit': end_logits[end_index],
-                            'span_answer': {
-                                "start_position": start_position,
-                                "end_position": end_position,
-                            },
-                            'span_answer_score' : span_answer_score,
-                            'start_index': start_index,
-                            'end_index':   end_index,
-                            'passage_index' : context_idx,
-                            'target_type_logits': target_type_logits,
-                            'span_answer_text': span_answer_text,
-                            'yes_no_answer': int(TargetType.NO_ANSWER),
-                            'start_stdev': start_stdev[start_index],
-                            'end_stdev': end_stdev[end_index],
-                            'query_passage_similarity': query_passage_similarity
-                        }
-                    )
-            example_predictions = sorted(prelim_predictions, key=itemgetter('span_answer_score'), reverse=True)[:self._k]
+
+                start_indexes = np.argsort(start_logits[:len(offset_mapping)])[-1 : -self._n_best_size - 1 : -1]
+                end_indexes = np.argsort(end_logits[:len(offset_mapping)])[-1 : -self._n_best_size - 1 : -1]
+
+                # Don't consider out-of-scope answers, either because the indices correspond to part of the input_ids
+                # that are not in the context, or don't have the maximum context available (if such information is
+                # provided).
+                valid_starts = np.array([self._is_context_offset(offset_mapping[start_index]) and (
+                                             token_is_max_context is None
+                                             or token_is_max_context.get(str(start_index), False))
+                                         for start_index in start_indexes], dtype=bool)
+                valid_ends = np.array([self._is_context_offset(offset_mapping[end_index])
+                                       for end_index in end_indexes], dtype=bool)
+                # Don't consider answers with a length that is either < 0 or > max_answer_length.
+                span_lengths = end_indexes[np.newaxis, :] - start_indexes[:, np.newaxis] + 1
+                valid_spans = valid_starts[:, np.newaxis] & valid_ends[np.newaxis, :] & \
+                              (span_lengths >= 1) & (span_lengths <= self._max_answer_length)
+
+                start_ranks, end_ranks = np.nonzero(valid_spans)
+                if len(start_ranks) == 0:
+                    continue
+
+                span_scores = start_logits[start_indexes[start_ranks]] + end_logits[end_indexes[end_ranks]]
+                candidate_feature_indices.append(np.full(len(start_ranks), i))
+                candidate_start_indexes.append(start_indexes[start_ranks])
+                candidate_end_indexes.append(end_indexes[end_ranks])
+                candidate_scores.append(np.asarray(
+                    self._score_calculator(span_scores, feature_null_score, target_type_logits), dtype=np.float64))
+
+            example_predictions = []
+            if candidate_scores:
+                candidate_scores = np.concatenate(candidate_scores)
+                candidate_feature_indices = np.concatenate(candidate_feature_indices)
+                candidate_start_indexes = np.concatenate(candidate_start_indexes)
+                candidate_end_indexes = np.concatenate(candidate_end_indexes)
+
+                for candidate_idx in self._top_k_indices(candidate_scores):
+                    i = int(candidate_feature_indices[candidate_idx])
+                    example_predictions.append(self._create_prediction(
+                        example,
+                        example_features[i],
+                        start_index=int(candidate_start_indexes[candidate_idx]),
+                        end_index=int(candidate_end_indexes[candidate_idx]),
+                        span_answer_score=float(candidate_scores[candidate_idx]),
+                        start_logits=example_start_logits[i],
+                        end_logits=example_end_logits[i],
+                        target_type_logits=example_targettype_preds[i],
+                        start_stdev=example_start_stdev[i] if example_start_stdev is not None else None,
+                        end_stdev=example_end_stdev[i] if example_end_stdev is not None else None,
+                        query_passage_similarity=example_query_passage_similarity[i]
+                        if example_query_passage_similarity is not None else None,
+                    ))
             all_predictions[example_id] = example_predictions
 
             # In the very rare edge case we have not a single non-null prediction, we create a fake prediction to avoid
@@ -229,17 +198,81 @@ class ExtractivePostProcessor(AbstractPostProcessor):
             for prob, pred in zip(probs, example_predictions):
                 pred["normalized_span_answer_score"] = prob
 
-            # Confidence score
-            if self._confidence_scorer is not None and self._confidence_scorer.model_exists():
-                scores = self._confidence_scorer.predict_scores(example_predictions)
-                for i in range(len(example_predictions)):
-                    example_predictions[i]["confidence_score"] = scores[i]
-            else:
+            # Confidence score, computed for all the examples at once below if there is a confidence model
+            if self._confidence_scorer is None or not self._confidence_scorer.model_exists():
                 for i in range(len(example_predictions)):
                     example_predictions[i]["confidence_score"] = example_predictions[i]["normalized_span_answer_score"]
 
+        if self._confidence_scorer is not None and self._confidence_scorer.model_exists():
+            all_scores = self._confidence_scorer.predict_scores_batch(list(all_predictions.values()))
+            for example_predictions, scores in zip(all_predictions.values(), all_scores):
+                for i in range(len(example_predictions)):
+                    example_predictions[i]["confidence_score"] = scores[i]
+
         return all_predictions
         
+    def _top_k_indices(self, scores: np.ndarray) -> np.ndarray:
+        """
+        Returns the indices of the (at most) k highest scores, highest first, breaking ties by index as a stable
+        sort would.
+        """
+        if len(scores) > self._k:
+            kth_score = np.partition(scores, len(scores) - self._k)[len(scores) - self._k]
+            candidates = np.flatnonzero(scores >= kth_score)
+        else:
+            candidates = np.arange(len(scores))
+        return candidates[np.argsort(-scores[candidates], kind='stable')][:self._k]
+
+    @staticmethod
+    def _is_context_offset(offset) -> bool:
+        return offset is not None and len(offset) >= 2
+
+    def _create_prediction(self, example, input_feature, start_index: int, end_index: int, span_answer_score: float,
+                           start_logits, end_logits, target_type_logits,
+                           start_stdev=None, end_stdev=None, query_passage_similarity=None) -> Dict[str, Any]:
+        """
+        Materializes the prediction dict of a span selected by `process`.
+        """
+        offset_mapping = input_feature["offset_mapping"]
+        start_position = offset_mapping[start_index][0]
+        end_position = offset_mapping[end_index][1]
+
+        if self._single_context_multiple_passages:
+            passage_candidates = example['passage_candidates']
+            for context_idx in range(len(passage_candidates['start_positions'])):
+                passage_start_position = passage_candidates['start_positions'][context_idx]
+                passage_end_position = passage_candidates['end_positions'][context_idx]
+                if passage_start_position <= start_position <= end_position <= passage_end_position:
+                    break
+            else:
+                context_idx = -1
+            passage_text = example["context"][0]
+        else:
+            context_idx = input_feature['context_idx']
+            passage_text = example["context"][context_idx]
+
+        return {
+            'example_id': input_feature['example_id'],
+            'cls_score': float(start_logits[0]) + float(end_logits[0]),
+            'start_logit': float(start_logits[start_index]),
+            'end_logit': float(end_logits[end_index]),
+            'span_answer': {
+                "start_position": start_position,
+                "end_position": end_position,
+            },
+            'span_answer_score': span_answer_score,
+            'start_index': start_index,
+            'end_index': end_index,
+            'passage_index': context_idx,
+            'target_type_logits': np.asarray(target_type_logits).tolist(),
+            'span_answer_text': passage_text[start_position:end_position],
+            'yes_no_answer': int(TargetType.NO_ANSWER),
+            'start_stdev': float(start_stdev[start_index]) if start_stdev is not None else 0.0,
+            'end_stdev': float(end_stdev[end_index]) if end_stdev is not None else 0.0,
+            'query_passage_similarity': float(query_passage_similarity)
+            if query_passage_similarity is not None else 0.0,
+        }
+
     def prepare_examples_as_references(self, examples: Dataset) -> List[Dict[str, Any]]:
         references = []
         for example_idx in range(examples.num_rows):
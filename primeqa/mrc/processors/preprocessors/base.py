@@ -77,6 +77,29 @@ class BasePreProcessor(AbstractPreProcessor):
     def process_eval(self, examples: Dataset) -> Tuple[Dataset, Dataset]:
         return self._process(examples, is_train=False)
 
+    def process_eval_examples(self, examples: Dict[str, List[Any]]) -> Tuple[List[Dict[str, Any]], List[Dict[str, Any]]]:
+        """
+        Processes eval examples given as a dict of columns (same schema as for `process_eval`) by tokenizing them
+        directly, without building a `Dataset` or going through `Dataset.map`. Meant for low latency inference.
+
+        Returns:
+            Examples and their features, each as a list of dicts.
+        """
+        if 'example_id' not in examples:
+            examples = self._insert_example_ids(dict(examples))
+        n_examples = len(examples['question'])
+        if n_examples == 0:
+            raise ValueError("No examples to process")
+
+        tokenized_examples = self._process_batch(examples, list(range(n_examples)), is_train=False)
+
+        example_keys = list(examples.keys())
+        example_rows = [dict(zip(example_keys, values)) for values in zip(*(examples[k] for k in example_keys))]
+        feature_keys = list(tokenized_examples.keys())
+        feature_rows = [dict(zip(feature_keys, values))
+                        for values in zip(*(tokenized_examples[k] for k in feature_keys))]
+        return example_rows, feature_rows
+
     def _process(self, examples: Dataset, is_train: bool) -> Tuple[Dataset, Dataset]:
         """
         Provides implementation for public processing methods.
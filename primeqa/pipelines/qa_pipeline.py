@@ -1,26 +1,27 @@
 from typing import List
-from tqdm import tqdm
 
 from primeqa.components.base import Reader, Retriever
 from primeqa.components.retriever.searchable_corpus import SearchableCorpus
 from primeqa.components.reader import GenerativeReader
+from primeqa.ir.util.passage_store import PassageStore
 
 class QAPipeline:
     def __init__(self, retriever: Retriever, reader: Reader) -> None:
         self.retriever = retriever
         self.reader = reader
-        self.corpus_passages = []
-        with open(self.retriever.collection, "r") as infile:
-            for line in tqdm(infile):
-                id, text, title = line.split("\t")
-                self.corpus_passages.append(title + " " + text)
+        # Passages are looked up by pid in the memory mapped collection, rather than loaded in memory
+        self.passage_store = PassageStore(self.retriever.collection, has_header=False)
+
+    def get_passage(self, pid: int) -> str:
+        document = self.passage_store[pid]
+        return document["title"] + " " + document["text"]
 
     def run(self, input_texts: List[str], prefix="", suffix="", use_retriever=True):
         contexts = []
         if use_retriever:
             search_results = self.retriever.predict(input_texts=input_texts)
             for result in search_results:
-                context = [self.corpus_passages[int(p[0])] for p in result]
+                context = [self.get_passage(int(p[0])) for p in result]
                 contexts.append(context)
 
         reader_answers = self.reader.predict(
@@ -1,8 +1,10 @@
 import copy
+import itertools
 import numpy as np
 
 import torch
 from torch import cuda
+import torch.multiprocessing as mp
 
 from primeqa.qg.utils.constants import QGSpecialTokens
 from transformers import AutoTokenizer, AutoModelForSeq2SeqLM
@@ -30,15 +32,16 @@ class QGModel():
         special_tokens_list = []
 
         self.modality = modality 
+        self.lang = lang
         if self.modality == 'passage':
             special_tokens_list.append(QGSpecialTokens.sep)
-            self.answer_sampler = AnswerSampler()
+            self.answer_sampler = self._sampler = AnswerSampler()
         elif self.modality == 'table':
             special_tokens_list.extend([QGSpecialTokens.sep, QGSpecialTokens.cond, QGSpecialTokens.ans,
                             QGSpecialTokens.header, QGSpecialTokens.hsep])
-            self.sql_sampler = SimpleSqlSampler()
+            self.sql_sampler = self._sampler = SimpleSqlSampler()
         else:
-            self.path_sampler = PathSampler(lang)
+            self.path_sampler = self._sampler = PathSampler(lang)
 
         # adding special tokens to tokenizer which will be used to convert SQL and Passage+Answer to string
         for special_token in special_tokens_list:
@@ -135,6 +138,7 @@ class QGModel():
         else: 
             return new_qdicts
 
+
     def generate_questions(self, 
                 data_list, 
                 num_questions_per_instance=5, 
@@ -144,54 +148,205 @@ class QGModel():
                 hallucination_prop=0.25,
                 num_beams=5,
                 answers_list=[],
-                id_list=[]):
-                
+                id_list=[],
+                instances_per_chunk=64,
+                max_tokens_per_batch=8192,
+                num_sampling_workers=0):
+        """ Generates questions for all instances of data_list, see `generate_questions_iter`.
+
+        Returns:
+            List of question dicts. For the hybrid modality, hallucinations are pruned over all the instances at once.
+        """
+        qdict_lists = self._generate_qdict_lists(data_list, num_questions_per_instance, agg_prob, num_where_prob,
+                            ineq_prob, num_beams, answers_list, id_list, instances_per_chunk, max_tokens_per_batch,
+                            num_sampling_workers)
+        questions_dict = [qdict for qdicts in qdict_lists for qdict in qdicts]
+
+        if self.modality == 'hybrid':
+            questions_dict = self.prune_hallucinations(questions_dict, hallucination_prop=hallucination_prop, \
+                                num_instances=num_questions_per_instance)
+
+        return questions_dict
+
+    def generate_questions_iter(self, 
+                data_list, 
+                num_questions_per_instance=5, 
+                agg_prob=[], 
+                num_where_prob=[], 
+                ineq_prob=0.0,
+                hallucination_prop=0.25,
+                num_beams=5,
+                answers_list=[],
+                id_list=[],
+                instances_per_chunk=64,
+                max_tokens_per_batch=8192,
+                num_sampling_workers=0):
+        """ Generates questions lazily and yields the question dicts of each instance as soon as they are ready.
+        Instances are read from data_list (which may be any iterable, e.g. a generator of tables) and sampled
+        `instances_per_chunk` at a time. The inputs sampled for a chunk are sorted by length and generated in
+        micro-batches of at most `max_tokens_per_batch` padded input tokens, so memory stays bounded whatever
+        the size of data_list.
+
+        Args:
+            data_list (iterable): Tables, passages or (table, passages) tuples, depending on the modality.
+            instances_per_chunk (int, optional): How many instances are sampled before generating their questions.
+            max_tokens_per_batch (int, optional): Bound on batch size x longest input of each generate call.
+            num_sampling_workers (int, optional): If positive, sampling runs in that many worker processes, each with
+                its own sampler (and random state).
+        Yields:
+            Question dicts, in the order of data_list. For the hybrid modality, hallucinations are pruned per instance.
+        """
+        for qdicts in self._generate_qdict_lists(data_list, num_questions_per_instance, agg_prob, num_where_prob,
+                            ineq_prob, num_beams, answers_list, id_list, instances_per_chunk, max_tokens_per_batch,
+                            num_sampling_workers):
+            if self.modality == 'hybrid' and qdicts:
+                qdicts = self.prune_hallucinations(qdicts, hallucination_prop=hallucination_prop, \
+                                num_instances=num_questions_per_instance)
+            yield from qdicts
+
+    def _generate_qdict_lists(self, data_list, num_questions_per_instance, agg_prob, num_where_prob, ineq_prob,
+                num_beams, answers_list, id_list, instances_per_chunk, max_tokens_per_batch, num_sampling_workers):
+        """ Yields the (unpruned) list of question dicts of each instance of data_list. """
         if type(data_list) == dict:
             data_list = [data_list]
 
-        if self.modality == 'table':
-            input_str_list, sql_list, id_question_list = self.sql_sampler.controlled_sample_sql(data_list, \
-                        num_questions_per_instance, agg_prob, num_where_prob, ineq_prob, id_list)
-            answer_list = [s['answer'] for s in sql_list]
-        elif self.modality == 'passage':
-            input_str_list, answer_list, id_question_list , id_context_map = self.answer_sampler.create_qg_input(data_list, \
-                        num_questions_per_instance, answers_list, id_list)
-        else:
-            input_str_list, answer_list, id_question_list = self.path_sampler.create_qg_input(data_list, \
-                        num_questions_per_instance, id_list)
+        num_return_sequences = num_beams if self.modality == 'hybrid' else 1
 
-        input_ids = self._tokenizer(input_str_list, 
-                return_tensors='pt', 
-                padding=True,
-                truncation=True).to(self._device).input_ids
-    
-        if self.modality == "hybrid":
-            num_return_sequences = num_beams
-        else:
-            num_return_sequences = 1
-
-        generated_ids = self._model.generate(input_ids,
-            max_length=60, 
-            num_beams=num_beams,
-            repetition_penalty=2.5,
-            num_return_sequences=num_return_sequences,
-            length_penalty=1.0,
-            early_stopping=True)
-
-        questions = [self._tokenizer.decode(g, skip_special_tokens=True,
-                            clean_up_tokenization_spaces=True) for g in generated_ids]
-        
+        tasks = ((self.modality, data, _instance_answers(answers_list, i), _instance_ids(id_list, i),
+                    num_questions_per_instance, agg_prob, num_where_prob, ineq_prob)
+                    for i, data in enumerate(data_list))
+
+        def next_tasks():
+            return list(itertools.islice(tasks, instances_per_chunk))
+
+        pool = None
+        if num_sampling_workers > 0:
+            pool = mp.get_context('spawn').Pool(num_sampling_workers, initializer=_init_worker_sampler,
+                            initargs=(self.modality, self.lang))
+            chunksize = max(1, instances_per_chunk // num_sampling_workers)
+
+        try:
+            # The workers sample the next chunk while the questions of the current one are generated. Chunks are
+            # submitted one at a time, so at most two chunks of instances are held, however long data_list is.
+            if pool is not None:
+                pending = pool.map_async(_sample_in_worker, next_tasks(), chunksize=chunksize)
+
+            while True:
+                if pool is not None:
+                    chunk = pending.get()
+                    if chunk:
+                        pending = pool.map_async(_sample_in_worker, next_tasks(), chunksize=chunksize)
+                else:
+                    chunk = [_sample_instance(self._sampler, *task) for task in next_tasks()]
+                if not chunk:
+                    break
+
+                input_str_list = [input_str for sample in chunk for input_str in sample[0]]
+                questions = self._generate_batched(input_str_list, num_beams, num_return_sequences, max_tokens_per_batch)
+
+                offset = 0
+                for input_strs, answer_list, id_question_list, id_context_map in chunk:
+                    instance_questions = questions[offset:offset + len(input_strs)]
+                    offset += len(input_strs)
+                    yield self._make_qdicts(input_strs, answer_list, id_question_list, id_context_map,
+                                            instance_questions, num_return_sequences)
+        finally:
+            if pool is not None:
+                pool.terminate()
+
+    def _generate_batched(self, input_str_list, num_beams, num_return_sequences, max_tokens_per_batch):
+        """ Generates num_return_sequences questions per input, in length-sorted micro-batches padded to their
+        longest input. Returns the lists of questions in the order of input_str_list. """
+        if not input_str_list:
+            return []
+
+        encodings = self._tokenizer(input_str_list, truncation=True)['input_ids']
+        order = sorted(range(len(encodings)), key=lambda idx: len(encodings[idx]), reverse=True)
+
+        questions = [None] * len(encodings)
+        start = 0
+        while start < len(order):
+            # Longest input first, so the batch is padded to len(encodings[order[start]])
+            batch_size = max(1, max_tokens_per_batch // len(encodings[order[start]]))
+            batch = order[start:start + batch_size]
+            start += len(batch)
+
+            inputs = self._tokenizer.pad({'input_ids': [encodings[idx] for idx in batch]}, return_tensors='pt').to(self._device)
+
+            with torch.inference_mode():
+                generated_ids = self._model.generate(inputs['input_ids'],
+                    attention_mask=inputs['attention_mask'],
+                    max_length=60, 
+                    num_beams=num_beams,
+                    repetition_penalty=2.5,
+                    num_return_sequences=num_return_sequences,
+                    length_penalty=1.0,
+                    early_stopping=True)
+
+            decoded = self._tokenizer.batch_decode(generated_ids, skip_special_tokens=True,
+                            clean_up_tokenization_spaces=True)
+            for position, idx in enumerate(batch):
+                questions[idx] = decoded[position * num_return_sequences:(position + 1) * num_return_sequences]
+
+        return questions
+
+    def _make_qdicts(self, input_str_list, answer_list, id_question_list, id_context_map, questions, num_return_sequences):
         if id_question_list == [] :
-            questions_dict = [{'question': questions[i], 'answer': answer_list[i]} for i in range(len(questions))]
+            return [{'question': qs[0], 'answer': answer_list[i]} for i, qs in enumerate(questions)]
         elif self.modality == 'passage' :
-            questions_dict = [{'context_id':id_question_list[i], 'context':id_context_map.get(id_question_list[i]), \
-                                'question': questions[i], 'answer': answer_list[i]} for i in range(len(questions))]
+            return [{'context_id':id_question_list[i], 'context':id_context_map.get(id_question_list[i]), \
+                        'question': qs[0], 'answer': answer_list[i]} for i, qs in enumerate(questions)]
         else:
-            assert len(questions) == len(input_str_list) * num_return_sequences
-            questions_dict = [{'context_id':id_question_list[i], 'context': input_str_list[i], 'questions': list(qs),'answer': answer_list[i]} \
-                                for i, qs in enumerate(np.split(np.array(questions), len(questions)//num_return_sequences))]
-        if self.modality == 'hybrid':
-            questions_dict = self.prune_hallucinations(questions_dict, hallucination_prop=hallucination_prop, \
-                                num_instances=num_questions_per_instance)
+            return [{'context_id':id_question_list[i], 'context': input_str_list[i], 'questions': list(qs),'answer': answer_list[i]} \
+                        for i, qs in enumerate(questions)]
 
-        return questions_dict
+
+def _instance_answers(answers_list, i):
+    return [answers_list[i]] if i < len(answers_list) else []
+
+
+def _instance_ids(id_list, i):
+    # A missing id is passed as None, which the samplers treat as the original id_list does
+    if not id_list:
+        return []
+    return [id_list[i]] if i < len(id_list) else [None]
+
+
+def _sample_instance(sampler, modality, data, answers_list, id_list, num_questions_per_instance, agg_prob,
+                num_where_prob, ineq_prob):
+    """ Samples the generation inputs of one instance.
+
+    Returns:
+        input_str_list, answer_list, id_question_list and id_context_map (only filled in for passages).
+    """
+    if modality == 'table':
+        input_str_list, sql_list, id_question_list = sampler.controlled_sample_sql([data], \
+                    num_questions_per_instance, agg_prob, num_where_prob, ineq_prob, id_list)
+        return input_str_list, [s['answer'] for s in sql_list], id_question_list, {}
+    elif modality == 'passage':
+        return sampler.create_qg_input([data], num_questions_per_instance, answers_list, id_list)
+    else:
+        input_str_list, answer_list, id_question_list = sampler.create_qg_input([data], \
+                    num_questions_per_instance, id_list)
+        return input_str_list, answer_list, id_question_list, {}
+
+
+def _make_sampler(modality, lang):
+    if modality == 'passage':
+        return AnswerSampler()
+    elif modality == 'table':
+        return SimpleSqlSampler()
+    else:
+        return PathSampler(lang)
+
+
+_worker_sampler = None
+
+
+def _init_worker_sampler(modality, lang):
+    global _worker_sampler
+    _worker_sampler = _make_sampler(modality, lang)
+
+
+def _sample_in_worker(task):
+    return _sample_instance(_worker_sampler, *task)
@@ -0,0 +1,168 @@
+import json
+import logging
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable, List, Union
+
+from primeqa.services.configurations import Settings
+
+
+def batch_key(instance: Any, kwargs: dict) -> Hashable:
+    """
+    Key under which requests to a component instance are coalesced. Only requests for the same instance, as cached by
+    the factories, and with the same keyword arguments can share a batch.
+
+    Parameters
+    ----------
+    instance: Any
+        component instance returned by one of the factories.
+    kwargs: dict
+        keyword arguments passed along with the batched inputs.
+
+    Returns
+    -------
+    Hashable:
+        batch key.
+    """
+    return (hash(instance), json.dumps(kwargs, sort_keys=True, default=str))
+
+
+def predict_per_example(reader: Any, items: List, kwargs: dict) -> List:
+    """
+    Batched function for an extractive reader, answering each (question, contexts) pair as a separate example.
+
+    Parameters
+    ----------
+    reader: Any
+        extractive reader instance.
+    items: List
+        (question, contexts) pairs.
+    kwargs: dict
+        keyword arguments of the reader's `predict`.
+
+    Returns
+    -------
+    List:
+        predictions for each pair, in order.
+    """
+    example_ids = [str(idx) for idx in range(len(items))]
+    predictions = reader.predict(
+        questions=[question for question, _ in items],
+        contexts=[contexts for _, contexts in items],
+        example_ids=example_ids,
+        **kwargs,
+    )
+    return [predictions.get(example_id, []) for example_id in example_ids]
+
+
+class _Batch:
+    def __init__(self, fn: Callable[[List], List]):
+        self.fn = fn
+        self.items = []
+        self.waiters = []
+        self.closed = threading.Event()
+
+
+class RequestBatcher:
+    """
+    Coalesces concurrent requests to the same component instance into a single batched call.
+
+    The first request for a key opens a batch and waits up to `batching_max_wait_ms` for other requests to join it,
+    or until the batch holds `batching_max_batch_size` items. It then runs the batched function once over all items,
+    in the thread of the request which opened the batch, and hands each request back the results for its own items.
+    A request which arrives alone therefore waits up to `batching_max_wait_ms` before it runs. Setting
+    `batching_max_wait_ms` to 0 disables batching.
+    """
+
+    def __init__(self, config: Settings, logger: Union[logging.Logger, None] = None):
+        if logger is None:
+            self._logger = logging.getLogger(self.__class__.__name__)
+        else:
+            self._logger = logger
+        self._max_wait_secs = config.batching_max_wait_ms / 1000
+        self._max_batch_size = config.batching_max_batch_size
+        self._batches = {}
+        self._lock = threading.Lock()
+
+    def run(self, key: Hashable, fn: Callable[[List], List], items: List) -> List:
+        """
+        Run `fn` over `items`, possibly along with the items of concurrent requests for the same key.
+
+        Parameters
+        ----------
+        key: Hashable
+            batch key, see `batch_key`.
+        fn: Callable[[List], List]
+            function returning one result per item, in order. Requests sharing a key must pass equivalent functions.
+        items: List
+            items of this request.
+
+        Returns
+        -------
+        List:
+            results for `items`, in order. Exceptions raised by `fn` are raised to every request of the batch.
+        """
+        if self._max_wait_secs == 0 or not items:
+            return fn(items)
+
+        future = Future()
+        with self._lock:
+            batch = self._batches.get(key)
+            is_leader = batch is None
+            if is_leader:
+                batch = _Batch(fn)
+                self._batches[key] = batch
+
+            batch.waiters.append((len(batch.items), len(items), future))
+            batch.items.extend(items)
+
+            # Step 1: Close a full batch, so that later requests open a new one
+            if len(batch.items) >= self._max_batch_size:
+                del self._batches[key]
+                batch.closed.set()
+
+        # Step 2: The request which opened the batch runs it, once full or once the wait is over
+        if is_leader:
+            if not batch.closed.wait(self._max_wait_secs):
+                with self._lock:
+                    if self._batches.get(key) is batch:
+                        del self._batches[key]
+
+            self._execute(batch)
+
+        return future.result()
+
+    def _execute(self, batch: _Batch):
+        self._logger.debug(
+            "Running batch of %d items for %d requests",
+            len(batch.items),
+            len(batch.waiters),
+        )
+        try:
+            results = batch.fn(batch.items)
+            if len(results) != len(batch.items):
+                raise ValueError(
+                    f"Batched call returned {len(results)} results for {len(batch.items)} items"
+                )
+        except Exception as err:
+            for _, _, future in batch.waiters:
+                future.set_exception(err)
+            return
+
+        for start, count, future in batch.waiters:
+            future.set_result(results[start : start + count])
+
+
+class RequestBatcherFactory:
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_request_batcher(cls, config: Settings = None) -> RequestBatcher:
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = RequestBatcher(
+                    config=config if config is not None else Settings()
+                )
+
+        return cls._instance
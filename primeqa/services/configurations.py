@@ -46,6 +46,19 @@ def positive_integer_type(value):
     return ivalue
 
 
+def non_negative_integer_type(value):
+    try:
+        ivalue = int(value)
+    except ValueError as ex:
+        raise ArgumentTypeError(
+            f"{value} is an invalid non-negative int value: {ex}"
+        ) from ex
+
+    if ivalue < 0:
+        raise ArgumentTypeError(f"{value} is an invalid non-negative int value")
+    return ivalue
+
+
 def float_type_between_zero_and_one(value):
     try:
         fvalue = float(value)
@@ -217,6 +230,50 @@ class Settings(object):
     def num_rest_server_workers(self):
         pass
 
+    @config_value(property_type=positive_integer_type)
+    def num_indexing_workers(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def max_queued_indexing_jobs(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def indexing_progress_interval_secs(self):
+        pass
+
+    @config_value(property_type=non_negative_integer_type)
+    def batching_max_wait_ms(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def documents_cache_size(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def documents_batch_size(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def max_documents_database_connections(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def max_cached_components(self):
+        pass
+
+    @config_value(property_type=non_negative_integer_type)
+    def max_cached_components_memory_mb(self):
+        pass
+
+    @config_value(property_type=non_negative_integer_type)
+    def cached_component_idle_ttl_secs(self):
+        pass
+
+    @config_value(property_type=positive_integer_type)
+    def batching_max_batch_size(self):
+        pass
+
     def _get_config_dict(self):
         config_dict = {}
         for property_name in dir(self):
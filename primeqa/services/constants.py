@@ -6,6 +6,11 @@ ATTR_METADATA = "metadata"
 ATTR_CONFIGURATION = "configuration"
 ATTR_ENGINE_TYPE = "engine_type"
 ATTR_CHECKPOINT = "checkpoint"
+ATTR_PROGRESS = "progress"
+ATTR_NUM_DOCUMENTS = "num_documents"
+ATTR_NUM_INDEXED_DOCUMENTS = "num_indexed_documents"
+ATTR_STARTED_AT = "started_at"
+ATTR_ETA_SECS = "eta_secs"
 
 
 class IndexStatus(str, Enum):
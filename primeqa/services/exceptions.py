@@ -36,6 +36,8 @@ class ErrorMessages(str, Enum):
     FAILED_TO_LOCATE_INDEX_INFORMATION = (
         "E6003: Index information for index with id {} doesn't exist."
     )
+    INDEXING_QUEUE_FULL = "E6004: Indexing queue is full with {} pending jobs. Please try again in a short while."
+    FAILED_TO_LOCATE_INDEXING_JOB = "E6005: No pending or running indexing job for index with id {}."
     
     # RETRANKER
     INVALID_RETRANKER = "E5001: Invalid reranker: {}. Please select one of the following pre-defined rerankers: {}"
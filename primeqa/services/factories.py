@@ -1,9 +1,19 @@
+import gc
+import itertools
 import logging
+import threading
 import time
+import types
 import json
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Hashable
 
 from dataclasses import MISSING
 
+import numpy as np
+import torch
+
 from primeqa.components.base import (
     Reader,
     Retriever,
@@ -25,6 +35,8 @@ from primeqa.components.reranker.seq_classification_reranker import SeqClassific
 from primeqa.components.reranker.colbert_reranker import ColBERTReranker
 from primeqa.components.reranker.dpr_reranker import DPRReranker
 
+from primeqa.services.configurations import Settings
+
 
 READERS_REGISTRY = {
     ExtractiveReader.__name__: ExtractiveReader,
@@ -61,9 +73,242 @@ def validate(fields: dict):
         raise ValueError(f"Value must be defined for {', '.join(missing_fields)}")
 
 
+class _CacheEntry:
+    def __init__(self):
+        self.future = Future()
+        self.last_used_at = time.time()
+        self.memory_mb = 0.0
+
+
+class ComponentCache:
+    """
+    Bounded cache of loaded component instances, shared by the factories.
+
+    Instances are evicted least recently used first once more than `max_cached_components` are loaded, or once the
+    memory held by the cached instances exceeds `max_cached_components_memory_mb`. The memory of an instance is
+    estimated when it is loaded, from the tensors and arrays it references (see `_instance_memory_mb`), as the
+    resident memory of the process rarely shrinks once an instance is released. Instances unused for
+    `cached_component_idle_ttl_secs` are evicted as well. An instance still in use by a request is only released once
+    the request completes. Requests for an instance which is being loaded wait for the load to finish.
+    """
+
+    def __init__(self, name: str, config: Settings = None):
+        self._logger = logging.getLogger(name)
+        self._config = config
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._sweeper = None
+
+    def _settings(self) -> Settings:
+        # Read lazily, so that importing the factories doesn't require a valid configuration
+        if self._config is None:
+            self._config = Settings()
+        return self._config
+
+    def get(self, key: Hashable, load: Callable[[], Any]) -> Any:
+        """
+        Return the instance cached under `key`, loading it with `load` if needed.
+
+        Parameters
+        ----------
+        key: Hashable
+            instance id.
+        load: Callable[[], Any]
+            creates and loads the instance. Exceptions are raised to every request waiting for the instance.
+
+        Returns
+        -------
+        Any:
+            loaded instance.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            is_loading = entry is None
+            if is_loading:
+                entry = _CacheEntry()
+                self._entries[key] = entry
+            else:
+                entry.last_used_at = time.time()
+                self._entries.move_to_end(key)
+
+        if is_loading:
+            try:
+                instance = load()
+            except BaseException as err:
+                with self._lock:
+                    if self._entries.get(key) is entry:
+                        del self._entries[key]
+                entry.future.set_exception(err)
+                raise
+
+            entry.memory_mb = _instance_memory_mb(instance)
+            entry.future.set_result(instance)
+            self._evict(keep=key)
+            self._start_sweeper()
+
+        return entry.future.result()
+
+    def unload(self, key: Hashable) -> bool:
+        """
+        Evict the instance cached under `key`.
+
+        Parameters
+        ----------
+        key: Hashable
+            instance id.
+
+        Returns
+        -------
+        bool:
+            True if an instance was evicted, False if none is cached under `key`.
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not entry.future.done():
+                return False
+            del self._entries[key]
+
+        self._logger.info("Unloading instance with id=%s", key)
+        del entry
+        _release_memory()
+        return True
+
+    def keys(self):
+        with self._lock:
+            return [key for key, entry in self._entries.items() if entry.future.done()]
+
+    def _evict(self, keep: Hashable):
+        config = self._settings()
+
+        # Step 1: Evict over count
+        with self._lock:
+            evictable = [key for key, entry in self._entries.items() if key != keep and entry.future.done()]
+            num_loaded = len(evictable) + 1
+        for key in evictable[: max(num_loaded - config.max_cached_components, 0)]:
+            self.unload(key)
+
+        # Step 2: Evict over memory budget, least recently used first
+        if config.max_cached_components_memory_mb > 0:
+            with self._lock:
+                loaded = [(key, entry.memory_mb) for key, entry in self._entries.items() if entry.future.done()]
+            memory_mb = sum(memory_mb for _, memory_mb in loaded)
+            for key, memory_mb_ in loaded:
+                if memory_mb <= config.max_cached_components_memory_mb:
+                    break
+                if key != keep and self.unload(key):
+                    memory_mb -= memory_mb_
+
+    def _evict_idle(self):
+        ttl_secs = self._settings().cached_component_idle_ttl_secs
+        with self._lock:
+            idle = [
+                key
+                for key, entry in self._entries.items()
+                if entry.future.done() and time.time() - entry.last_used_at > ttl_secs
+            ]
+        for key in idle:
+            self.unload(key)
+
+    def _start_sweeper(self):
+        ttl_secs = self._settings().cached_component_idle_ttl_secs
+        if ttl_secs == 0:
+            return
+
+        with self._lock:
+            if self._sweeper is not None:
+                return
+
+            def sweep():
+                while True:
+                    time.sleep(max(ttl_secs / 2, 1))
+                    self._evict_idle()
+
+            self._sweeper = threading.Thread(target=sweep, daemon=True)
+            self._sweeper.start()
+
+
+def _instance_memory_mb(instance: Any, max_depth: int = 4, max_items: int = 1000) -> float:
+    """
+    Estimate the memory held by an instance: the parameters and buffers of the torch modules, and the tensors and
+    numpy arrays, it references through its attributes, up to `max_depth` levels deep. Each object is counted once.
+    """
+    seen = set()
+    num_bytes = 0
+    stack = [(instance, 0)]
+    while stack:
+        obj, depth = stack.pop()
+        if id(obj) in seen:
+            continue
+        seen.add(id(obj))
+
+        if isinstance(obj, torch.nn.Module):
+            for tensor in itertools.chain(obj.parameters(), obj.buffers()):
+                if id(tensor) not in seen:
+                    seen.add(id(tensor))
+                    num_bytes += tensor.numel() * tensor.element_size()
+        elif isinstance(obj, torch.Tensor):
+            num_bytes += obj.numel() * obj.element_size()
+        elif isinstance(obj, np.ndarray):
+            num_bytes += obj.nbytes
+        elif depth < max_depth and not isinstance(obj, (type, types.ModuleType)):
+            if isinstance(obj, dict):
+                children = obj.values()
+            elif isinstance(obj, (list, tuple, set)):
+                children = obj
+            elif hasattr(obj, "__dict__"):
+                children = vars(obj).values()
+            else:
+                continue
+            stack.extend((child, depth + 1) for child in itertools.islice(children, max_items))
+
+    return num_bytes / (1024 * 1024)
+
+
+def _release_memory():
+    gc.collect()
+    if torch.cuda.is_available():
+        torch.cuda.empty_cache()
+
+
+def _load(
+    logger: logging.Logger,
+    component_type: str,
+    instance: Any,
+    kwargs: dict,
+    load_args: tuple,
+    load_kwargs: dict,
+):
+    try:
+        logger.info(
+            "Loading '%s' %s with parameters = %s",
+            instance.__class__.__name__,
+            component_type,
+            kwargs,
+        )
+        start_t = time.time()
+        instance.load(load_args, load_kwargs)
+        logger.info(
+            "'%s' %s - loading took %.2f seconds",
+            instance.__class__.__name__,
+            component_type,
+            time.time() - start_t,
+        )
+    except OSError as err:
+        # Log exception
+        logger.warning(
+            "Failed to load %s with arguments: %s",
+            instance.__class__.__name__,
+            kwargs,
+        )
+
+        # Raise exception
+        raise ValueError(err.args[0]) from err
+
+    return instance
+
+
 class ReaderFactory:
-    _instances = {}
-    _loading = []
+    _instances = ComponentCache("ReaderFactory")
     _logger = logging.getLogger("ReaderFactory")
 
     @classmethod
@@ -88,59 +333,21 @@ class ReaderFactory:
         # Step 3: Create hash based unique instance id
         instance_id = hash(instance)
 
-        # Step 4: Load and persist instance
-        if instance_id not in cls._instances:
-            # Step 4.a: Check if class is currently loading
-            if instance_id in cls._loading:
-                raise ValueError(
-                    f"{reader.__name__} is currently being loading. Please try again in a short while."
-                )
-
-            # Step 4.b: Add to loading
-            cls._loading.append(instance_id)
-
-            # Step 4.d: Start loading
-            try:
-                cls._logger.info(
-                    "Loading '%s' reader with parameters = %s",
-                    reader.__name__,
-                    reader_kwargs,
-                )
-                start_t = time.time()
-                instance.load(load_args, load_kwargs)
-                cls._logger.info(
-                    "'%s' reader - loading took %.2f seconds",
-                    reader.__name__,
-                    time.time() - start_t,
-                )
-            except OSError as err:
-                # Step 3.d.i: Log exception
-                cls._logger.warning(
-                    "Failed to load %s with arguments: %s",
-                    reader.__name__,
-                    reader_kwargs,
-                )
-
-                # Step 3.d.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
-
-                # Step 3.d.iii: Raise exception
-                raise ValueError(err.args[0]) from err
-
-            # Step 4.e: Remove from loading and add to available instances
-            cls._instances[instance_id] = instance
-            cls._loading.remove(instance_id)
-
-        else:
-            # Step 4.a: Instance with same instance_id already exists, clean up newly created instance
-            del instance
+        # Step 4: Load instance, unless already loaded (or being loaded for another request)
+        return cls._instances.get(
+            instance_id,
+            lambda: _load(
+                cls._logger, "reader", instance, reader_kwargs, load_args, load_kwargs
+            ),
+        )
 
-        return cls._instances[instance_id]
+    @classmethod
+    def unload(cls, instance_id: int) -> bool:
+        return cls._instances.unload(instance_id)
 
 
 class RetrieverFactory:
-    _instances = {}
-    _loading = []
+    _instances = ComponentCache("RetrieverFactory")
     _logger = logging.getLogger("RetrieverFactory")
 
     @classmethod
@@ -171,59 +378,26 @@ class RetrieverFactory:
         # Step 3: Create hash based unique instance id
         instance_id = hash(instance)
 
-        # Step 4: Load and persist instance
-        if instance_id not in cls._instances:
-            # Step 4.a: Check if class is currently loading
-            if instance_id in cls._loading:
-                raise ValueError(
-                    f"{retriever.__name__} is currently being loading. Please try again in a short while."
-                )
-
-            # Step 4.b: Add to loading
-            cls._loading.append(instance_id)
-
-            # Step 4.d: Start loading
-            try:
-                cls._logger.info(
-                    "Loading '%s' retriever with parameters = %s",
-                    retriever.__name__,
-                    retriever_kwargs,
-                )
-                start_t = time.time()
-                instance.load(load_args, load_kwargs)
-                cls._logger.info(
-                    "'%s' retriever - loading took %.2f seconds",
-                    retriever.__name__,
-                    time.time() - start_t,
-                )
-            except OSError as err:
-                # Step 3.d.i: Log exception
-                cls._logger.warning(
-                    "Failed to load %s with arguments: %s",
-                    retriever.__name__,
-                    retriever_kwargs,
-                )
-
-                # Step 3.d.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
-
-                # Step 3.d.iii: Raise exception
-                raise ValueError(err.args[0]) from err
-
-            # Step 4.e: Remove from loading and add to available instances
-            cls._instances[instance_id] = instance
-            cls._loading.remove(instance_id)
-
-        else:
-            # Step 4.a: Instance with same instance_id already exists, clean up newly created instance
-            del instance
+        # Step 4: Load instance, unless already loaded (or being loaded for another request)
+        return cls._instances.get(
+            instance_id,
+            lambda: _load(
+                cls._logger,
+                "retriever",
+                instance,
+                retriever_kwargs,
+                load_args,
+                load_kwargs,
+            ),
+        )
 
-        return cls._instances[instance_id]
+    @classmethod
+    def unload(cls, instance_id: int) -> bool:
+        return cls._instances.unload(instance_id)
 
 
 class IndexerFactory:
-    _instances = {}
-    _loading = []
+    _instances = ComponentCache("IndexerFactory")
     _logger = logging.getLogger("IndexerFactory")
 
     @classmethod
@@ -242,68 +416,42 @@ class IndexerFactory:
             f"{indexer.__name__}::{json.dumps(indexer_kwargs, sort_keys=True)}"
         )
 
-        if instance_id not in cls._instances:
-            # Step 3.a: Check if class is currently loading
-            if instance_id in cls._loading:
-                raise ValueError(
-                    f"{indexer.__name__} is currently being loading. Please try again in a short while."
-                )
-
-            # Step 3.b: Add to loading
-            cls._loading.append(instance_id)
-
-            # Step 3.c: Initialize instance
+        # Step 3: Initialize and load instance, unless already loaded (or being loaded for another request)
+        def initialize_and_load():
             cls._logger.info(
                 "%s - initializing with arguments: %s", indexer.__name__, indexer_kwargs
             )
             try:
                 instance = indexer(**indexer_kwargs)
             except TypeError as err:
-                # Step 3.c.i: Log exception
+                # Step 3.a: Log exception
                 cls._logger.warning(
                     "Failed to intialize %s with arguments: %s",
                     indexer.__name__,
                     indexer_kwargs,
                 )
 
-                # Step 3.c.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
-
-                # Step 3.c.iii: Raise exception
+                # Step 3.b: Raise exception
                 raise err
 
-            # Step 3.d: Load instance
-            try:
-                start_t = time.time()
-                instance.load(load_args, load_kwargs)
-                cls._logger.info(
-                    "%s - loading took %.2f seconds",
-                    indexer.__name__,
-                    time.time() - start_t,
-                )
-            except OSError as err:
-                # Step 3.d.i: Log exception
-                cls._logger.warning(
-                    "Failed to load %s with arguments: %s",
-                    indexer.__name__,
-                    indexer_kwargs,
-                )
+            return _load(
+                cls._logger,
+                "indexer",
+                instance,
+                indexer_kwargs,
+                load_args,
+                load_kwargs,
+            )
 
-                # Step 3.d.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
+        return cls._instances.get(instance_id, initialize_and_load)
 
-                # Step 3.d.iii: Raise exception
-                raise ValueError(err.args[0]) from err
+    @classmethod
+    def unload(cls, instance_id: int) -> bool:
+        return cls._instances.unload(instance_id)
 
-            # Step 3.d: Remove from loading and add to available instances
-            cls._instances[instance_id] = instance
-            cls._loading.remove(instance_id)
 
-        return cls._instances[instance_id]
-    
 class RerankerFactory:
-    _instances = {}
-    _loading = []
+    _instances = ComponentCache("RerankerFactory")
     _logger = logging.getLogger("RerankerFactory")
 
     @classmethod
@@ -334,51 +482,19 @@ class RerankerFactory:
         # Step 3: Create hash based unique instance id
         instance_id = hash(instance)
 
-        # Step 4: Load and persist instance
-        if instance_id not in cls._instances:
-            # Step 4.a: Check if class is currently loading
-            if instance_id in cls._loading:
-                raise ValueError(
-                    f"{reranker.__name__} is currently being loading. Please try again in a short while."
-                )
-
-            # Step 4.b: Add to loading
-            cls._loading.append(instance_id)
-
-            # Step 4.d: Start loading
-            try:
-                cls._logger.info(
-                    "Loading '%s' retriever with parameters = %s",
-                    reranker.__name__,
-                    reranker_kwargs,
-                )
-                start_t = time.time()
-                instance.load(load_args, load_kwargs)
-                cls._logger.info(
-                    "'%s' retriever - loading took %.2f seconds",
-                    reranker.__name__,
-                    time.time() - start_t,
-                )
-            except OSError as err:
-                # Step 3.d.i: Log exception
-                cls._logger.warning(
-                    "Failed to load %s with arguments: %s",
-                    reranker.__name__,
-                    reranker_kwargs,
-                )
-
-                # Step 3.d.ii: Remove reader from loading
-                cls._loading.remove(instance_id)
-
-                # Step 3.d.iii: Raise exception
-                raise ValueError(err.args[0]) from err
-
-            # Step 4.e: Remove from loading and add to available instances
-            cls._instances[instance_id] = instance
-            cls._loading.remove(instance_id)
-
-        else:
-            # Step 4.a: Instance with same instance_id already exists, clean up newly created instance
-            del instance
+        # Step 4: Load instance, unless already loaded (or being loaded for another request)
+        return cls._instances.get(
+            instance_id,
+            lambda: _load(
+                cls._logger,
+                "reranker",
+                instance,
+                reranker_kwargs,
+                load_args,
+                load_kwargs,
+            ),
+        )
 
-        return cls._instances[instance_id]
+    @classmethod
+    def unload(cls, instance_id: int) -> bool:
+        return cls._instances.unload(instance_id)
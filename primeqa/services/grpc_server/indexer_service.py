@@ -1,10 +1,11 @@
+import itertools
 import logging
 from typing import Union
 
 from grpc import ServicerContext, StatusCode
 from google.protobuf.json_format import MessageToDict
 
-from primeqa.services.exceptions import ErrorMessages
+from primeqa.services.exceptions import Error, ErrorMessages
 from primeqa.services.configurations import Settings
 from primeqa.services.constants import (
     ATTR_INDEX_ID,
@@ -14,6 +15,9 @@ from primeqa.services.constants import (
     ATTR_METADATA,
     ATTR_CONFIGURATION,
     ATTR_CHECKPOINT,
+    ATTR_PROGRESS,
+    ATTR_NUM_DOCUMENTS,
+    ATTR_NUM_INDEXED_DOCUMENTS,
 )
 from primeqa.services.store import DIR_NAME_INDEX, StoreFactory
 from primeqa.services.grpc_server.utils import (
@@ -21,10 +25,8 @@ from primeqa.services.grpc_server.utils import (
     generate_parameters,
 )
 from primeqa.services.parameters import get_parameter_type
-from primeqa.services.factories import (
-    INDEXERS_REGISTRY,
-    IndexerFactory,
-)
+from primeqa.services.factories import INDEXERS_REGISTRY, validate
+from primeqa.services.jobs import IndexingJobsFactory
 from primeqa.services.grpc_server.grpc_generated.indexer_pb2_grpc import (
     IndexingServiceServicer,
 )
@@ -53,6 +55,7 @@ class IndexerService(IndexingServiceServicer):
             self._logger = logger
         self._config = config
         self._store = StoreFactory.get_store()
+        self._jobs = IndexingJobsFactory.get_indexing_jobs(config=config)
         self._logger.info("%s is successfully initialized.", self.__class__.__name__)
 
     def GetIndexers(
@@ -87,134 +90,128 @@ class IndexerService(IndexingServiceServicer):
             ATTR_CONFIGURATION: {},
         }
 
-        # Step 2: Iterate over all index requests to collect documents
-        documents_to_index = list()
-        instance = None
-        for request_idx, request in enumerate(request_iterator):
-            if request_idx == 0:
-                # Step 2.a: Verify requested indexer
-                try:
-                    indexer = INDEXERS_REGISTRY[request.indexer.indexer_id]
-                except KeyError:
-                    context.set_code(StatusCode.INVALID_ARGUMENT)
-                    context.set_details(
-                        ErrorMessages.INVALID_INDEXER.value.format(
-                            request.indexer.indexer_id,
-                            ", ".join(INDEXERS_REGISTRY.keys()),
-                        )
-                    )
-                    return GenerateIndexResponse()
+        # Step 2: Verify indexer and parameters specified in the first index request
+        request_iterator = iter(request_iterator)
+        request = next(request_iterator, None)
+        if request is None:
+            context.set_code(StatusCode.INVALID_ARGUMENT)
+            return GenerateIndexResponse()
 
-                # Step 2.b: Remove existing index if index_id is provide in the request
-                if request.index_id:
-                    self._store.delete_index(request.index_id)
-                    index_information[ATTR_INDEX_ID] = request.index_id
+        # Step 2.a: Verify requested indexer
+        try:
+            indexer = INDEXERS_REGISTRY[request.indexer.indexer_id]
+        except KeyError:
+            context.set_code(StatusCode.INVALID_ARGUMENT)
+            context.set_details(
+                ErrorMessages.INVALID_INDEXER.value.format(
+                    request.indexer.indexer_id,
+                    ", ".join(INDEXERS_REGISTRY.keys()),
+                )
+            )
+            return GenerateIndexResponse()
 
-                # Step 2.c: Load default retriever keyword arguments
-                indexer_kwargs = {
-                    k: v.default
-                    for k, v in indexer.__dataclass_fields__.items()
-                    if v.init
-                }
+        # Step 2.b: Cancel pending or running indexing job and remove existing index if index_id is provide in the request
+        if request.index_id:
+            self._jobs.cancel(request.index_id)
+            self._store.delete_index(request.index_id)
+            index_information[ATTR_INDEX_ID] = request.index_id
 
-                # Step 2.d: If parameters are provided in request then update keyword arguments used to instantiate indexer instance
-                if request.indexer.parameters:
-                    for parameter in request.indexer.parameters:
-                        if parameter.parameter_id not in indexer_kwargs:
-                            context.set_code(StatusCode.INVALID_ARGUMENT)
-                            context.set_details(
-                                ErrorMessages.INVALID_PARAMETER.value.format(
-                                    "indexer", parameter.parameter_id
-                                )
-                            )
-                            return GenerateIndexResponse()
+        # Step 2.c: Load default retriever keyword arguments
+        indexer_kwargs = {
+            k: v.default for k, v in indexer.__dataclass_fields__.items() if v.init
+        }
 
-                        indexer_kwargs[parameter.parameter_id] = parse_parameter_value(
-                            parameter,
-                            get_parameter_type(
-                                component=indexer,
-                                parameter_id=parameter.parameter_id,
-                            ),
+        # Step 2.d: If parameters are provided in request then update keyword arguments used to instantiate indexer instance
+        if request.indexer.parameters:
+            for parameter in request.indexer.parameters:
+                if parameter.parameter_id not in indexer_kwargs:
+                    context.set_code(StatusCode.INVALID_ARGUMENT)
+                    context.set_details(
+                        ErrorMessages.INVALID_PARAMETER.value.format(
+                            "indexer", parameter.parameter_id
                         )
-                        # Process `checkpoint` parameter
-                        if parameter.parameter_id == "checkpoint":
-                            # Add `checkpoint` parameter value to index information
-                            index_information[ATTR_CONFIGURATION][
-                                ATTR_CHECKPOINT
-                            ] = indexer_kwargs["checkpoint"]
-
-                            # Re-map checkpoint kwarg to point to checkpoint file path in the service's store
-                            indexer_kwargs[
-                                "checkpoint"
-                            ] = self._store.get_checkpoint_path(
-                                indexer_kwargs["checkpoint"]
-                            )
+                    )
+                    return GenerateIndexResponse()
 
-                # Step 2.e: Update index specific arguments
-                indexer_kwargs["index_root"] = self._store.get_index_directory_path(
-                    index_information[ATTR_INDEX_ID]
+                indexer_kwargs[parameter.parameter_id] = parse_parameter_value(
+                    parameter,
+                    get_parameter_type(
+                        component=indexer,
+                        parameter_id=parameter.parameter_id,
+                    ),
                 )
-                indexer_kwargs["index_name"] = DIR_NAME_INDEX
+                # Process `checkpoint` parameter
+                if parameter.parameter_id == "checkpoint":
+                    # Add `checkpoint` parameter value to index information
+                    index_information[ATTR_CONFIGURATION][
+                        ATTR_CHECKPOINT
+                    ] = indexer_kwargs["checkpoint"]
 
-                # Step 2.e: Create indexer instance
-                try:
-                    instance = IndexerFactory.get(indexer, indexer_kwargs)
-                except (ValueError, TypeError) as err:
-                    context.set_code(StatusCode.INVALID_ARGUMENT)
-                    context.set_details(err.args[0])
-                    return GenerateIndexResponse()
+                    # Re-map checkpoint kwarg to point to checkpoint file path in the service's store
+                    indexer_kwargs["checkpoint"] = self._store.get_checkpoint_path(
+                        indexer_kwargs["checkpoint"]
+                    )
 
-            # Append documents from each index request
-            documents_to_index.extend(
-                MessageToDict(request, preserving_proto_field_name=True)["documents"]
-            )
+        # Step 2.e: Update index specific arguments
+        indexer_kwargs["index_root"] = self._store.get_index_directory_path(
+            index_information[ATTR_INDEX_ID]
+        )
+        indexer_kwargs["index_name"] = DIR_NAME_INDEX
+
+        # Step 2.e: Create indexer instance (loaded by the indexing job)
+        try:
+            validate(indexer_kwargs)
+            instance = indexer(**indexer_kwargs)
+        except (ValueError, TypeError) as err:
+            context.set_code(StatusCode.INVALID_ARGUMENT)
+            context.set_details(err.args[0])
+            return GenerateIndexResponse()
 
         # Step 3: Save index information
         index_information[ATTR_CONFIGURATION][
             ATTR_ENGINE_TYPE
         ] = instance.get_engine_type()
+        index_information[ATTR_PROGRESS] = {
+            ATTR_NUM_DOCUMENTS: 0,
+            ATTR_NUM_INDEXED_DOCUMENTS: 0,
+        }
         self._store.save_index_information(
             index_id=index_information[ATTR_INDEX_ID],
             information=index_information,
         )
 
-        # Step 4: Save documents used in index
-        self._store.save_index_documents(
-            index_id=index_information[ATTR_INDEX_ID], documents=documents_to_index
+        # Step 4: Save documents used in index, as index requests are received
+        def documents():
+            for index_request in itertools.chain([request], request_iterator):
+                for document in index_request.documents:
+                    yield MessageToDict(document, preserving_proto_field_name=True)
+
+        index_information[ATTR_PROGRESS][
+            ATTR_NUM_DOCUMENTS
+        ] = self._store.save_index_documents(
+            index_id=index_information[ATTR_INDEX_ID], documents=documents()
+        )
+        self._store.save_index_information(
+            index_id=index_information[ATTR_INDEX_ID],
+            information=index_information,
         )
 
         # Step 5: Kick-off async index generation
         try:
-            instance.index(
-                self._store.get_index_documents_file_path(
-                    index_id=index_information[ATTR_INDEX_ID]
-                ),
-            )
-
-            # Step 5.b: Set index status to "READY" once indexing is complete
-            index_information[ATTR_STATUS] = IndexStatus.READY.value
-        except (TypeError, RuntimeError) as err:
-            index_information[ATTR_STATUS] = IndexStatus.CORRUPT.value
-            logging.exception(
-                "Generation failed for index with id=%s. Resultant index may be corrupted.",
-                index_information[ATTR_INDEX_ID],
+            self._jobs.submit(
+                index_id=index_information[ATTR_INDEX_ID],
+                indexer_id=indexer.__name__,
+                indexer_kwargs=indexer_kwargs,
             )
-            logging.exception(err.args[0])
-
-        self._store.save_index_information(
-            index_information[ATTR_INDEX_ID], information=index_information
-        )
+        except Error as err:
+            self._store.delete_index(index_information[ATTR_INDEX_ID])
+            context.set_code(StatusCode.RESOURCE_EXHAUSTED)
+            context.set_details(err.args[0])
+            return GenerateIndexResponse()
 
         # Step 6: Return
         return GenerateIndexResponse(
-            index_id=index_information[ATTR_INDEX_ID],
-            status=READY
-            if index_information[ATTR_STATUS] == IndexStatus.READY.value
-            else (
-                INDEXING
-                if index_information[ATTR_STATUS] == IndexStatus.INDEXING.value
-                else CORRUPT
-            ),
+            index_id=index_information[ATTR_INDEX_ID], status=INDEXING
         )
 
     def GetIndexStatus(
@@ -227,6 +224,16 @@ class IndexerService(IndexingServiceServicer):
             if index_information[ATTR_STATUS] == IndexStatus.READY.value:
                 return IndexStatusResponse(status=READY)
             elif index_information[ATTR_STATUS] == IndexStatus.INDEXING.value:
+                # Report indexing progress as trailing metadata
+                if ATTR_PROGRESS in index_information:
+                    context.set_trailing_metadata(
+                        tuple(
+                            (key, str(value))
+                            for key, value in index_information[
+                                ATTR_PROGRESS
+                            ].items()
+                        )
+                    )
                 return IndexStatusResponse(status=INDEXING)
             else:
                 return IndexStatusResponse(status=IndexStatus.CORRUPT.value)
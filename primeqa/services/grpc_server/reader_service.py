@@ -1,13 +1,16 @@
 import logging
 from typing import Union
 
-from primeqa.components.reader.extractive import ExtractiveReader
-
 from grpc import ServicerContext, StatusCode
 
 from primeqa.components.reader.extractive import ExtractiveReader
 from primeqa.services.exceptions import Error, ErrorMessages
 from primeqa.services.configurations import Settings
+from primeqa.services.batching import (
+    RequestBatcherFactory,
+    batch_key,
+    predict_per_example,
+)
 from primeqa.services.grpc_server.utils import (
     parse_parameter_value,
     generate_parameters,
@@ -41,6 +44,7 @@ class ReaderService(ReadingServiceServicer):
         else:
             self._logger = logger
         self._config = config
+        self._batcher = RequestBatcherFactory.get_request_batcher(config)
         self.loaded_readers = {}
         self._logger.info("%s is successfully initialized.", self.__class__.__name__)
 
@@ -139,75 +143,112 @@ class ReaderService(ReadingServiceServicer):
         ]
         answers_response = GetAnswersResponse()
         try:
-            for idx, query in enumerate(request.queries):
-                # Step 5.a: Run "apply" per query
+            if isinstance(instance, ExtractiveReader):
+                # Step 5.a: Flatten (query, context) pairs of all queries to run "apply" once per request
+                questions, contexts, example_ids = [], [], []
+                for idx, query in enumerate(request.queries):
+                    for text in request.contexts[idx].texts:
+                        example_ids.append(str(len(example_ids)))
+                        questions.append(query)
+                        contexts.append([text])
+
                 self._logger.info(
-                    "Applying '%s' reader with parameters = %s for query = '%s' and contexts = %s",
+                    "Applying '%s' reader with parameters = %s for queries = %s and contexts = %s",
                     instance.__class__.__name__,
                     {
                         k: getattr(instance, k) if k in instance_fields else v
                         for k, v in reader_kwargs.items()
                     },
-                    query,
-                    request.contexts[idx].texts,
+                    list(request.queries),
+                    [list(query_contexts.texts) for query_contexts in request.contexts],
                 )
                 try:
-                    if isinstance(instance, ExtractiveReader):
-                        predictions = instance.predict(
-                            questions=[query] * len(request.contexts[idx].texts),
-                            contexts=[[text] for text in request.contexts[idx].texts],
-                            example_ids=[
-                                str(example_id)
-                                for example_id in range(
-                                    1, len(request.contexts[idx].texts) + 1
-                                )
-                            ],
-                            **reader_kwargs,
+                    # Concurrent requests to the same reader are answered as one batch of (query, context) pairs
+                    predictions = dict(
+                        zip(
+                            example_ids,
+                            self._batcher.run(
+                                batch_key(instance, reader_kwargs),
+                                lambda items: predict_per_example(
+                                    instance, items, reader_kwargs
+                                ),
+                                list(zip(questions, contexts)),
+                            ),
                         )
-                        self._logger.info(
-                            "Applying '%s' reader for query = '%s' returns predictions = %s",
-                            instance.__class__.__name__,
-                            query,
-                            predictions,
+                    )
+                except AssertionError:
+                    context.set_code(StatusCode.INTERNAL)
+                    context.set_details(ErrorMessages.INVALID_READER_INPUT.value)
+                    return GetAnswersResponse()
+
+                except TypeError:
+                    context.set_code(StatusCode.INTERNAL)
+                    context.set_details(
+                        ErrorMessages.FAILED_TO_INITIALIZE.value.format(
+                            f"{request.reader.reader_id} reader"
                         )
+                    )
+                    return GetAnswersResponse()
 
-                        # Step 5.b: Add answers for current query into response object
-                        answers_response.query_answers.append(
-                            AnswersForQuery(
-                                context_answers=[
-                                    AnswersForContext(
-                                        answers=[
-                                            Answer(
-                                                text=prediction["span_answer_text"],
-                                                confidence_score=prediction[
-                                                    "confidence_score"
-                                                ],
-                                                evidences=[
-                                                    Evidence(
-                                                        context_index=int(
-                                                            prediction["example_id"]
-                                                        ),
-                                                        offsets=[
-                                                            Offset(
-                                                                start=prediction[
-                                                                    "span_answer"
-                                                                ]["start_position"],
-                                                                end=prediction[
-                                                                    "span_answer"
-                                                                ]["end_position"],
-                                                            )
+                self._logger.info(
+                    "Applying '%s' reader for queries = %s returns predictions = %s",
+                    instance.__class__.__name__,
+                    list(request.queries),
+                    predictions,
+                )
+
+                # Step 5.b: Demultiplex predictions into answers for each query, in the order of its contexts
+                example_idx = 0
+                for idx in range(len(request.queries)):
+                    context_answers = []
+                    for context_idx in range(len(request.contexts[idx].texts)):
+                        context_answers.append(
+                            AnswersForContext(
+                                answers=[
+                                    Answer(
+                                        text=prediction["span_answer_text"],
+                                        confidence_score=prediction["confidence_score"],
+                                        evidences=[
+                                            Evidence(
+                                                context_index=context_idx + 1,
+                                                offsets=[
+                                                    Offset(
+                                                        start=prediction["span_answer"][
+                                                            "start_position"
+                                                        ],
+                                                        end=prediction["span_answer"][
+                                                            "end_position"
                                                         ],
                                                     )
                                                 ],
                                             )
-                                            for prediction in predictions_for_context
-                                        ]
+                                        ],
+                                    )
+                                    for prediction in predictions.get(
+                                        example_ids[example_idx], []
                                     )
-                                    for predictions_for_context in predictions.values()
                                 ]
                             )
                         )
-                    else:
+                        example_idx += 1
+
+                    answers_response.query_answers.append(
+                        AnswersForQuery(context_answers=context_answers)
+                    )
+            else:
+                for idx, query in enumerate(request.queries):
+                    # Step 5.a: Run "apply" per query
+                    self._logger.info(
+                        "Applying '%s' reader with parameters = %s for query = '%s' and contexts = %s",
+                        instance.__class__.__name__,
+                        {
+                            k: getattr(instance, k) if k in instance_fields else v
+                            for k, v in reader_kwargs.items()
+                        },
+                        query,
+                        request.contexts[idx].texts,
+                    )
+                    try:
                         # This is a generative reader
                         predictions = instance.predict(
                             questions=[query],
@@ -251,19 +292,19 @@ class ReaderService(ReadingServiceServicer):
                                 ]
                             )
                         )
-                except AssertionError:
-                    context.set_code(StatusCode.INTERNAL)
-                    context.set_details(ErrorMessages.INVALID_READER_INPUT.value)
-                    return GetAnswersResponse()
+                    except AssertionError:
+                        context.set_code(StatusCode.INTERNAL)
+                        context.set_details(ErrorMessages.INVALID_READER_INPUT.value)
+                        return GetAnswersResponse()
 
-                except TypeError:
-                    context.set_code(StatusCode.INTERNAL)
-                    context.set_details(
-                        ErrorMessages.FAILED_TO_INITIALIZE.value.format(
-                            f"{request.reader.reader_id} reader"
+                    except TypeError:
+                        context.set_code(StatusCode.INTERNAL)
+                        context.set_details(
+                            ErrorMessages.FAILED_TO_INITIALIZE.value.format(
+                                f"{request.reader.reader_id} reader"
+                            )
                         )
-                    )
-                    return GetAnswersResponse()
+                        return GetAnswersResponse()
 
         except IndexError:
             context.set_code(StatusCode.INVALID_ARGUMENT)
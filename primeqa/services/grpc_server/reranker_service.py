@@ -5,6 +5,7 @@ from grpc import ServicerContext, StatusCode
 from google.protobuf.json_format import MessageToDict
 
 from primeqa.services.configurations import Settings
+from primeqa.services.batching import RequestBatcherFactory, batch_key
 from primeqa.services.parameters import get_parameter_type
 
 from primeqa.services.factories import RERANKERS_REGISTRY, RerankerFactory
@@ -40,6 +41,7 @@ class RerankerService(RerankerServiceServicer):
             self._logger = logger
         self._config = config
         self._store = StoreFactory.get_store()
+        self._batcher = RequestBatcherFactory.get_request_batcher(config)
         self._logger.info("%s is successfully initialized.", self.__class__.__name__)
 
     def GetRerankers(
@@ -147,7 +149,16 @@ class RerankerService(RerankerServiceServicer):
             queries = request_dict["queries"]
             documentsperquery = [queryhits["hits"] for queryhits in request_dict["hitsperquery"]]
 
-            results = instance.rerank(queries=queries, documents=documentsperquery, **reranker_kwargs)
+            # Concurrent requests to the same reranker are reranked as one batch of queries
+            results = self._batcher.run(
+                batch_key(instance, reranker_kwargs),
+                lambda items: instance.rerank(
+                    queries=[query for query, _ in items],
+                    documents=[documents for _, documents in items],
+                    **reranker_kwargs,
+                ),
+                list(zip(queries, documentsperquery)),
+            )
             
             self._logger.info(
                 "Applying '%s' reranker for queries = %s returns results = %s",
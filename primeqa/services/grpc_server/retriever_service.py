@@ -4,6 +4,7 @@ from typing import Union
 from grpc import ServicerContext, StatusCode
 
 from primeqa.services.configurations import Settings
+from primeqa.services.batching import RequestBatcherFactory, batch_key
 from primeqa.services.parameters import get_parameter_type
 from primeqa.services.constants import (
     ATTR_STATUS,
@@ -42,6 +43,7 @@ class RetrieverService(RetrievingServiceServicer):
             self._logger = logger
         self._config = config
         self._store = StoreFactory.get_store()
+        self._batcher = RequestBatcherFactory.get_request_batcher(config)
         self._logger.info("%s is successfully initialized.", self.__class__.__name__)
 
     def GetRetrievers(
@@ -200,7 +202,12 @@ class RetrieverService(RetrievingServiceServicer):
             request.queries,
         )
         try:
-            results = instance.predict(input_texts=request.queries, **retriever_kwargs)
+            # Concurrent requests to the same retriever are searched as one batch of queries
+            results = self._batcher.run(
+                batch_key(instance, retriever_kwargs),
+                lambda queries: instance.predict(input_texts=queries, **retriever_kwargs),
+                list(request.queries),
+            )
             self._logger.info(
                 "Applying '%s' retriever for queries = %s returns results = %s",
                 instance.__class__.__name__,
@@ -216,31 +223,38 @@ class RetrieverService(RetrievingServiceServicer):
             )
             return RetrieveResponse()
 
+        # Step 8: Fetch documents for all hits at once
+        try:
+            documents = self._store.get_index_documents(
+                index_id=request.index_id,
+                document_ids=[
+                    hit[0] for result_per_query in results for hit in result_per_query
+                ],
+            )
+        except FileNotFoundError:
+            documents = {}
+
         hits = []
         for result_per_query in results:
             hits_per_query = []
             for hit in result_per_query:
-                try:
-                    document = self._store.get_index_document(
-                        index_id=request.index_id, document_idx=hit[0]
-                    )
-                    hits_per_query.append(
-                        Hit(
-                            document=Document(
-                                text=document["text"],
-                                document_id=document["document_id"]
-                                if "document_id" in document
-                                else None,
-                                title=document["title"]
-                                if "title" in document
-                                else None,
-                            ),
-                            score=hit[1],
-                        )
-                    )
-                except (FileNotFoundError, KeyError):
+                document = documents.get(str(hit[0]))
+                if document is None:
                     continue
 
+                hits_per_query.append(
+                    Hit(
+                        document=Document(
+                            text=document["text"],
+                            document_id=document["document_id"]
+                            if "document_id" in document
+                            else None,
+                            title=document["title"] if "title" in document else None,
+                        ),
+                        score=hit[1],
+                    )
+                )
+
             hits.append(HitPerQuery(hits=hits_per_query))
 
         return RetrieveResponse(hits=hits)
@@ -0,0 +1,298 @@
+import logging
+import multiprocessing
+import os
+import queue
+import signal
+import threading
+import time
+from typing import Union
+
+from primeqa.services.configurations import Settings
+from primeqa.services.constants import (
+    ATTR_STATUS,
+    ATTR_PROGRESS,
+    ATTR_NUM_DOCUMENTS,
+    ATTR_NUM_INDEXED_DOCUMENTS,
+    ATTR_STARTED_AT,
+    ATTR_ETA_SECS,
+    IndexStatus,
+)
+from primeqa.services.exceptions import Error, ErrorMessages
+from primeqa.services.factories import INDEXERS_REGISTRY, IndexerFactory
+from primeqa.services.store import StoreFactory
+
+
+def run_indexing_job(
+    index_id: str,
+    indexer_id: str,
+    indexer_kwargs: dict,
+    progress_interval_secs: int,
+):
+    """
+    Entry point of an indexing process. Loads the indexer, indexes the documents saved for the index and records
+    progress and final status in the index information.
+
+    Parameters
+    ----------
+    index_id: str
+        unique identifier for the index.
+    indexer_id: str
+        name of the indexer in INDEXERS_REGISTRY.
+    indexer_kwargs: dict
+        keyword arguments used to instantiate the indexer.
+    progress_interval_secs: int
+        interval between two progress updates.
+
+    Returns
+    -------
+    """
+    # Run in a process group of our own, so cancelling the job also stops processes spawned by the indexer
+    if hasattr(os, "setpgrp"):
+        os.setpgrp()
+
+    logger = logging.getLogger("IndexingJob")
+    store = StoreFactory.get_store()
+    index_information = store.get_index_information(index_id=index_id)
+    progress = index_information[ATTR_PROGRESS]
+    progress[ATTR_STARTED_AT] = time.time()
+    store.save_index_information(index_id, information=index_information)
+
+    instance = None
+    finished = threading.Event()
+
+    def report_progress():
+        while not finished.wait(progress_interval_secs):
+            try:
+                num_indexed_documents = instance.get_num_indexed_documents()
+                if num_indexed_documents is None:
+                    continue
+
+                _update_progress(progress, num_indexed_documents)
+                store.save_index_information(index_id, information=index_information)
+            except Exception:
+                # Keep reporting, a failed update is retried at the next interval
+                logger.exception(
+                    "Failed to update progress for index with id=%s", index_id
+                )
+
+    reporter = None
+    try:
+        instance = IndexerFactory.get(INDEXERS_REGISTRY[indexer_id], indexer_kwargs)
+
+        reporter = threading.Thread(target=report_progress, daemon=True)
+        reporter.start()
+
+        instance.index(store.get_index_documents_file_path(index_id=index_id))
+
+        # Set index status to "READY" once indexing is complete
+        index_information[ATTR_STATUS] = IndexStatus.READY.value
+        _update_progress(progress, progress[ATTR_NUM_DOCUMENTS])
+    except Exception as err:
+        index_information[ATTR_STATUS] = IndexStatus.CORRUPT.value
+        logger.exception(
+            "Generation failed for index with id=%s. Resultant index may be corrupted.",
+            index_id,
+        )
+        logger.exception(err)
+    finally:
+        finished.set()
+        if reporter is not None:
+            reporter.join()
+
+    store.save_index_information(index_id, information=index_information)
+
+
+def _update_progress(progress: dict, num_indexed_documents: int):
+    progress[ATTR_NUM_INDEXED_DOCUMENTS] = num_indexed_documents
+    remaining_documents = progress[ATTR_NUM_DOCUMENTS] - num_indexed_documents
+    if num_indexed_documents > 0:
+        elapsed_secs = time.time() - progress[ATTR_STARTED_AT]
+        progress[ATTR_ETA_SECS] = round(
+            elapsed_secs / num_indexed_documents * max(remaining_documents, 0), 1
+        )
+
+
+class _IndexingJob:
+    def __init__(self, index_id: str, indexer_id: str, indexer_kwargs: dict):
+        self.index_id = index_id
+        self.indexer_id = indexer_id
+        self.indexer_kwargs = indexer_kwargs
+        self.process = None
+        self.cancelled = False
+        self.finished = threading.Event()
+
+
+class IndexingJobs:
+    """
+    Runs index generation in background processes.
+
+    Submitted jobs wait in a bounded queue until one of `num_indexing_workers` slots is free, then run in a
+    freshly spawned process, so indexing neither blocks the serving threads nor shares their memory. Job status
+    and progress are persisted in the index information, where `GetIndexStatus` picks them up.
+
+    Jobs are not persisted themselves: indexes left in INDEXING by a previous run of the service are marked
+    CORRUPT at startup.
+    """
+
+    def __init__(self, config: Settings, logger: Union[logging.Logger, None] = None):
+        if logger is None:
+            self._logger = logging.getLogger(self.__class__.__name__)
+        else:
+            self._logger = logger
+        self._config = config
+        self._store = StoreFactory.get_store()
+
+        # Spawn rather than fork, as forking a process running gRPC or uvicorn threads is unsafe
+        self._context = multiprocessing.get_context("spawn")
+        self._queue = queue.Queue(maxsize=config.max_queued_indexing_jobs)
+        self._jobs = {}
+        self._lock = threading.Lock()
+
+        self._mark_interrupted_indexes()
+
+        for _ in range(config.num_indexing_workers):
+            threading.Thread(target=self._dispatch, daemon=True).start()
+
+    def _mark_interrupted_indexes(self):
+        for index_id in self._store.get_index_ids():
+            try:
+                index_information = self._store.get_index_information(
+                    index_id=index_id
+                )
+            except (OSError, ValueError):
+                continue
+
+            if index_information.get(ATTR_STATUS) == IndexStatus.INDEXING.value:
+                self._logger.warning(
+                    "Indexing of index with id=%s was interrupted by a restart. Marking it as corrupt.",
+                    index_id,
+                )
+                index_information[ATTR_STATUS] = IndexStatus.CORRUPT.value
+                self._store.save_index_information(
+                    index_id, information=index_information
+                )
+
+    def submit(self, index_id: str, indexer_id: str, indexer_kwargs: dict):
+        """
+        Queue an indexing job. Index information and documents must already be saved in the store.
+
+        Parameters
+        ----------
+        index_id: str
+            unique identifier for the index.
+        indexer_id: str
+            name of the indexer in INDEXERS_REGISTRY.
+        indexer_kwargs: dict
+            keyword arguments used to instantiate the indexer.
+
+        Returns
+        -------
+        """
+        job = _IndexingJob(index_id, indexer_id, indexer_kwargs)
+        with self._lock:
+            try:
+                self._queue.put_nowait(job)
+            except queue.Full as err:
+                raise Error(
+                    ErrorMessages.INDEXING_QUEUE_FULL.value.format(
+                        self._queue.maxsize
+                    )
+                ) from err
+            self._jobs[index_id] = job
+
+    def cancel(self, index_id: str) -> bool:
+        """
+        Cancel a pending or running indexing job and delete its partially generated index.
+
+        Parameters
+        ----------
+        index_id: str
+            unique identifier for the index.
+
+        Returns
+        -------
+        bool:
+            True if a job was cancelled, False if no job is pending or running for the index.
+        """
+        with self._lock:
+            job = self._jobs.pop(index_id, None)
+            if job is None:
+                return False
+
+            job.cancelled = True
+            process = job.process
+
+        if process is not None:
+            self._logger.info("Cancelling indexing job for index with id=%s", index_id)
+            try:
+                os.killpg(process.pid, signal.SIGTERM)
+            except (AttributeError, ProcessLookupError):
+                # No process group (yet), stop the indexing process alone
+                process.terminate()
+            job.finished.wait()
+
+        self._store.delete_index(index_id)
+        return True
+
+    def _dispatch(self):
+        while True:
+            job = self._queue.get()
+            try:
+                with self._lock:
+                    if job.cancelled:
+                        continue
+
+                    job.process = self._context.Process(
+                        target=run_indexing_job,
+                        args=(
+                            job.index_id,
+                            job.indexer_id,
+                            job.indexer_kwargs,
+                            self._config.indexing_progress_interval_secs,
+                        ),
+                        daemon=False,
+                    )
+                    job.process.start()
+
+                job.process.join()
+
+                with self._lock:
+                    if self._jobs.get(job.index_id) is job:
+                        del self._jobs[job.index_id]
+
+                # Process died without recording a final status (e.g., killed for running out of memory)
+                if not job.cancelled and job.process.exitcode != 0:
+                    self._logger.error(
+                        "Indexing process for index with id=%s exited with code %s",
+                        job.index_id,
+                        job.process.exitcode,
+                    )
+                    index_information = self._store.get_index_information(
+                        index_id=job.index_id
+                    )
+                    index_information[ATTR_STATUS] = IndexStatus.CORRUPT.value
+                    self._store.save_index_information(
+                        job.index_id, information=index_information
+                    )
+            except Exception:
+                self._logger.exception(
+                    "Failed to run indexing job for index with id=%s", job.index_id
+                )
+            finally:
+                job.finished.set()
+                self._queue.task_done()
+
+
+class IndexingJobsFactory:
+    _instance = None
+    _lock = threading.Lock()
+
+    @classmethod
+    def get_indexing_jobs(cls, config: Settings = None) -> IndexingJobs:
+        with cls._lock:
+            if not cls._instance:
+                cls._instance = IndexingJobs(
+                    config=config if config is not None else Settings()
+                )
+
+        return cls._instance
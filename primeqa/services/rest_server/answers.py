@@ -21,12 +21,43 @@ from fastapi import APIRouter, status, HTTPException
 
 from primeqa.services.exceptions import PATTERN_ERROR_MESSAGE, Error, ErrorMessages
 from primeqa.services.factories import READERS_REGISTRY, ReaderFactory
+from primeqa.services.batching import (
+    RequestBatcherFactory,
+    batch_key,
+    predict_per_example,
+)
 from primeqa.components.reader.extractive import ExtractiveReader
 from primeqa.components.reader.generative import GenerativeFiDReader
 from primeqa.services.rest_server.data_models import GetAnswersRequest, Answer
 
 router = APIRouter()
 
+BATCHER = RequestBatcherFactory.get_request_batcher()
+
+
+def _get_answers_per_context(predictions_for_context: List[dict]) -> List[dict]:
+    answers_per_context = []
+
+    # Iterate over predictions for current context to formulate answer response object
+    for prediction in predictions_for_context:
+        # Step 1: Populate mandatory fields
+        answer = {
+            "text": prediction["span_answer_text"],
+            "confidence_score": prediction["confidence_score"],
+        }
+        # Step 2: Populate optional fields
+        if "passage_index" in prediction and prediction["passage_index"]:
+            answer["context_index"] = int(prediction["passage_index"])
+
+        if "span_answer" in prediction and prediction["span_answer"]:
+            answer["start_char_offset"] = prediction["span_answer"]["start_position"]
+            answer["end_char_offset"] = prediction["span_answer"]["end_position"]
+
+        # Step 3: Add answer to answers_per_context
+        answers_per_context.append(answer)
+
+    return answers_per_context
+
 
 @router.post(
     "/GetAnswersRequest",
@@ -85,41 +116,84 @@ def get_answers(request: GetAnswersRequest):
         ]
         answers_response = []
         try:
-            for idx, query in enumerate(request.queries):
-                # Step 5.a: Run "apply" per query
+            if isinstance(instance, ExtractiveReader):
+                # Step 5.a: Flatten (query, context) pairs of all queries to run "apply" once per request
+                questions, contexts, example_ids = [], [], []
+                for idx, query in enumerate(request.queries):
+                    for text in request.contexts[idx]:
+                        example_ids.append(str(len(example_ids)))
+                        questions.append(query)
+                        contexts.append([text])
+
                 logging.info(
-                    "Applying '%s' reader with parameters = %s for query = '%s' and contexts = %s",
+                    "Applying '%s' reader with parameters = %s for queries = %s and contexts = %s",
                     instance.__class__.__name__,
                     {
                         k: getattr(instance, k) if k in instance_fields else v
                         for k, v in reader_kwargs.items()
                     },
-                    query,
-                    request.contexts[idx],
+                    request.queries,
+                    request.contexts,
                 )
                 try:
-                    # Step 5.a.i: Adjust "predict" request's arguments based on reader type
-                    if isinstance(instance, ExtractiveReader):
-                        predictions = instance.predict(
-                            questions=[query] * len(request.contexts[idx]),
-                            contexts=[[text] for text in request.contexts[idx]],
-                            **reader_kwargs,
+                    # Concurrent requests to the same reader are answered as one batch of (query, context) pairs
+                    predictions = dict(
+                        zip(
+                            example_ids,
+                            BATCHER.run(
+                                batch_key(instance, reader_kwargs),
+                                lambda items: predict_per_example(
+                                    instance, items, reader_kwargs
+                                ),
+                                list(zip(questions, contexts)),
+                            ),
+                        )
+                    )
+                except TypeError as err:
+                    raise Error(
+                        ErrorMessages.FAILED_TO_INITIALIZE.value.format(
+                            f"{request.reader.reader_id} reader"
                         )
+                    ) from err
+
+                logging.info(
+                    "Applying '%s' reader for queries = %s returns predictions = %s",
+                    instance.__class__.__name__,
+                    request.queries,
+                    predictions.values(),
+                )
+
+                # Step 5.b: Add answers for each (query, context) pair into response object, in request order
+                for example_id in example_ids:
+                    answers_response.append(
+                        _get_answers_per_context(predictions.get(example_id, []))
+                    )
 
-                    elif isinstance(instance, GenerativeFiDReader):
+            elif isinstance(instance, GenerativeFiDReader):
+                for idx, query in enumerate(request.queries):
+                    # Step 5.a: Run "apply" per query
+                    logging.info(
+                        "Applying '%s' reader with parameters = %s for query = '%s' and contexts = %s",
+                        instance.__class__.__name__,
+                        {
+                            k: getattr(instance, k) if k in instance_fields else v
+                            for k, v in reader_kwargs.items()
+                        },
+                        query,
+                        request.contexts[idx],
+                    )
+                    try:
                         predictions = instance.predict(
                             questions=[query],
                             contexts=[request.contexts[idx]],
                             **reader_kwargs,
                         )
-
-                    else:
+                    except TypeError as err:
                         raise Error(
-                            ErrorMessages.INVALID_READER.value.format(
-                                request.reader.reader_id,
-                                ", ".join(READERS_REGISTRY.keys()),
+                            ErrorMessages.FAILED_TO_INITIALIZE.value.format(
+                                f"{request.reader.reader_id} reader"
                             )
-                        )
+                        ) from err
 
                     logging.info(
                         "Applying '%s' reader for query = '%s' returns predictions = %s",
@@ -131,46 +205,17 @@ def get_answers(request: GetAnswersRequest):
                     # Step 5.b: Add answers for current query into response object
                     # `predictions` is a dictionary with <question_id, list of answers per context>
                     for predictions_for_context in predictions.values():
-                        answers_per_context = []
-
-                        # Iterate over predictions for current query to formulate answer response object
-                        for prediction in predictions_for_context:
-                            # Step 5.b.i: Populate mandatory fields
-                            answer = {
-                                "text": prediction["span_answer_text"],
-                                "confidence_score": prediction["confidence_score"],
-                            }
-                            # Step 5.b.ii: Populate optional fields
-                            if (
-                                "passage_index" in prediction
-                                and prediction["passage_index"]
-                            ):
-                                answer["context_index"] = int(
-                                    prediction["passage_index"]
-                                )
-
-                            if (
-                                "span_answer" in prediction
-                                and prediction["span_answer"]
-                            ):
-                                answer["start_char_offset"] = prediction["span_answer"][
-                                    "start_position"
-                                ]
-                                answer["end_char_offset"] = prediction["span_answer"][
-                                    "end_position"
-                                ]
-
-                            # Step 5.b.iii: Add answer to answers_for_question
-                            answers_per_context.append(answer)
-
-                        answers_response.append(answers_per_context)
-
-                except TypeError as err:
-                    raise Error(
-                        ErrorMessages.FAILED_TO_INITIALIZE.value.format(
-                            f"{request.reader.reader_id} reader"
+                        answers_response.append(
+                            _get_answers_per_context(predictions_for_context)
                         )
-                    ) from err
+
+            else:
+                raise Error(
+                    ErrorMessages.INVALID_READER.value.format(
+                        request.reader.reader_id,
+                        ", ".join(READERS_REGISTRY.keys()),
+                    )
+                )
 
         except IndexError as err:
             raise Error(
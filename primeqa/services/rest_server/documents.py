@@ -29,12 +29,14 @@ from primeqa.services.constants import (
 )
 from primeqa.services.store import DIR_NAME_INDEX, StoreFactory
 from primeqa.services.factories import RETRIEVERS_REGISTRY, RetrieverFactory
+from primeqa.services.batching import RequestBatcherFactory, batch_key
 from primeqa.services.rest_server.data_models import RetrieveRequest, Hit
 
 router = APIRouter()
 
 # Fetch store instance
 STORE = StoreFactory.get_store()
+BATCHER = RequestBatcherFactory.get_request_batcher()
 
 
 @router.post(
@@ -142,7 +144,12 @@ def get_documents(request: RetrieveRequest):
             request.queries,
         )
         try:
-            results = instance.predict(input_texts=request.queries, **retriever_kwargs)
+            # Concurrent requests to the same retriever are searched as one batch of queries
+            results = BATCHER.run(
+                batch_key(instance, retriever_kwargs),
+                lambda queries: instance.predict(input_texts=queries, **retriever_kwargs),
+                list(request.queries),
+            )
             logging.info(
                 "Applying '%s' retriever for queries = %s returns results = %s",
                 instance.__class__.__name__,
@@ -156,32 +163,41 @@ def get_documents(request: RetrieveRequest):
                 )
             ) from err
 
-        # Step 8: Return
+        # Step 8: Fetch documents for all hits at once
+        try:
+            documents = STORE.get_index_documents(
+                index_id=request.index_id,
+                document_ids=[
+                    hit[0] for result_per_query in results for hit in result_per_query
+                ],
+            )
+        except FileNotFoundError:
+            documents = {}
+
+        # Step 9: Return
         hits = []
         for result_per_query in results:
             hits_per_query = []
             for hit in result_per_query:
-                try:
-                    document = STORE.get_index_document(
-                        index_id=request.index_id, document_idx=hit[0]
-                    )
-                    hits_per_query.append(
-                        {
-                            "document": {
-                                "text": document["text"],
-                                "document_id": document["document_id"]
-                                if "document_id" in document
-                                else None,
-                                "title": document["title"]
-                                if "title" in document
-                                else None,
-                            },
-                            "score": hit[1],
-                        }
-                    )
-                except (FileNotFoundError, KeyError):
+                document = documents.get(str(hit[0]))
+                if document is None:
                     continue
 
+                hits_per_query.append(
+                    {
+                        "document": {
+                            "text": document["text"],
+                            "document_id": document["document_id"]
+                            if "document_id" in document
+                            else None,
+                            "title": document["title"]
+                            if "title" in document
+                            else None,
+                        },
+                        "score": hit[1],
+                    }
+                )
+
             hits.append(hits_per_query)
 
         return hits
@@ -27,10 +27,14 @@ from primeqa.services.constants import (
     ATTR_CONFIGURATION,
     ATTR_ENGINE_TYPE,
     ATTR_CHECKPOINT,
+    ATTR_PROGRESS,
+    ATTR_NUM_DOCUMENTS,
+    ATTR_NUM_INDEXED_DOCUMENTS,
     IndexStatus,
 )
 from primeqa.services.store import DIR_NAME_INDEX, StoreFactory
-from primeqa.services.factories import INDEXERS_REGISTRY, IndexerFactory
+from primeqa.services.factories import INDEXERS_REGISTRY, validate
+from primeqa.services.jobs import IndexingJobsFactory
 from primeqa.services.rest_server.data_models import (
     IndexInformation,
     GenerateIndexRequest,
@@ -41,6 +45,9 @@ router = APIRouter()
 # Fetch store instance
 STORE = StoreFactory.get_store()
 
+# Fetch indexing jobs instance
+JOBS = IndexingJobsFactory.get_indexing_jobs()
+
 
 @router.post(
     "/indexes",
@@ -68,8 +75,9 @@ def generate_index(request: GenerateIndexRequest):
                 )
             ) from err
 
-        # Step 3: Remove existing index if index_id is provide in the request
+        # Step 3: Cancel pending or running indexing job and remove existing index if index_id is provide in the request
         if request.index_id:
+            JOBS.cancel(request.index_id)
             STORE.delete_index(request.index_id)
             index_information[ATTR_INDEX_ID] = request.index_id
 
@@ -108,9 +116,10 @@ def generate_index(request: GenerateIndexRequest):
         )
         indexer_kwargs["index_name"] = DIR_NAME_INDEX
 
-        # Step 7: Create indexer instance
+        # Step 7: Create indexer instance (loaded by the indexing job)
         try:
-            instance = IndexerFactory.get(indexer, indexer_kwargs)
+            validate(indexer_kwargs)
+            instance = indexer(**indexer_kwargs)
         except (ValueError, TypeError) as err:
             raise Error(err.args[0]) from err
 
@@ -124,6 +133,12 @@ def generate_index(request: GenerateIndexRequest):
         if request.metadata:
             index_information[ATTR_METADATA] = request.metadata
 
+        # Step 8.c: Add "progress" to index information
+        index_information[ATTR_PROGRESS] = {
+            ATTR_NUM_DOCUMENTS: len(request.documents),
+            ATTR_NUM_INDEXED_DOCUMENTS: 0,
+        }
+
         STORE.save_index_information(
             index_id=index_information[ATTR_INDEX_ID],
             information=index_information,
@@ -132,30 +147,21 @@ def generate_index(request: GenerateIndexRequest):
         # Step 9: Save documents used in index
         STORE.save_index_documents(
             index_id=index_information[ATTR_INDEX_ID],
-            documents=request.documents,
+            documents=(
+                document.dict(exclude_none=True) for document in request.documents
+            ),
         )
 
         # Step 10: Kick-off async index generation
         try:
-            instance.index(
-                STORE.get_index_documents_file_path(
-                    index_id=index_information[ATTR_INDEX_ID]
-                ),
+            JOBS.submit(
+                index_id=index_information[ATTR_INDEX_ID],
+                indexer_id=indexer.__name__,
+                indexer_kwargs=indexer_kwargs,
             )
-
-            # Step 10.b: Set index status to "READY" once indexing is complete
-            index_information[ATTR_STATUS] = IndexStatus.READY.value
-        except (TypeError, RuntimeError) as err:
-            index_information[ATTR_STATUS] = IndexStatus.CORRUPT.value
-            logging.exception(
-                "Generation failed for index with id=%s. Resultant index may be corrupted.",
-                index_information[ATTR_INDEX_ID],
-            )
-            logging.exception(err.args[0])
-
-        STORE.save_index_information(
-            index_information[ATTR_INDEX_ID], information=index_information
-        )
+        except Error:
+            STORE.delete_index(index_information[ATTR_INDEX_ID])
+            raise
 
         # Step 11: Return
         return index_information
@@ -245,9 +251,17 @@ def get_indexes(engine_type: str = None):
 )
 def get_index_status(index_id: str):
     try:
-        return {
-            ATTR_STATUS: STORE.get_index_information(index_id=index_id)[ATTR_STATUS]
-        }
+        index_information = STORE.get_index_information(index_id=index_id)
+        index_status = {ATTR_STATUS: index_information[ATTR_STATUS]}
+
+        # Add indexing progress, if available
+        if (
+            index_status[ATTR_STATUS] == IndexStatus.INDEXING.value
+            and ATTR_PROGRESS in index_information
+        ):
+            index_status[ATTR_PROGRESS] = index_information[ATTR_PROGRESS]
+
+        return index_status
     except KeyError:
         return {ATTR_STATUS: IndexStatus.CORRUPT.value}
     except FileNotFoundError:
@@ -267,3 +281,22 @@ def get_index_status(index_id: str):
             status_code=500,
             detail={"code": error_code, "message": error_message},
         ) from None
+
+
+@router.post(
+    "/indexes/{index_id}/cancel",
+    status_code=status.HTTP_200_OK,
+    response_model=dict,
+    tags=["Indexer"],
+)
+def cancel_index_generation(index_id: str):
+    if not JOBS.cancel(index_id):
+        mobj = PATTERN_ERROR_MESSAGE.match(
+            ErrorMessages.FAILED_TO_LOCATE_INDEXING_JOB.value.format(index_id)
+        )
+        raise HTTPException(
+            status_code=404,
+            detail={"code": mobj.group(1).strip(), "message": mobj.group(2).strip()},
+        )
+
+    return {ATTR_STATUS: IndexStatus.DOES_NOT_EXISTS.value}
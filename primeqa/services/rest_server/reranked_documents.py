@@ -30,12 +30,14 @@ from primeqa.services.constants import (
 )
 from primeqa.services.store import DIR_NAME_INDEX, StoreFactory
 from primeqa.services.factories import RERANKERS_REGISTRY, RerankerFactory
+from primeqa.services.batching import RequestBatcherFactory, batch_key
 from primeqa.services.rest_server.data_models import RerankRequest, Hit
 
 router = APIRouter()
 
 # Fetch store instance
 STORE = StoreFactory.get_store()
+BATCHER = RequestBatcherFactory.get_request_batcher()
 
 
 @router.post(
@@ -101,7 +103,16 @@ def rerank_documents(request: RerankRequest):
             request_dict = json.loads(request.json())
             queries = request_dict["queries"]
             documentsperquery = request_dict["hitsperquery"]
-            results = instance.predict(queries=queries, documents=documentsperquery, **reranker_kwargs)
+            # Concurrent requests to the same reranker are reranked as one batch of queries
+            results = BATCHER.run(
+                batch_key(instance, reranker_kwargs),
+                lambda items: instance.rerank(
+                    queries=[query for query, _ in items],
+                    documents=[documents for _, documents in items],
+                    **reranker_kwargs,
+                ),
+                list(zip(queries, documentsperquery)),
+            )
             logging.info(
                 "Applying '%s' reranker for queries = %s returns results = %s",
                 instance.__class__.__name__,
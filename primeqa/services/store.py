@@ -1,12 +1,17 @@
-from typing import List
+from typing import List, Dict, Iterable, Union
 import os
+import queue
 import shutil
+import sqlite3
+import threading
+from contextlib import contextmanager
 from pathlib import Path
 import glob
 
-from cachetools.func import ttl_cache
-from sqlitedict import SqliteDict
+from cachetools import LRUCache
+from sqlitedict import decode, encode
 
+from primeqa.services.configurations import Settings
 from primeqa.services.utils import generate_id, load_json, save_json
 
 
@@ -24,6 +29,9 @@ EXTN_TSV = ".tsv"
 EXTN_TXT = ".txt"
 EXTN_SQL_LITE = ".sqlite"
 
+# Max number of bound parameters in a single SQLite query (SQLITE_MAX_VARIABLE_NUMBER of older SQLite releases)
+MAX_SQL_VARIABLES = 999
+
 #############################################################################################
 # indexes/
 #        <index-id>/
@@ -37,8 +45,81 @@ EXTN_SQL_LITE = ".sqlite"
 #        <model-id>/
 #               *.dnn|*.model
 #############################################################################################
+def _batched(items: Iterable, batch_size: int):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+class _DocumentsDatabase:
+    """
+    Read-only pool of connections to the `documents.sqlite` database of an index, in the `SqliteDict` table layout.
+    Once the pool is closed, connections still in use are closed as their requests release them.
+    """
+
+    def __init__(self, file_path: str, version: int, max_connections: int):
+        self.version = version
+        self.closed = False
+        self._uri = f"{Path(file_path).absolute().as_uri()}?mode=ro"
+        self._connections = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max_connections)
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _connection(self):
+        with self._slots:
+            try:
+                connection = self._connections.get_nowait()
+            except queue.Empty:
+                connection = sqlite3.connect(
+                    self._uri, uri=True, check_same_thread=False
+                )
+            try:
+                yield connection
+            finally:
+                with self._lock:
+                    if self.closed:
+                        connection.close()
+                    else:
+                        self._connections.put(connection)
+
+    def get(self, keys: List[str]) -> Dict[str, dict]:
+        documents = {}
+        with self._connection() as connection:
+            for start in range(0, len(keys), MAX_SQL_VARIABLES):
+                chunk = keys[start : start + MAX_SQL_VARIABLES]
+                rows = connection.execute(
+                    f'SELECT key, value FROM "documents" WHERE key IN ({",".join("?" * len(chunk))})',
+                    chunk,
+                )
+                for key, value in rows:
+                    documents[key] = decode(value)
+
+        return documents
+
+    def close(self):
+        with self._lock:
+            self.closed = True
+            while True:
+                try:
+                    self._connections.get_nowait().close()
+                except queue.Empty:
+                    break
+
+
 class Store:
-    def __init__(self):
+    def __init__(self, config: Settings = None):
+        self._config = config if config is not None else Settings()
+        self._documents_databases = {}
+        self._documents_databases_lock = threading.Lock()
+        self._documents_cache = LRUCache(maxsize=self._config.documents_cache_size)
+        self._documents_cache_lock = threading.Lock()
+
         self.root_dir = os.getenv(
             "STORE_DIR", os.path.join(Path(__file__).parent.parent.parent, "store")
         )
@@ -79,68 +160,158 @@ class Store:
             f"{FILENAME_DOCUMENTS}{extension}",
         )
 
-    @ttl_cache(maxsize=10, ttl=10 * 60)
-    def get_index_documents_database(self, index_id: str):
-        return SqliteDict(
-            self.get_index_documents_file_path(index_id, extension=EXTN_SQL_LITE),
-            tablename="documents",
-        )
+    def _get_documents_database(self, index_id: str) -> "_DocumentsDatabase":
+        file_path = self.get_index_documents_file_path(index_id, extension=EXTN_SQL_LITE)
+
+        # Step 1: Identify the current version of the database, as another process may have saved documents again
+        version = os.stat(file_path).st_mtime_ns
+
+        # Step 2: Reuse connections to the current version, if any
+        with self._documents_databases_lock:
+            database = self._documents_databases.get(index_id)
+            if database is None or database.version != version:
+                if database is not None:
+                    database.close()
+                database = _DocumentsDatabase(
+                    file_path,
+                    version=version,
+                    max_connections=self._config.max_documents_database_connections,
+                )
+                self._documents_databases[index_id] = database
 
-    def get_index_document(self, index_id: str, document_idx: int):
-        database = self.get_index_documents_database(index_id=index_id)
-        return database[str(document_idx)]
+        return database
 
-    def save_index_documents(self, index_id: str, documents: List[dict]):
-        # Step 1: Create `documents.tsv` in index directory
-        documents_tsv_file_path = self.get_index_documents_file_path(
-            index_id, extension=EXTN_TSV
-        )
-        os.makedirs(os.path.dirname(documents_tsv_file_path), exist_ok=True)
+    def _release_documents_database(self, index_id: str):
+        with self._documents_databases_lock:
+            database = self._documents_databases.pop(index_id, None)
+        if database is not None:
+            database.close()
 
-        # Step 2: Create `documents.sqlite` in index directory
-        documents_sqlite_file_path = self.get_index_documents_file_path(
-            index_id, extension=EXTN_SQL_LITE
+    def get_index_documents(
+        self, index_id: str, document_ids: List[Union[int, str]]
+    ) -> Dict[str, dict]:
+        """
+        Get documents of an index in bulk.
+
+        Parameters
+        ----------
+        index_id: str
+            unique identifier for the index.
+        document_ids: List[Union[int, str]]
+            identifiers of the documents, as returned by retrievers.
+
+        Returns
+        -------
+        Dict[str, dict]:
+            documents by identifier (as string). Unknown identifiers are left out.
+
+        """
+        database = self._get_documents_database(index_id=index_id)
+
+        # Step 1: Look up recently used documents
+        documents = {}
+        missing_keys = []
+        with self._documents_cache_lock:
+            for document_id in dict.fromkeys(map(str, document_ids)):
+                document = self._documents_cache.get(
+                    (index_id, database.version, document_id)
+                )
+                if document is None:
+                    missing_keys.append(document_id)
+                else:
+                    documents[document_id] = document
+
+        # Step 2: Fetch remaining documents with a single query
+        if missing_keys:
+            fetched_documents = database.get(missing_keys)
+            with self._documents_cache_lock:
+                for document_id, document in fetched_documents.items():
+                    self._documents_cache[
+                        (index_id, database.version, document_id)
+                    ] = document
+            documents.update(fetched_documents)
+
+        return documents
+
+    def get_index_document(self, index_id: str, document_idx: Union[int, str]):
+        documents = self.get_index_documents(
+            index_id=index_id, document_ids=[document_idx]
         )
-        os.makedirs(os.path.dirname(documents_sqlite_file_path), exist_ok=True)
+        return documents[str(document_idx)]
+
+    def save_index_documents(self, index_id: str, documents: Iterable[dict]) -> int:
+        """
+        Save documents used in index, streaming them to `documents.tsv` and `documents.sqlite` in batches.
 
-    def get_index_document(self, index_id: str, document_idx: int):
-        database = self.get_index_documents_database(index_id=index_id)
-        return database[str(document_idx)]
+        Parameters
+        ----------
+        index_id: str
+            unique identifier for the index.
+        documents: Iterable[dict]
+            documents, consumed once. May be a generator, so that documents are never all held in memory.
 
-    def save_index_documents(self, index_id: str, documents: List[dict]):
+        Returns
+        -------
+        int:
+            number of saved documents.
+        """
         # Step 1: Create `documents.tsv` in index directory
         documents_tsv_file_path = self.get_index_documents_file_path(
             index_id, extension=EXTN_TSV
         )
         os.makedirs(os.path.dirname(documents_tsv_file_path), exist_ok=True)
 
-        # Step 2: Create `documents.sqlite` in index directory
+        # Step 2: Create `documents.sqlite` in index directory, built aside and moved in place once complete
         documents_sqlite_file_path = self.get_index_documents_file_path(
             index_id, extension=EXTN_SQL_LITE
         )
-        os.makedirs(os.path.dirname(documents_sqlite_file_path), exist_ok=True)
-
-        # Step 3: Iterate over documents in the request to save to `documents.tsv` and `documents.sqlite`
-        with open(
-            documents_tsv_file_path, "w", encoding="utf-8"
-        ) as documents_file, SqliteDict(
-            documents_sqlite_file_path, tablename="documents"
-        ) as documents_db:
-            # Step 3.a: Add heading row to `documents.tsv`
-            documents_file.write("id\ttext\ttitle\n")
-
-            # Step 3.b: Iterate over documents to add rows to `documents.tsv` and entries in documents_db
-            for document_idx, document in enumerate(documents):
-                documents_file.write(
-                    f"{str(document_idx + 1)}\t{document['text']}\t{document['title'] if 'title' in document else ''}\n"
-                )
-                documents_db[str(document_idx + 1)] = document
-
-            # Step 3.c: Commit to save documents_db
-            documents_db.commit()
+        documents_sqlite_tmp_file_path = f"{documents_sqlite_file_path}.tmp"
+        if os.path.exists(documents_sqlite_tmp_file_path):
+            os.remove(documents_sqlite_tmp_file_path)
+
+        # Step 3: Iterate over documents to save to `documents.tsv` and `documents.sqlite`, one transaction per batch
+        num_documents = 0
+        documents_db = sqlite3.connect(documents_sqlite_tmp_file_path)
+        try:
+            # Step 3.a: No journal is needed, as an incomplete database is never moved in place
+            documents_db.execute("PRAGMA journal_mode = OFF")
+            documents_db.execute("PRAGMA synchronous = OFF")
+            # Same table layout as `SqliteDict(..., tablename="documents")`
+            documents_db.execute(
+                'CREATE TABLE "documents" (key TEXT PRIMARY KEY, value BLOB)'
+            )
 
-        # Step 4: Clear cache
-        self.get_index_documents_database.cache_clear()
+            with open(
+                documents_tsv_file_path, "w", encoding="utf-8"
+            ) as documents_file:
+                # Step 3.b: Add heading row to `documents.tsv`
+                documents_file.write("id\ttext\ttitle\n")
+
+                # Step 3.c: Add rows to `documents.tsv` and `documents.sqlite`
+                for batch in _batched(documents, self._config.documents_batch_size):
+                    rows = []
+                    lines = []
+                    for document in batch:
+                        num_documents += 1
+                        lines.append(
+                            f"{num_documents}\t{document['text']}\t{document['title'] if 'title' in document else ''}\n"
+                        )
+                        rows.append((str(num_documents), encode(document)))
+
+                    documents_file.writelines(lines)
+                    with documents_db:
+                        documents_db.executemany(
+                            'INSERT INTO "documents" (key, value) VALUES (?, ?)', rows
+                        )
+        finally:
+            documents_db.close()
+
+        os.replace(documents_sqlite_tmp_file_path, documents_sqlite_file_path)
+
+        # Step 4: Close connections to previously saved documents
+        self._release_documents_database(index_id)
+
+        return num_documents
 
     #############################################################################################
     #                       Indexes
@@ -224,6 +395,7 @@ class Store:
         Returns
         -------
         """
+        self._release_documents_database(index_id)
         index_dir_to_be_deleted = self.get_index_directory_path(index_id)
         if os.path.exists(index_dir_to_be_deleted):
             shutil.rmtree(index_dir_to_be_deleted)
@@ -1,13 +1,15 @@
+import json
 import logging
 import os
 import sys
-from collections import defaultdict
+from collections import OrderedDict, defaultdict
 from dataclasses import dataclass, field
 from functools import partial
 from typing import List, Optional
 
 import numpy as np
 import pandas as pd
+import torch
 from datasets import load_dataset
 
 from pickle import NONE
@@ -39,9 +41,20 @@ logger = logging.getLogger(__name__)
 
 @dataclass
 class TapexReader(Reader):
-    def __init__(self,path_to_config_json): 
+    def __init__(self,path_to_config_json, batch_size=8, encoding_cache_size=1024):
+        """
+        Args:
+            path_to_config_json (str): Path to the json file of the model, data and training arguments.
+            batch_size (int, optional): Number of queries generated together. Defaults to 8.
+            encoding_cache_size (int, optional): Number of encoded (table, query) inputs kept for repeated queries. Defaults to 1024.
+        """
         print("reading the config from ",path_to_config_json)
         self._config_json = path_to_config_json
+        self._batch_size = batch_size
+        self._encoding_cache_size = encoding_cache_size
+        self._encoding_cache = OrderedDict()
+        self._model = None
+        self._tokenizer = None
 
     @property
     def model(self):
@@ -75,18 +88,71 @@ class TapexReader(Reader):
         Returns:
             Dict: Returns a dictionary of query and the predicted answer.
         """
-        print("in predict for TapexModel with data: ",data_dict , " ,queries:", queries_list)
-        logger.info(f"loading from config at {self._config_json}")
-        self.load(self._config_json)
-        table = pd.DataFrame.from_dict(data_dict)
-        inputs = self._tokenizer(table, queries_list, padding='max_length', return_tensors="pt")
-        outputs = self._model.generate(**inputs)
-        answers = self._tokenizer.batch_decode(outputs, skip_special_tokens=True)
-
-        query_answer_dict = {}
-        for query, answer in zip(queries_list, answers):
-            query_answer_dict[query] = answer
-        return query_answer_dict
+        return self.predict_batch([(data_dict, queries_list)])[0]
+
+    def predict_batch(self, tables_and_queries):
+        """This function takes many (table dictionary, list of queries) pairs as input and returns the answers to the queries using the TableQA model.
+        The model is loaded on the first call only. Queries of all tables are generated together, in mini-batches of queries of about the same length.
+
+        Args:
+            tables_and_queries (List[Tuple[Dict, List]]): Pairs of a table in dict format and a list of queries on it
+
+        Returns:
+            List[Dict]: For each pair, a dictionary of query and the predicted answer.
+        """
+        if self._model is None:
+            logger.info(f"loading from config at {self._config_json}")
+            self.load(self._config_json)
+
+        # Step 1: Encode every (table, query) input, reusing the encodings of repeated queries
+        all_input_ids = []
+        for data_dict, queries_list in tables_and_queries:
+            all_input_ids.extend(self._encode(data_dict, queries_list))
+
+        # Step 2: Generate in mini-batches of inputs of about the same length, each padded to its longest input
+        answers = [None] * len(all_input_ids)
+        order = sorted(range(len(all_input_ids)), key=lambda idx: len(all_input_ids[idx]))
+        with torch.inference_mode():
+            for start in range(0, len(order), self._batch_size):
+                batch = order[start:start + self._batch_size]
+                inputs = self._tokenizer.pad({"input_ids": [all_input_ids[idx] for idx in batch]}, padding="longest", return_tensors="pt")
+                inputs = {name: tensor.to(self._model.device) for name, tensor in inputs.items()}
+                outputs = self._model.generate(**inputs)
+                for idx, answer in zip(batch, self._tokenizer.batch_decode(outputs, skip_special_tokens=True)):
+                    answers[idx] = answer
+
+        # Step 3: Split the answers back per table
+        results = []
+        offset = 0
+        for _, queries_list in tables_and_queries:
+            query_answer_dict = {}
+            for query, answer in zip(queries_list, answers[offset:offset + len(queries_list)]):
+                query_answer_dict[query] = answer
+            offset += len(queries_list)
+            results.append(query_answer_dict)
+        return results
+
+    def _encode(self, data_dict, queries_list):
+        # Keys keep the order of the columns, which are linearized in that order
+        table_key = json.dumps(data_dict, default=str)
+
+        missing_queries = [query for query in dict.fromkeys(queries_list) if (table_key, query) not in self._encoding_cache]
+        if missing_queries:
+            # The table is linearized along with each query, so that inputs are exactly those of the tokenizer
+            table = pd.DataFrame.from_dict(data_dict)
+            encodings = self._tokenizer(table, missing_queries)
+            for query, input_ids in zip(missing_queries, encodings["input_ids"]):
+                self._encoding_cache[(table_key, query)] = input_ids
+
+        all_input_ids = []
+        for query in queries_list:
+            self._encoding_cache.move_to_end((table_key, query))
+            all_input_ids.append(self._encoding_cache[(table_key, query)])
+
+        while len(self._encoding_cache) > self._encoding_cache_size:
+            self._encoding_cache.popitem(last=False)
+
+        return all_input_ids
 
 
     def load(self,config_json) :
@@ -7,7 +7,10 @@ from itertools import groupby
 from operator import itemgetter
 
 
+import os
 import numpy as np
+from joblib import dump
+from sklearn.neural_network import MLPClassifier
 
 from primeqa.calibration.confidence_scorer import ConfidenceScorer
 from primeqa.mrc.processors.postprocessors.extractive import ExtractivePostProcessor
@@ -242,3 +245,27 @@ class TestConfidenceScorer(UnitTest):
         for example_id, preds in  example_predictions.items():
             scores = confidence_scorer.predict_scores(preds)
             assert len(scores) == len(preds)
+
+    def test_predict_scores_batch(self, eval_examples_and_features, tmpdir):
+        eval_examples, eval_features = eval_examples_and_features
+        postprocessor_class = ExtractivePostProcessor
+        scorer_type='weighted_sum_target_type_and_score_diff'
+
+        expected_start_end_index, predictions = self._start_end_target_type_logits_stdevs(eval_examples, eval_features)
+
+        postprocessor = postprocessor_class(k=5, n_best_size=3, max_answer_length=30,
+                                            scorer_type=SupportedSpanScorers(scorer_type),
+                                            single_context_multiple_passages=False,
+                                            output_confidence_feature=True)
+        example_predictions = postprocessor.process(eval_examples, eval_features, predictions)
+
+        X = np.array([x for preds in example_predictions.values() for x in ConfidenceScorer.make_features(preds)])
+        Y = np.arange(len(X)) % 2
+        confidence_model_path = os.path.join(str(tmpdir), 'confidence_model.bin')
+        dump(MLPClassifier(random_state=1, max_iter=10).fit(X, Y), confidence_model_path)
+        confidence_scorer = ConfidenceScorer(confidence_model_path)
+
+        all_scores = confidence_scorer.predict_scores_batch(list(example_predictions.values()))
+        assert len(all_scores) == len(example_predictions)
+        for preds, scores in zip(example_predictions.values(), all_scores):
+            assert np.allclose(scores, confidence_scorer.predict_scores(preds))
@@ -0,0 +1,49 @@
+import torch
+from transformers import AutoTokenizer
+
+from primeqa.components.reranker.seq_classification_reranker import SeqClassificationReranker
+
+
+class LengthModel(torch.nn.Module):
+    """Scores a (query, document) pair by its number of tokens, whatever the padding of its batch."""
+
+    device = torch.device("cpu")
+
+    def forward(self, input_ids, attention_mask, **kwargs):
+        lengths = attention_mask.sum(-1).float()
+        logits = torch.stack([torch.zeros_like(lengths), lengths / 10], dim=-1)
+        return type("Output", (), {"logits": logits})
+
+
+class Tester:
+    def test_rerank_scatters_scores_back(self):
+        reranker = SeqClassificationReranker(max_batch_size=2)
+        reranker._tokenizer = AutoTokenizer.from_pretrained("bert-base-uncased")
+        reranker._loaded_model = LengthModel()
+
+        queries = ["who wrote hamlet?", "where is the eiffel tower located in france?"]
+        texts = [
+            ["Shakespeare wrote Hamlet around 1600, in London.", "Paris."],
+            ["The Eiffel Tower is on the Champ de Mars.", "Hamlet", "Paris is the capital of France, on the Seine."],
+        ]
+        documents = [
+            [{"document": {"text": text, "document_id": f"{q}-{d}"}, "score": 0.0} for d, text in enumerate(texts_)]
+            for q, texts_ in enumerate(texts)
+        ]
+
+        results = reranker.rerank(queries, documents, max_num_documents=-1, include_title=False)
+
+        # Pairs of different queries are batched together, sorted by length, and each document still gets the score
+        # of its own (query, document) pair
+        assert [len(results_) for results_ in results] == [2, 3]
+        for query, results_, texts_ in zip(queries, results, texts):
+            assert sorted(result["document"]["text"] for result in results_) == sorted(texts_)
+            for result in results_:
+                length = len(reranker._tokenizer(query, result["document"]["text"])["input_ids"])
+                expected = torch.softmax(torch.tensor([0.0, length / 10]), dim=-1)[1].item()
+                assert abs(result["score"] - expected) < 1e-6
+
+            scores = [result["score"] for result in results_]
+            assert scores == sorted(scores, reverse=True)
+
+        assert reranker.rerank([], [], max_num_documents=-1) == []
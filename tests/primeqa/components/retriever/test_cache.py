@@ -0,0 +1,79 @@
+from primeqa.components.retriever.cache import RetrieverCache, normalize_query
+
+
+class Tester:
+    def test_normalize_query(self):
+        assert normalize_query("  who wrote\tHamlet ?\n") == "who wrote Hamlet ?"
+        assert normalize_query("café") == normalize_query("café")
+        assert normalize_query("Hamlet") != normalize_query("hamlet")
+
+    def test_disabled_by_default(self):
+        cache = RetrieverCache()
+        assert not cache.enabled
+
+        cache.put_embedding("query", [1.0])
+        cache.put_results("query", (5,), [(1, 0.5)])
+        assert cache.get_embedding("query") is None
+        assert cache.get_results("query", (5,)) is None
+
+    def test_lookups(self):
+        cache = RetrieverCache(max_queries=2, max_results=2)
+        assert cache.enabled
+
+        cache.put_embedding("who wrote Hamlet?", [1.0])
+        assert cache.get_embedding(" who  wrote Hamlet? ") == [1.0]
+
+        cache.put_results("who wrote Hamlet?", (5, None), [(1, 0.5)])
+        assert cache.get_results("who wrote Hamlet?", (5, None)) == [(1, 0.5)]
+        assert cache.get_results("who wrote Hamlet?", (10, None)) is None
+
+        assert cache.stats()["embeddings"] == {"size": 1, "hits": 1, "misses": 0}
+        assert cache.stats()["results"] == {"size": 1, "hits": 1, "misses": 1}
+
+    def test_lru_eviction(self):
+        cache = RetrieverCache(max_queries=2)
+
+        cache.put_embedding("a", 1)
+        cache.put_embedding("b", 2)
+        assert cache.get_embedding("a") == 1
+
+        cache.put_embedding("c", 3)
+        assert cache.get_embedding("b") is None
+        assert cache.get_embedding("a") == 1
+        assert cache.get_embedding("c") == 3
+
+    def test_validate(self):
+        cache = RetrieverCache(max_queries=2, max_results=2)
+
+        assert not cache.validate(0)
+        cache.put_embedding("a", 1)
+        cache.put_results("a", (5,), [(1, 0.5)])
+
+        assert not cache.validate(0)
+        assert cache.get_embedding("a") == 1
+
+        assert cache.validate(1)
+        assert cache.get_embedding("a") is None
+        assert cache.get_results("a", (5,)) is None
+
+    def test_disabled_level_stats(self):
+        cache = RetrieverCache(max_queries=2)
+
+        assert cache.get_results("a", (5,)) is None
+        assert cache.get_embedding("a") is None
+        assert cache.stats()["results"] == {"size": 0, "hits": 0, "misses": 0}
+        assert cache.stats()["embeddings"] == {"size": 0, "hits": 0, "misses": 1}
+
+    def test_refresh(self):
+        cache = RetrieverCache(max_queries=2)
+        reloads = []
+
+        cache.refresh(lambda: 0, lambda: reloads.append(0))
+        cache.put_embedding("a", 1)
+        cache.refresh(lambda: 0, lambda: reloads.append(0))
+        assert reloads == []
+        assert cache.get_embedding("a") == 1
+
+        cache.refresh(lambda: 1, lambda: reloads.append(1))
+        assert reloads == [1]
+        assert cache.get_embedding("a") is None
@@ -0,0 +1,61 @@
+import os
+import pickle
+
+from primeqa.ir.dense.colbert_top.colbert.data.collection import Collection, MappedTSV, ROWS_SUFFIX
+from primeqa.ir.dense.colbert_top.colbert.evaluation.loaders import load_collection
+from primeqa.ir.util.passage_store import PassageStore
+
+
+def _save_collection(path):
+    with open(path, 'w') as f:
+        f.write('0\thello world\tgreetings\n\n1\t"a passage\nover ""two"" lines"\n2\tcafé\tX\n3\tlast passage')
+
+
+def test_mapped_tsv(tmpdir):
+    path = os.path.join(str(tmpdir), 'collection.tsv')
+    _save_collection(path)
+
+    expected = load_collection(path)
+    collection = Collection(path=path)
+
+    assert isinstance(collection.data, MappedTSV)
+    assert os.path.exists(path + ROWS_SUFFIX)
+    assert len(collection) == len(expected)
+    assert list(collection) == expected
+    assert [collection[pid] for pid in range(len(collection))] == expected
+    assert collection[1:3] == expected[1:3]
+    assert collection[-1] == expected[-1]
+
+    # Offsets are reused, and only the path is pickled
+    assert pickle.loads(pickle.dumps(Collection(path=path)))[2] == expected[2]
+
+
+def test_enumerate_batches(tmpdir):
+    path = os.path.join(str(tmpdir), 'collection.tsv')
+    _save_collection(path)
+
+    expected = load_collection(path)
+    collection = Collection(path=path)
+
+    batches = list(collection.enumerate_batches(rank=0, chunksize=3))
+    assert batches == [(0, 0, expected[:3]), (1, 3, expected[3:])]
+    assert Collection(path=path, in_memory=True).data == expected
+
+
+def test_mapped_tsv_next_to_passage_store(tmpdir):
+    # Both open the collection of a ColBERT index, each with offsets of its own (per row and per line)
+    path = os.path.join(str(tmpdir), 'collection.tsv')
+    with open(path, 'w') as f:
+        f.write('0\tfirst passage\tt0\n\n1\tsecond passage\tt1\n2\tthird passage\tt2\n')
+
+    expected = load_collection(path)
+
+    for _ in range(2):
+        store = PassageStore(path)
+        assert len(store) == 4
+        assert store.get_by_pid('1')['text'] == 'second passage'
+        store.close()
+
+        collection = Collection(path=path)
+        assert len(collection) == len(expected) == 3
+        assert [collection[pid] for pid in range(len(collection))] == expected
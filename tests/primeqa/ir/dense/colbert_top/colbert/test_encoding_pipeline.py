@@ -0,0 +1,22 @@
+import torch
+
+from primeqa.ir.dense.colbert_top.colbert.indexing.encoding_pipeline import EncodingPipeline, _Chunk
+
+
+def _embeddings(pids, doclens):
+    # The embeddings of passage i are rows filled with i
+    return torch.cat([torch.full((doclens[pid], 2), float(pid)) for pid in pids])
+
+
+def test_restore_order():
+    doclens = [1, 3, 2, 4]
+
+    # Passages sorted by length as [0, 2, 1, 3], in batches of 2 which complete out of order
+    chunk = _Chunk(offset=10, order=[0, 2, 1, 3], num_batches=2)
+    chunk.batches[2] = (_embeddings([1, 3], doclens), torch.tensor([3, 4]))
+    chunk.batches[0] = (_embeddings([0, 2], doclens), torch.tensor([1, 2]))
+
+    embs, doclens_ = EncodingPipeline._restore_order(None, chunk)
+
+    assert doclens_ == doclens
+    assert torch.equal(embs, _embeddings([0, 1, 2, 3], doclens))
@@ -0,0 +1,55 @@
+import os
+
+import torch
+import ujson
+
+from primeqa.ir.dense.colbert_top.colbert.indexing.utils import build_pid_ivf, optimize_ivf
+
+
+def _save_chunks(index_path, chunks):
+    for chunk_idx, (doclens, codes) in enumerate(chunks):
+        with open(os.path.join(index_path, f'doclens.{chunk_idx}.json'), 'w') as f:
+            ujson.dump(doclens, f)
+        torch.save(torch.tensor(codes, dtype=torch.int32), os.path.join(index_path, f'{chunk_idx}.codes.pt'))
+
+
+def _expected_ivf(chunks, num_partitions):
+    lists = [set() for _ in range(num_partitions)]
+    pid = 0
+    for doclens, codes in chunks:
+        offset = 0
+        for doclen in doclens:
+            for code in codes[offset:offset + doclen]:
+                lists[code].add(pid)
+            offset += doclen
+            pid += 1
+
+    return [sorted(pids) for pids in lists]
+
+
+def _as_lists(ivf, ivf_lengths):
+    return [pids.tolist() for pids in ivf.split(ivf_lengths.tolist())]
+
+
+def test_build_pid_ivf(tmpdir):
+    chunks = [([2, 3], [1, 1, 0, 2, 0]), ([1, 2, 2], [2, 0, 3, 1, 1])]
+    _save_chunks(str(tmpdir), chunks)
+
+    ivf, ivf_lengths = build_pid_ivf(str(tmpdir), num_chunks=2, num_partitions=5)
+
+    assert ivf.dtype == torch.int32
+    assert _as_lists(ivf, ivf_lengths) == _expected_ivf(chunks, num_partitions=5)
+    assert os.path.exists(os.path.join(str(tmpdir), 'ivf.pid.pt'))
+
+
+def test_optimize_ivf(tmpdir):
+    chunks = [([2, 3], [1, 1, 0, 2, 0]), ([1, 2, 2], [2, 0, 3, 1, 1])]
+    _save_chunks(str(tmpdir), chunks)
+
+    codes = torch.tensor([code for _, chunk_codes in chunks for code in chunk_codes])
+    sorter = codes.sort()
+    orig_ivf_lengths = torch.bincount(codes, minlength=4)
+
+    ivf, ivf_lengths = optimize_ivf(sorter.indices, orig_ivf_lengths, str(tmpdir))
+
+    assert _as_lists(ivf, ivf_lengths) == _expected_ivf(chunks, num_partitions=4)
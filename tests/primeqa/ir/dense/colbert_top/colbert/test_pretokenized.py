@@ -0,0 +1,126 @@
+import os
+import random
+import shutil
+
+import torch
+
+from primeqa.ir.dense.colbert_top.colbert.infra import Run, RunConfig
+from primeqa.ir.dense.colbert_top.colbert.infra.config import ColBERTConfig
+from primeqa.ir.dense.colbert_top.colbert.training.lazy_batcher import LazyBatcher
+from primeqa.ir.dense.colbert_top.colbert.training.pretokenized_batcher import TokenizedTexts, PretokenizedBatcher, _tokenized_path
+
+
+class _Tok:
+    pad_token_id = 0
+
+
+class _Tokenizer:
+    """ Word-level stand-in for a ColBERT tokenizer: [CLS]=101 [Q]=1 ... [SEP]=102, padded with `pad_id`. """
+
+    tok = _Tok()
+
+    def __init__(self, pad_id, maxlen=None):
+        self.pad_id = pad_id
+        self.maxlen = maxlen
+
+    def tensorize(self, batch_text):
+        rows = [[101, 1] + [len(word) + 1000 for word in text.split()] + [102] for text in batch_text]
+        maxlen = self.maxlen or max(map(len, rows))
+
+        ids = torch.tensor([row + [self.pad_id] * (maxlen - len(row)) for row in rows])
+        mask = torch.tensor([[1] * len(row) + [0] * (maxlen - len(row)) for row in rows])
+
+        return ids, mask
+
+
+def test_tokenized_texts(tmpdir):
+    texts = ['a passage', 'a somewhat longer passage', 'short', 'the last passage']
+
+    for tokenizer in [_Tokenizer(pad_id=0), _Tokenizer(pad_id=103, maxlen=8)]:
+        path = os.path.join(str(tmpdir), str(tokenizer.pad_id))
+        tokenized = TokenizedTexts.build(path, texts, tokenizer, keys=['q0', 'q1', 'q2', 'q3'], chunksize=3)
+
+        assert TokenizedTexts.exists(path)
+        assert len(tokenized) == len(texts)
+        assert tokenized.keys == {'q0': 0, 'q1': 1, 'q2': 2, 'q3': 3}
+
+        # Batches are padded as if the texts were tokenized together. Rows padded with anything but the pad token
+        # (e.g., queries padded with [MASK]) are kept whole.
+        for rows in [[0, 1], [2], [3, 0, 2]]:
+            ids, mask = tokenizer.tensorize([texts[row] for row in rows])
+            tokenized_ids, tokenized_mask = tokenized.tensorize(rows)
+
+            assert torch.equal(torch.from_numpy(tokenized_ids), ids)
+            assert torch.equal(torch.from_numpy(tokenized_mask), mask)
+
+
+def _assert_same_batches(steps, expected_steps):
+    """ Compares the (Q, D, scores) batches of the training steps yielded by two batchers. """
+    batches = [batch for step in steps for batch in step]
+    expected_batches = [batch for step in expected_steps for batch in step]
+    assert len(batches) == len(expected_batches) > 0
+
+    for (Q, D, S), (expected_Q, expected_D, expected_S) in zip(batches, expected_batches):
+        for tensor, expected_tensor in zip([*Q, *D], [*expected_Q, *expected_D]):
+            assert torch.equal(tensor, expected_tensor)
+        assert list(S) == list(expected_S)
+
+
+def test_pretokenized_batcher(tmpdir):
+    test_files_location = 'tests/resources/ir_dense'
+    if 'DATA_FILES_FOR_DENSE_IR_TESTS_PATH' in os.environ:
+        test_files_location = os.environ['DATA_FILES_FOR_DENSE_IR_TESTS_PATH']
+
+    # Copied, as the tokenized texts are saved next to the queries and the collection
+    paths = []
+    for filename in ["xorqa.train_ir_negs_5_poss_1_001pct_at_0pct_num.json",
+                     "xorqa.train_ir_001pct_at_0_pct_queries_fornum.tsv",
+                     "xorqa.train_ir_001pct_at_0_pct_collection_fornum.tsv"]:
+        paths.append(shutil.copy(os.path.join(test_files_location, filename), str(tmpdir)))
+    triples_fn, queries_fn, collection_fn = paths
+
+    config = ColBERTConfig(checkpoint='prajjwal1/bert-tiny', bsize=1, accumsteps=1, num_batcher_workers=2)
+
+    with Run().context(RunConfig(root=str(tmpdir), experiment='test_pretokenized')):
+        lazy_batcher = LazyBatcher(config, triples_fn, queries_fn, collection_fn)
+        pretokenized_batcher = PretokenizedBatcher(config, triples_fn, queries_fn, collection_fn)
+        assert os.path.exists(f'{collection_fn}.tokenized')
+
+        # The other ranks map the texts tokenized by the first one
+        other_rank_batcher = PretokenizedBatcher(config, triples_fn, queries_fn, collection_fn, rank=1, nranks=2)
+        assert other_rank_batcher.collection_path == pretokenized_batcher.collection_path
+
+        try:
+            _assert_same_batches(list(pretokenized_batcher), list(lazy_batcher))
+
+            # Batches prefetched before a shuffle or a skip are discarded
+            for batcher in [lazy_batcher, pretokenized_batcher]:
+                random.seed(12345)
+                batcher.shuffle()
+                batcher.skip_to_batch(0, config.bsize)
+            assert pretokenized_batcher.triples == lazy_batcher.triples
+
+            _assert_same_batches([next(pretokenized_batcher)], [next(lazy_batcher)])
+
+            for batcher in [lazy_batcher, pretokenized_batcher]:
+                batcher.skip_to_batch(3, config.bsize)
+            _assert_same_batches(list(pretokenized_batcher), list(lazy_batcher))
+        finally:
+            pretokenized_batcher.close()
+
+
+def test_tokenized_path_of_read_only_directory(tmpdir, monkeypatch):
+    tokenizer = _Tokenizer(pad_id=0)
+    source_path = os.path.join(str(tmpdir), 'collection.tsv')
+
+    with Run().context(RunConfig(root=str(tmpdir), experiment='test_pretokenized')):
+        path = _tokenized_path(source_path, tokenizer, 'checkpoint', 180)
+        assert path.startswith(f'{source_path}.tokenized')
+
+        monkeypatch.setattr(os, 'access', lambda path, mode: False)
+        fallback_path = _tokenized_path(source_path, tokenizer, 'checkpoint', 180)
+        assert fallback_path.startswith(os.path.join(Run().path_, 'tokenized'))
+
+        # Texts tokenized before the directory became read-only are still used
+        TokenizedTexts.build(path, ['a passage'], tokenizer)
+        assert _tokenized_path(source_path, tokenizer, 'checkpoint', 180) == path
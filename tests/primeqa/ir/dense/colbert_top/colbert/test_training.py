@@ -3,6 +3,7 @@ import pytest
 import os
 import tempfile
 import json
+import torch
 from typing import Tuple
 
 
@@ -15,7 +16,13 @@ from primeqa.ir.dense.colbert_top.colbert.trainer import Trainer
 from primeqa.ir.dense.colbert_top.colbert.utils.parser import Arguments
 from primeqa.ir.dense.colbert_top.colbert.training.training import train
 from primeqa.ir.dense.colbert_top.colbert.indexing.collection_indexer import encode
+from primeqa.ir.dense.colbert_top.colbert.indexing.index_updater import IndexUpdater
+from primeqa.ir.dense.colbert_top.colbert.indexing.loaders import load_doclens
 from primeqa.ir.dense.colbert_top.colbert.searcher import Searcher
+from primeqa.ir.dense.colbert_top.colbert.data import Collection, Queries
+from primeqa.ir.dense.colbert_top.colbert.modeling.checkpoint import Checkpoint
+from primeqa.ir.dense.colbert_top.colbert.indexing.collection_encoder import CollectionEncoder
+from primeqa.ir.dense.colbert_top.colbert.indexing.encoding_pipeline import EncodingPipeline
 
 class TestTraining(UnitTest):
     @classmethod
@@ -123,8 +130,38 @@ class TestTraining(UnitTest):
                     create_directory(colBERTConfig.index_path_)
                     encode(colBERTConfig, collection_fn, None, None)
 
+                    # The encoding pipeline returns the embeddings of CollectionEncoder, in passage order
+                    checkpoint = Checkpoint(colBERTConfig.checkpoint, colbert_config=colBERTConfig)
+                    passages = Collection.cast(collection_fn)[:20]
+                    expected_embs, expected_doclens = CollectionEncoder(colBERTConfig, checkpoint).encode_passages(passages)
+
+                    pipeline = EncodingPipeline(colBERTConfig, checkpoint, num_encoders=2)
+                    chunks = sorted(pipeline.run(iter([(0, 0, passages[:7]), (1, 7, passages[7:])])), key=lambda chunk: chunk[0])
+                    assert [(chunk_idx, offset) for chunk_idx, offset, _, _ in chunks] == [(0, 0), (1, 7)]
+
+                    embs = torch.cat([embs for _, _, embs, _ in chunks])
+                    assert [doclen for _, _, _, doclens in chunks for doclen in doclens] == list(expected_doclens)
+                    assert torch.allclose(embs.float(), expected_embs.cpu().float(), atol=1e-2)
+
             print("INDEXING DONE")
 
+        do_update = True
+        if do_update:
+            with Run().context(RunConfig(root=args_dict['root'], experiment=args_dict['experiment'], nranks=args_dict['nranks'], amp=args_dict['amp'])):
+                    colBERTConfig = ColBERTConfig(**args_dict)
+                    index_updater = IndexUpdater(colBERTConfig)
+                    num_passages = len(load_doclens(colBERTConfig.index_path_, flatten=True))
+
+                    new_pids = index_updater.add(['an appended passage', 'another appended passage'])
+                    assert list(new_pids) == [num_passages, num_passages + 1]
+                    assert len(load_doclens(colBERTConfig.index_path_, flatten=True)) == num_passages + 2
+
+                    index_updater.delete(new_pids, compact=True)
+                    ivf, _ = torch.load(os.path.join(colBERTConfig.index_path_, 'ivf.pid.pt'))
+                    assert not torch.isin(ivf, torch.tensor(list(new_pids), dtype=ivf.dtype)).any()
+
+            print("UPDATE DONE")
+
         do_search = True
         if do_search:
             ranks_fn = os.path.join(output_dir, 'ranking.tsv')
@@ -137,6 +174,34 @@ class TestTraining(UnitTest):
                 out_fn = args_dict['ranks_fn']
                 rankings.save(out_fn)
 
+                # The memory-mapped layout returns the same results as the .pt chunks
+                mmap_config = ColBERTConfig(**args_dict, load_index_with_mmap=True)
+                mmap_searcher = Searcher(args_dict['index_name'], checkpoint=args_dict['checkpoint'], collection=args_dict['collection'], config=mmap_config)
+                assert os.path.exists(os.path.join(args_dict['index_location'], 'mmap.json'))
+
+                assert mmap_searcher.search_all(args_dict['queries'], 5).tolist() == searcher.search_all(args_dict['queries'], 5).tolist()
+
+                # The batched path ranks each query as the per-query path does
+                Q = searcher.encode(list(Queries.cast(args_dict['queries']).values()))
+                batch_results = searcher.dense_search_batch(Q, k=5)
+                assert len(batch_results) == Q.size(0)
+
+                for query_idx, (pids, ranks, scores) in enumerate(batch_results):
+                    pids_, ranks_, scores_ = searcher.dense_search(Q[query_idx:query_idx+1], k=5)
+                    assert pids == pids_ and ranks == ranks_
+                    assert scores == pytest.approx(scores_, abs=1e-4)
+
+                # Rescoring all queries at once, with documents shared across queries and split over several
+                # batches, scores each query as rescoring it alone does
+                queries = list(Queries.cast(args_dict['queries']).values())[:2]
+                passages = Collection.cast(collection_fn)[:5]
+                text_documents = [[passages[0], passages[1], passages[2]], [passages[2], passages[3], passages[0], passages[4]]]
+                batch_scores = searcher.rescore_batch(queries, text_documents, bsize=2)
+                assert [len(scores) for scores in batch_scores] == [3, 4]
+
+                for query, docs, scores in zip(queries, text_documents, batch_scores):
+                    assert scores == pytest.approx(searcher.rescore(query, docs).tolist(), abs=1e-4)
+
             print("SEARCH DONE")
 
         print("ALL DONE")
@@ -0,0 +1,82 @@
+import os
+import base64
+import numpy as np
+import ujson as json
+
+from primeqa.ir.dense.dpr_top.dpr.simple_mmap_dataset import Corpus, ColumnarCorpusWriter, gzip_str, passages_shard_name, \
+    pid_hash, write_pid_index
+
+
+class Tester:
+    def _docs(self, count, start=0):
+        return [{'pid': f'doc{i}:0', 'title': f'title {i}', 'text': f'text of passage {i}'} for i in range(start, start + count)]
+
+    def test_passages_shard_name(self):
+        assert passages_shard_name('passages_1_of_2.json.gz.records') == '_1_of_2'
+        assert passages_shard_name('passages_1_of_2.json.records') == '_1_of_2'
+        assert passages_shard_name('offsets_1_of_2.npy') is None
+
+    def test_columnar_corpus(self, tmpdir):
+        tmpdir = str(tmpdir)
+        vectors = np.random.randn(5, 8).astype(np.float16)
+        docs = self._docs(5)
+        writer = ColumnarCorpusWriter(tmpdir, '_1_of_1')
+        writer.write(docs[:3], vectors[:3])
+        writer.write(docs[3:], vectors[3:])
+        writer.close()
+
+        corpus = Corpus(tmpdir)
+        assert len(corpus) == 5
+        for ndx, doc in enumerate(docs):
+            assert corpus.get_passage(ndx) == doc
+            assert np.array_equal(corpus[ndx]['vector'], vectors[ndx])
+        assert np.array_equal(np.concatenate(list(corpus.iter_vectors(2))), vectors)
+        assert corpus.pid_indexes is not None
+        assert corpus.get_by_pid('doc3:0')['text'] == 'text of passage 3'
+        assert corpus.get_by_pid('missing') is None
+        corpus.close()
+
+    def test_pid_index_across_shards(self, tmpdir):
+        tmpdir = str(tmpdir)
+        for shard, start in (('_1_of_2', 0), ('_2_of_2', 4)):
+            writer = ColumnarCorpusWriter(tmpdir, shard)
+            writer.write(self._docs(4, start=start), np.zeros((4, 2), dtype=np.float16))
+            writer.close()
+
+        corpus = Corpus(tmpdir)
+        for i in range(8):
+            assert corpus.get_by_pid(f'doc{i}:0')['title'] == f'title {i}'
+        assert corpus.get_by_pid('doc8:0') is None
+        corpus.close()
+
+    def test_write_pid_index(self, tmpdir):
+        path = os.path.join(str(tmpdir), 'pid_index.npy')
+        pids = ['b', 'c', 'a']
+        write_pid_index(path, [pid_hash(pid) for pid in pids])
+        pid_index = np.load(path)
+        assert list(pid_index[:, 0]) == sorted(pid_hash(pid) for pid in pids)
+        assert [pids[row] for row in pid_index[:, 1]] == sorted(pids, key=pid_hash)
+
+    def test_legacy_corpus(self, tmpdir):
+        tmpdir = str(tmpdir)
+        vectors = np.random.randn(3, 8).astype(np.float16)
+        offsets = [0]
+        with open(os.path.join(tmpdir, 'passages_1_of_1.json.gz.records'), 'wb') as f:
+            for doc, vector in zip(self._docs(3), vectors):
+                doc['vector'] = base64.b64encode(vector).decode('ascii')
+                jstr_gz = gzip_str(json.dumps(doc))
+                f.write(jstr_gz)
+                offsets.append(offsets[-1] + len(jstr_gz))
+        np.save(os.path.join(tmpdir, 'offsets_1_of_1.npy'), np.array(offsets, dtype=np.int64))
+
+        corpus = Corpus(os.path.join(tmpdir, 'passages_1_of_1.json.gz.records'))
+        assert len(corpus) == 3
+        assert corpus.get_passage(1)['pid'] == 'doc1:0'
+        assert np.array_equal(corpus[2]['vector'], vectors[2])
+        assert np.array_equal(np.concatenate(list(corpus.iter_vectors(2))), vectors)
+        assert corpus.pid_indexes is None
+        assert corpus.get_by_pid('doc1:0')['text'] == 'text of passage 1'
+        corpus.save_pid_index()
+        assert corpus.pid_indexes is not None
+        assert corpus.get_by_pid('doc2:0')['text'] == 'text of passage 2'
+        corpus.close()
@@ -0,0 +1,58 @@
+import os
+
+from primeqa.ir.util.passage_store import PassageStore, OFFSETS_SUFFIX
+
+
+class Tester:
+    def _write_collection(self, tmpdir, lines):
+        collection = os.path.join(str(tmpdir), 'collection.tsv')
+        with open(collection, 'w', encoding='utf-8') as f:
+            f.write(''.join(line + '\n' for line in lines))
+        return collection
+
+    def test_lookup_by_line_and_pid(self, tmpdir):
+        collection = self._write_collection(tmpdir, ['id\ttext\ttitle', '1\tfirst passage\tfirst', '2\t"a ""quoted""\ttext"\tsecond',
+                                                     '3\tthird passage, ünïcode\tthird'])
+        store = PassageStore(collection)
+        assert store.has_header
+        assert len(store) == 4
+        assert store[1] == {'id': '1', 'text': 'first passage', 'title': 'first'}
+        assert store[2]['text'] == 'a "quoted"\ttext'
+        assert store.get_by_pid('3')['text'] == 'third passage, ünïcode'
+        assert store.get_by_pid('id') is None
+        assert store.get_by_pid('4') is None
+        assert [document['id'] for document in store] == ['1', '2', '3']
+        store.close()
+
+    def test_no_header(self, tmpdir):
+        collection = self._write_collection(tmpdir, ['0\tzero\tt0', '1\tone\tt1'])
+        store = PassageStore(collection)
+        assert not store.has_header
+        assert store[0] == {'id': '0', 'text': 'zero', 'title': 't0'}
+        assert store.get_by_pid('1')['title'] == 't1'
+        store.close()
+
+    def test_rebuild_when_collection_changes(self, tmpdir):
+        collection = self._write_collection(tmpdir, ['id\ttext\ttitle', '1\tfirst\tt1'])
+        PassageStore(collection).close()
+        assert os.path.exists(collection + OFFSETS_SUFFIX)
+
+        collection = self._write_collection(tmpdir, ['id\ttext\ttitle', '1\tfirst\tt1', '2\tsecond\tt2'])
+        os.utime(collection, ns=(0, 0))
+        store = PassageStore(collection)
+        assert len(store) == 3
+        assert store.get_by_pid('2')['text'] == 'second'
+        store.close()
+
+    def test_unwritable_directory(self, tmpdir, monkeypatch):
+        collection = self._write_collection(tmpdir, ['id\ttext\ttitle', '1\tfirst\tt1', '2\tsecond\tt2'])
+
+        def replace(src, dst):
+            raise PermissionError(dst)
+
+        monkeypatch.setattr(os, 'replace', replace)
+        store = PassageStore(collection)
+        assert not os.path.exists(collection + OFFSETS_SUFFIX)
+        assert os.listdir(str(tmpdir)) == ['collection.tsv']
+        assert store.get_by_pid('2')['text'] == 'second'
+        store.close()
@@ -0,0 +1,29 @@
+import numpy as np
+import torch
+
+from primeqa.mrc.models.inference import ExtractiveQAModelRunner
+from tests.primeqa.mrc.common.base import UnitTest
+
+
+class TestExtractiveQAModelRunner(UnitTest):
+    def test_predict_matches_model_forward(self, config_and_model_with_extractive_head, tokenizer, preprocessor,
+                                           eval_examples):
+        _, model = config_and_model_with_extractive_head
+        _, features = preprocessor.process_eval_examples(eval_examples.to_dict())
+        runner = ExtractiveQAModelRunner(model,
+                                         pad_token_id=tokenizer.pad_token_id,
+                                         batch_size=2,
+                                         max_seq_len=max(len(f['input_ids']) for f in features))
+
+        start_logits, end_logits, target_type_logits = runner.predict(features)
+
+        assert start_logits.shape[0] == end_logits.shape[0] == target_type_logits.shape[0] == len(features)
+        with torch.inference_mode():
+            for i, feature in enumerate(features):
+                inputs = {name: torch.tensor([feature[name]]) for name in runner.model_input_names if name in feature}
+                outputs = model(**inputs, return_dict=True)
+                n_tokens = len(feature['input_ids'])
+                assert np.allclose(start_logits[i, :n_tokens], outputs.start_logits[0].numpy(), atol=1e-4)
+                assert np.allclose(end_logits[i, :n_tokens], outputs.end_logits[0].numpy(), atol=1e-4)
+                assert np.allclose(target_type_logits[i], outputs.target_type_logits[0].numpy(), atol=1e-4)
+                assert (start_logits[i, n_tokens:] == -100).all()
@@ -10,7 +10,7 @@ from operator import itemgetter
 import numpy as np
 
 from primeqa.mrc.processors.postprocessors.extractive import ExtractivePostProcessor
-from primeqa.mrc.processors.postprocessors.scorers import SupportedSpanScorers
+from primeqa.mrc.processors.postprocessors.scorers import SupportedSpanScorers, initialize_scorer
 from primeqa.mrc.data_models.target_type import TargetType
 from tests.primeqa.mrc.common.base import UnitTest
 from tests.primeqa.mrc.common.parameterization import PARAMETERIZE_INVALID_SUBSAMPLING_PROBABILITIES
@@ -148,3 +148,41 @@ class TestExtractivePostProcessor(UnitTest):
 
 
     
+
+    @pytest.mark.parametrize('scorer_type', SupportedSpanScorers.get_supported())
+    def test_post_processor_matches_nested_loop_decoding(self, eval_examples_and_features, scorer_type):
+        eval_examples, eval_features = eval_examples_and_features
+        rng = np.random.default_rng(42)
+        n_features, seq_len = len(eval_features), max(len(f['offset_mapping']) for f in eval_features)
+        predictions = (rng.standard_normal((n_features, seq_len)).astype(np.float32),
+                       rng.standard_normal((n_features, seq_len)).astype(np.float32),
+                       rng.standard_normal((n_features, len(TargetType))).astype(np.float32))
+        k, n_best_size, max_answer_length = 5, 4, 3
+
+        postprocessor = ExtractivePostProcessor(k=k, n_best_size=n_best_size, max_answer_length=max_answer_length,
+                                                scorer_type=SupportedSpanScorers(scorer_type),
+                                                single_context_multiple_passages=False)
+        example_predictions = postprocessor.process(eval_examples, eval_features, predictions)
+
+        # Reference: score every (start, end) pair of the n best start and end logits one by one
+        scorer = initialize_scorer(scorer_type)
+        expected = {}
+        for feature_idx, feature in enumerate(eval_features):
+            offset_mapping = feature['offset_mapping']
+            start_logits, end_logits, target_type_logits = (p[feature_idx].tolist() for p in predictions)
+            start_indexes = np.argsort(start_logits[:len(offset_mapping)])[-1: -n_best_size - 1: -1].tolist()
+            end_indexes = np.argsort(end_logits[:len(offset_mapping)])[-1: -n_best_size - 1: -1].tolist()
+            for start_index in start_indexes:
+                for end_index in end_indexes:
+                    if offset_mapping[start_index] is None or offset_mapping[end_index] is None \
+                            or end_index < start_index or end_index - start_index + 1 > max_answer_length:
+                        continue
+                    score = scorer(start_logits[start_index] + end_logits[end_index],
+                                   start_logits[0] + end_logits[0], target_type_logits)
+                    expected.setdefault(feature['example_id'], []).append(
+                        (score, start_index, end_index, feature['context_idx']))
+
+        for example_id, preds in example_predictions.items():
+            expected_preds = sorted(expected[example_id], key=itemgetter(0), reverse=True)[:k]
+            assert [(p['span_answer_score'], p['start_index'], p['end_index'], p['passage_index'])
+                    for p in preds] == expected_preds
@@ -184,6 +184,16 @@ class TestDefaultPreProcessor(UnitTest):
         assert isinstance(eval_examples, Dataset)
         assert isinstance(eval_features, Dataset)
 
+    def test_process_eval_examples_matches_process_eval(self, eval_examples, preprocessor):
+        _, eval_features = preprocessor.process_eval(eval_examples)
+        example_rows, feature_rows = preprocessor.process_eval_examples(eval_examples.to_dict())
+        assert [e['example_id'] for e in example_rows] == eval_examples['example_id']
+        assert len(feature_rows) == eval_features.num_rows
+        for key in ('input_ids', 'example_id', 'example_idx', 'context_idx'):
+            assert [f[key] for f in feature_rows] == eval_features[key]
+        assert [[tuple(o) if o is not None else None for o in f['offset_mapping']] for f in feature_rows] == \
+               [[tuple(o) if o is not None else None for o in om] for om in eval_features['offset_mapping']]
+
     def test_cannot_adapt_dataset_with_invalid_train_schema_names(self, preprocessor, invalid_name_train_examples):
         with raises(ValueError):
             _ = preprocessor.adapt_dataset(invalid_name_train_examples, is_train=True)
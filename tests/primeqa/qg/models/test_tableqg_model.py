@@ -32,3 +32,50 @@ def test_qg_model(model_name):
     assert(len(gqs)>0)
     
 
+
+@pytest.mark.parametrize("model_name",["t5-small"])
+def test_qg_model_iter(model_name):
+    tqm = QGModel(model_name, modality='table')
+
+    table = {
+        "header": ["Player", "No.", "Nationality", "Position"],
+        "rows": [
+            ["Antonio Lang", 21, "United States", "Guard-Forward"],
+            ["Voshon Lenard", 2, "United States", "Guard"],
+            ["Martin Lewis", 32, "United States", "Guard-Forward"]
+        ]
+    }
+    gqs = tqm.generate_questions_iter(iter([table, table, table]),
+                            num_questions_per_instance = 2,
+                            id_list=["id1", "id2"],
+                            instances_per_chunk=2,
+                            max_tokens_per_batch=64)
+
+    gqs = list(gqs)
+    assert len(gqs) == 6
+    assert [gq['context_id'] for gq in gqs] == ["id1", "id1", "id2", "id2", "NA", "NA"]
+    assert all(len(gq['questions']) == 1 for gq in gqs)
+
+
+@pytest.mark.parametrize("model_name",["t5-small"])
+def test_qg_model_iter_sampling_workers(model_name):
+    tqm = QGModel(model_name, modality='table')
+
+    table = {
+        "header": ["Player", "No.", "Nationality", "Position"],
+        "rows": [
+            ["Antonio Lang", 21, "United States", "Guard-Forward"],
+            ["Voshon Lenard", 2, "United States", "Guard"],
+            ["Martin Lewis", 32, "United States", "Guard-Forward"]
+        ]
+    }
+    # Chunks are sampled by the workers one at a time, and the instances come back in order
+    gqs = tqm.generate_questions_iter(iter([table] * 5),
+                            num_questions_per_instance = 1,
+                            id_list=["id1", "id2", "id3", "id4", "id5"],
+                            instances_per_chunk=2,
+                            max_tokens_per_batch=64,
+                            num_sampling_workers=2)
+
+    gqs = list(gqs)
+    assert [gq['context_id'] for gq in gqs] == ["id1", "id2", "id3", "id4", "id5"]
@@ -17,6 +17,53 @@
 
 import pytest
 
+from primeqa.components.reader.extractive import ExtractiveReader
+from primeqa.services.rest_server import answers
+
+
+class EchoReader(ExtractiveReader):
+    """Extractive reader answering each (query, context) pair with the pair itself."""
+
+    def __hash__(self):
+        return 0
+
+    def predict(self, questions, contexts, *args, example_ids=None, **kwargs):
+        return {
+            example_id: [
+                {"span_answer_text": f"{question} | {context}", "confidence_score": 1.0}
+                for context in contexts_
+            ]
+            for example_id, question, contexts_ in zip(example_ids, questions, contexts)
+        }
+
+
+def test_get_answers_per_query_and_context_in_request_order(mock_client, monkeypatch):
+    # Skip loading the model, the reader only needs its parameters
+    reader = EchoReader.__new__(EchoReader)
+    reader.__dict__.update(
+        {k: v.default for k, v in EchoReader.__dataclass_fields__.items()}
+    )
+    monkeypatch.setattr(
+        answers.ReaderFactory, "get", lambda reader_, reader_kwargs: reader
+    )
+
+    queries = ["first query", "second query"]
+    contexts = [["a", "b", "c"], ["d"]]
+    response = mock_client.post(
+        "/GetAnswersRequest",
+        json={
+            "reader": {"reader_id": "ExtractiveReader"},
+            "queries": queries,
+            "contexts": contexts,
+        },
+    )
+    assert response.status_code == 201
+    assert [[answer["text"] for answer in answers_] for answers_ in response.json()] == [
+        [f"{query} | {context}"]
+        for query, contexts_ in zip(queries, contexts)
+        for context in contexts_
+    ]
+
 
 @pytest.mark.skip(reason="Skipping due to gpu memory constaints ...")
 def test_get_answers_with_extractive_reader(mock_client):
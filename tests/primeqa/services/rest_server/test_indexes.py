@@ -0,0 +1,32 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+#
+# Copyright 2022-2023 PrimeQA Team
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#     http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+
+def test_get_index_status_of_missing_index(mock_client):
+    response = mock_client.get(
+        "/indexes/missing-index/status",
+    )
+    assert response.status_code == 200
+    assert response.json() == {"status": "DOES_NOT_EXISTS"}
+
+
+def test_cancel_index_generation_without_job(mock_client):
+    response = mock_client.post(
+        "/indexes/missing-index/cancel",
+    )
+    assert response.status_code == 404
+    assert response.json()["detail"]["code"] == "E6005"
@@ -0,0 +1,52 @@
+import threading
+
+import pytest
+
+from primeqa.services.batching import RequestBatcher
+from primeqa.services.configurations import Settings
+
+
+@pytest.fixture
+def batcher(monkeypatch):
+    monkeypatch.setenv("batching_max_wait_ms", "200")
+    monkeypatch.setenv("batching_max_batch_size", "6")
+    return RequestBatcher(config=Settings())
+
+
+def test_concurrent_requests_share_a_batch(batcher):
+    calls = []
+
+    def fn(items):
+        calls.append(list(items))
+        return [item * 10 for item in items]
+
+    results = {}
+    barrier = threading.Barrier(3)
+
+    def request(idx):
+        barrier.wait()
+        results[idx] = batcher.run("key", fn, [idx, idx + 100])
+
+    threads = [threading.Thread(target=request, args=(idx,)) for idx in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(calls) == 1
+    assert sorted(calls[0]) == [0, 1, 2, 100, 101, 102]
+    assert results == {idx: [idx * 10, (idx + 100) * 10] for idx in range(3)}
+
+
+def test_exceptions_are_raised_to_every_request(batcher):
+    def fn(items):
+        raise TypeError("failed")
+
+    with pytest.raises(TypeError):
+        batcher.run("key", fn, [1])
+
+
+def test_disabled_batching(monkeypatch):
+    monkeypatch.setenv("batching_max_wait_ms", "0")
+    batcher = RequestBatcher(config=Settings())
+    assert batcher.run("key", lambda items: [item + 1 for item in items], [1, 2]) == [2, 3]
@@ -0,0 +1,90 @@
+import threading
+import time
+
+import numpy as np
+import pytest
+
+from primeqa.services.configurations import Settings
+from primeqa.services.factories import ComponentCache
+
+
+@pytest.fixture
+def config(monkeypatch):
+    monkeypatch.setenv("max_cached_components", "2")
+    monkeypatch.setenv("max_cached_components_memory_mb", "0")
+    monkeypatch.setenv("cached_component_idle_ttl_secs", "0")
+    return Settings()
+
+
+class Component:
+    pass
+
+
+def test_least_recently_used_instances_are_evicted(config):
+    cache = ComponentCache("test", config=config)
+    first = cache.get("first", Component)
+    cache.get("second", Component)
+    assert cache.get("first", Component) is first
+
+    cache.get("third", Component)
+    assert cache.keys() == ["first", "third"]
+    assert cache.unload("first")
+    assert not cache.unload("first")
+    assert cache.keys() == ["third"]
+
+
+def test_concurrent_requests_wait_for_load(config):
+    cache = ComponentCache("test", config=config)
+    loads = []
+
+    def load():
+        loads.append(1)
+        time.sleep(0.2)
+        return Component()
+
+    results = []
+    threads = [
+        threading.Thread(target=lambda: results.append(cache.get("key", load)))
+        for _ in range(3)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(loads) == 1
+    assert len(results) == 3 and all(result is results[0] for result in results)
+
+
+def test_failed_load_is_not_cached(config):
+    cache = ComponentCache("test", config=config)
+
+    def load():
+        raise ValueError("failed")
+
+    with pytest.raises(ValueError):
+        cache.get("key", load)
+    assert cache.keys() == []
+    assert isinstance(cache.get("key", Component), Component)
+
+
+class LargeComponent:
+    def __init__(self):
+        # 0.6 MB in an attribute of an attribute
+        self.model = Component()
+        self.model.weights = np.zeros(600 * 1024 // 8)
+
+
+def test_instances_over_memory_budget_are_evicted(monkeypatch):
+    monkeypatch.setenv("max_cached_components", "16")
+    monkeypatch.setenv("max_cached_components_memory_mb", "1")
+    monkeypatch.setenv("cached_component_idle_ttl_secs", "0")
+    cache = ComponentCache("test", config=Settings())
+
+    cache.get("first", LargeComponent)
+    cache.get("small", Component)
+    assert cache.keys() == ["first", "small"]
+
+    # Only the least recently used instance is evicted, as much as needed to fit the budget
+    cache.get("second", LargeComponent)
+    assert cache.keys() == ["small", "second"]
@@ -0,0 +1,143 @@
+import os
+import time
+
+import pytest
+
+from primeqa.services import jobs
+from primeqa.services.configurations import Settings
+from primeqa.services.constants import (
+    ATTR_STATUS,
+    ATTR_PROGRESS,
+    ATTR_NUM_DOCUMENTS,
+    ATTR_NUM_INDEXED_DOCUMENTS,
+    IndexStatus,
+)
+from primeqa.services.exceptions import Error
+from primeqa.services.store import Store, StoreFactory
+
+
+# Targets of the spawned indexing processes, in place of `run_indexing_job`
+def _successful_job(index_id, indexer_id, indexer_kwargs, progress_interval_secs):
+    store = Store()
+    index_information = store.get_index_information(index_id=index_id)
+    index_information[ATTR_STATUS] = IndexStatus.READY.value
+    store.save_index_information(index_id, information=index_information)
+
+
+def _hanging_job(index_id, indexer_id, indexer_kwargs, progress_interval_secs):
+    time.sleep(600)
+
+
+def _crashing_job(index_id, indexer_id, indexer_kwargs, progress_interval_secs):
+    os._exit(1)
+
+
+@pytest.fixture
+def store(tmpdir, monkeypatch):
+    monkeypatch.setenv("STORE_DIR", str(tmpdir))
+    monkeypatch.setenv("num_indexing_workers", "1")
+    monkeypatch.setenv("max_queued_indexing_jobs", "1")
+    monkeypatch.setenv("indexing_progress_interval_secs", "1")
+
+    store = Store()
+    monkeypatch.setattr(StoreFactory, "_instance", store)
+    return store
+
+
+def _create_index(store, index_id, status=IndexStatus.INDEXING):
+    store.save_index_information(
+        index_id,
+        information={
+            ATTR_STATUS: status.value,
+            ATTR_PROGRESS: {ATTR_NUM_DOCUMENTS: 1, ATTR_NUM_INDEXED_DOCUMENTS: 0},
+        },
+    )
+
+
+def _wait_for(condition, timeout_secs=60):
+    deadline = time.time() + timeout_secs
+    while not condition():
+        assert time.time() < deadline, "Timed out"
+        time.sleep(0.1)
+
+
+def _status(store, index_id):
+    return store.get_index_information(index_id=index_id)[ATTR_STATUS]
+
+
+def _running(indexing_jobs, index_id):
+    job = indexing_jobs._jobs.get(index_id)
+    return job is not None and job.process is not None and job.process.is_alive()
+
+
+def test_submit(store, monkeypatch):
+    monkeypatch.setattr(jobs, "run_indexing_job", _successful_job)
+    indexing_jobs = jobs.IndexingJobs(Settings())
+
+    _create_index(store, "index")
+    indexing_jobs.submit("index", "Indexer", {})
+
+    _wait_for(lambda: _status(store, "index") == IndexStatus.READY.value)
+    _wait_for(lambda: "index" not in indexing_jobs._jobs)
+
+
+def test_full_queue(store, monkeypatch):
+    monkeypatch.setattr(jobs, "run_indexing_job", _hanging_job)
+    indexing_jobs = jobs.IndexingJobs(Settings())
+
+    for index_id in ["running", "queued", "rejected"]:
+        _create_index(store, index_id)
+
+    indexing_jobs.submit("running", "Indexer", {})
+    _wait_for(lambda: _running(indexing_jobs, "running"))
+    indexing_jobs.submit("queued", "Indexer", {})
+
+    with pytest.raises(Error) as err:
+        indexing_jobs.submit("rejected", "Indexer", {})
+    assert err.value.args[0].startswith("E6004")
+    assert "rejected" not in indexing_jobs._jobs
+
+    assert indexing_jobs.cancel("queued")
+    assert indexing_jobs.cancel("running")
+
+
+def test_cancel(store, monkeypatch):
+    monkeypatch.setattr(jobs, "run_indexing_job", _hanging_job)
+    indexing_jobs = jobs.IndexingJobs(Settings())
+
+    _create_index(store, "running")
+    _create_index(store, "queued")
+    indexing_jobs.submit("running", "Indexer", {})
+    _wait_for(lambda: _running(indexing_jobs, "running"))
+    indexing_jobs.submit("queued", "Indexer", {})
+
+    # A queued job never starts, a running one is stopped, and both indexes are deleted
+    assert indexing_jobs.cancel("queued")
+    assert not os.path.exists(store.get_index_directory_path("queued"))
+
+    process = indexing_jobs._jobs["running"].process
+    assert indexing_jobs.cancel("running")
+    assert not process.is_alive()
+    assert not os.path.exists(store.get_index_directory_path("running"))
+
+    assert not indexing_jobs.cancel("running")
+
+
+def test_crashed_process_marks_index_corrupt(store, monkeypatch):
+    monkeypatch.setattr(jobs, "run_indexing_job", _crashing_job)
+    indexing_jobs = jobs.IndexingJobs(Settings())
+
+    _create_index(store, "index")
+    indexing_jobs.submit("index", "Indexer", {})
+
+    _wait_for(lambda: _status(store, "index") == IndexStatus.CORRUPT.value)
+
+
+def test_interrupted_indexes_are_marked_corrupt(store):
+    _create_index(store, "interrupted")
+    _create_index(store, "ready", status=IndexStatus.READY)
+
+    jobs.IndexingJobs(Settings())
+
+    assert _status(store, "interrupted") == IndexStatus.CORRUPT.value
+    assert _status(store, "ready") == IndexStatus.READY.value
@@ -0,0 +1,72 @@
+import sqlite3
+
+import pytest
+
+from primeqa.services.store import Store
+
+
+@pytest.fixture
+def store(tmpdir, monkeypatch):
+    monkeypatch.setenv("STORE_DIR", str(tmpdir))
+    return Store()
+
+
+def test_get_index_documents(store):
+    documents = [{"text": f"text {idx}", "title": f"title {idx}"} for idx in range(5)]
+    store.save_index_documents("index", documents)
+
+    fetched_documents = store.get_index_documents("index", [3, "1", 3, 42])
+    assert fetched_documents == {"3": documents[2], "1": documents[0]}
+
+    # Cached documents are served along with fetched ones
+    assert store.get_index_documents("index", [1, 5]) == {
+        "1": documents[0],
+        "5": documents[4],
+    }
+    assert store.get_index_document("index", 2) == documents[1]
+    with pytest.raises(KeyError):
+        store.get_index_document("index", 42)
+
+
+def test_get_index_documents_after_saving_again(store):
+    store.save_index_documents("index", [{"text": "old"}])
+    assert store.get_index_document("index", 1) == {"text": "old"}
+
+    store.save_index_documents("index", [{"text": "new"}])
+    assert store.get_index_document("index", 1) == {"text": "new"}
+
+
+def test_connections_in_use_are_closed_with_their_database(store):
+    store.save_index_documents("index", [{"text": "text"}])
+    database = store._get_documents_database("index")
+
+    with database._connection() as connection:
+        database.close()
+
+    with pytest.raises(sqlite3.ProgrammingError):
+        connection.execute("SELECT 1")
+    assert database._connections.empty()
+
+
+def test_get_documents_of_missing_index(store):
+    with pytest.raises(FileNotFoundError):
+        store.get_index_documents("missing", [1])
+
+
+def test_save_index_documents_from_generator(tmpdir, monkeypatch):
+    monkeypatch.setenv("STORE_DIR", str(tmpdir))
+    monkeypatch.setenv("documents_batch_size", "2")
+    store = Store()
+
+    num_documents = store.save_index_documents(
+        "index", ({"text": f"text {idx}"} for idx in range(5))
+    )
+    assert num_documents == 5
+
+    with open(store.get_index_documents_file_path("index"), encoding="utf-8") as f:
+        assert f.read().splitlines() == ["id\ttext\ttitle"] + [
+            f"{idx + 1}\ttext {idx}\t" for idx in range(5)
+        ]
+    assert store.get_index_documents("index", range(1, 6)) == {
+        str(idx + 1): {"text": f"text {idx}"} for idx in range(5)
+    }
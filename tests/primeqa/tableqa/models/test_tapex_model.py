@@ -1,4 +1,5 @@
 import pytest
+import pandas as pd
 from primeqa.tableqa.tapex.tapex_component import TapexReader
 from transformers import (
     BartForConditionalGeneration,
@@ -11,7 +12,34 @@ def test_tapex_model(config_path):
     reader.load(config_path)
     assert type(reader.model)== BartForConditionalGeneration
     assert type(reader.tokenizer) == TapexTokenizer
-    
-    
-    
-    
+
+
+@pytest.mark.parametrize("config_path",["tests/resources/tapex/tapex_config.json"])
+def test_tapex_predict_batch(config_path):
+    reader = TapexReader(config_path)
+    data = {"Actors": ["Brad Pitt", "Leonardo Di Caprio", "George Clooney"],
+            "Number of movies": ["87", "53", "69"]}
+    queries = ["how many movies does George Clooney have?", "who has the most movies?"]
+
+    answers = reader.predict_batch([(data, queries), (data, queries[:1])])
+    assert len(answers) == 2
+    assert set(answers[0]) == set(queries)
+    assert answers[1][queries[0]] == answers[0][queries[0]]
+    assert reader.predict(data, queries) == answers[0]
+
+
+@pytest.mark.parametrize("config_path",["tests/resources/tapex/tapex_config.json"])
+def test_tapex_encoding_cache_column_order(config_path):
+    reader = TapexReader(config_path)
+    reader.load(config_path)
+    data = {"Actors": ["Brad Pitt", "Leonardo Di Caprio", "George Clooney"],
+            "Number of movies": ["87", "53", "69"]}
+    reordered_data = {"Number of movies": data["Number of movies"], "Actors": data["Actors"]}
+    queries = ["who has the most movies?"]
+
+    # Tables differing only in column order are linearized differently, so their encodings aren't shared
+    input_ids = reader._encode(data, queries)
+    reordered_input_ids = reader._encode(reordered_data, queries)
+    assert reordered_input_ids != input_ids
+    assert reordered_input_ids == reader.tokenizer(pd.DataFrame.from_dict(reordered_data), queries)["input_ids"]
+    assert reader._encode(data, queries) == input_ids